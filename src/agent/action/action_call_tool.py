@@ -51,14 +51,39 @@ async def _call_tools_safely(tool_name: str,tool_arguments: str) -> str:
     try:
         return await call_tools(tool_name, tool_arguments)
     except Exception as e:
-        # 获取完整的错误信息（包括堆栈）
-        error_msg = traceback.format_exc()        
-        tool_err = f"{tool_name} 工具函数调用失败，工具参数是 {tool_arguments} ，执行工具时候发生的错误信息: {error_msg}"
-        global_logger.error(tool_err, exc_info=True)
-        return tool_err
+        return _tool_error(tool_name, tool_arguments)
+
+
+def _tool_error(tool_name: str, tool_arguments: str) -> str:
+    # 获取完整的错误信息（包括堆栈）
+    error_msg = traceback.format_exc()        
+    tool_err = f"{tool_name} 工具函数调用失败，工具参数是 {tool_arguments} ，执行工具时候发生的错误信息: {error_msg}"
+    global_logger.error(tool_err, exc_info=True)
+    return tool_err
 
 
 async def execute_single_call_async(name: str, arguments: Any) -> str:
     """执行一次工具或 function 调用（需要为协程）"""
     return await _call_tools_safely(name, arguments)
 
+
+
+def is_python_call(name: str) -> bool:
+    return name == ExecutePythonCodeTool.tool_name()
+
+
+async def execute_python_calls_async(arguments_list: List[Any]) -> List[Any]:
+    """同一轮的多个 execute_python_code 调用交给依赖感知的调度器统一执行，返回值与 arguments_list 一一对应"""
+    results: List[Any] = [None] * len(arguments_list)
+    tools: List[ExecutePythonCodeTool] = []
+    indexes: List[int] = []
+    for i, arguments in enumerate(arguments_list):
+        try:
+            tools.append(ExecutePythonCodeTool(**json.loads(arguments)))
+            indexes.append(i)
+        except Exception:
+            results[i] = _tool_error(ExecutePythonCodeTool.tool_name(), arguments)
+    if tools:
+        for i, output in zip(indexes, await ExecutePythonCodeTool.run_batch(tools)):
+            results[i] = output
+    return results
@@ -0,0 +1,147 @@
+"""
+流式输出期间提前执行工具调用：模型生成完一个调用的参数（JSON 能完整解析）就立即开始执行，
+与后续调用参数的生成重叠，一轮的耗时从「生成 + 执行」接近 max(生成, 执行)。
+
+- execute_python_code 调用按出现顺序加入同一个 PythonCallBatch，依赖图与整条消息一次性调度时相同，工作区合并结果一致；
+- 其他工具（MCP 等）各自独立执行；
+- 消息结束后 gather 复用已开始的执行，参数没能提前解析的调用此时再开始；
+- 提前执行的代码片段与最终消息不一致（参数变化或不在消息中）时，取消整个 python 批次，按最终消息重新执行，
+  合并顺序始终与消息顺序一致；
+- 常驻引擎（KERNEL / FORK）中已执行的片段改变了共享状态，无法撤销，python 调用不提前执行，消息结束后再统一执行；
+- 模型结束对话（不再处理工具调用）时取消已开始的执行，但已产生的外部副作用（写文件等）不会回滚。
+
+ALGO_AGENT_EARLY_TOOL_DISPATCH=0 时关闭，消息结束后再统一执行。
+"""
+import asyncio
+import contextvars
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from src.agent.action import action_call_tool
+from src.agent.action import action_type
+from src.agent.tool.sandbox.python_tool import ExecutePythonCodeTool, PythonCallBatch
+from src.runtime.engine import engine_enum
+from src.utils.log_decorator import global_logger
+
+EARLY_DISPATCH_ENABLED = os.getenv("ALGO_AGENT_EARLY_TOOL_DISPATCH", "1") != "0"
+
+# 已开始的执行：独立任务、python 批次中的下标，或参数无效时直接得到的报错文本
+Slot = Union[asyncio.Task, int, str]
+
+
+class EarlyToolDispatcher:
+    def __init__(self, context: contextvars.Context):
+        # 工具在该上下文中执行（实时输出的 hub、内核 key 等），与消息结束后再执行时相同
+        self._context = context
+        # tool_call_id -> (解析后的参数, 执行)
+        self._started: Dict[str, Tuple[Any, Slot]] = {}
+        self._python_batch: Optional[PythonCallBatch] = None
+        self._python_count = 0
+        self._tasks: List[asyncio.Task] = []
+
+    def dispatch(self, tool_call_id: str, name: str, arguments: str) -> None:
+        """参数已完整的调用立即开始执行，作为 LLMStream 的 on_tool_call_ready"""
+        if tool_call_id in self._started:
+            return
+        if action_call_tool.is_python_call(name) and engine_enum.default_executor_engine in engine_enum.RESIDENT_ENGINES:
+            # 批次过期时需要重新执行，常驻引擎中已执行的片段会执行两次
+            return
+        global_logger.info(f"提前执行工具调用：{name}（{tool_call_id}）")
+        self._started[tool_call_id] = (json.loads(arguments), self._context.run(self._start, name, arguments))
+
+    def _start(self, name: str, arguments: str) -> Slot:
+        if not action_call_tool.is_python_call(name):
+            task = asyncio.create_task(action_call_tool.execute_single_call_async(name, arguments))
+            self._tasks.append(task)
+            return task
+        try:
+            tool = ExecutePythonCodeTool(**json.loads(arguments))
+        except Exception:
+            return action_call_tool._tool_error(name, arguments)
+        if self._python_batch is None:
+            self._python_batch = PythonCallBatch()
+        self._python_batch.add(tool)
+        self._python_count += 1
+        return self._python_count - 1
+
+    def _reuse(self, cd: action_type.CallDescriptor) -> Optional[Slot]:
+        if cd.kind != action_type.CallKind.TOOL or cd.tool_call_id not in self._started:
+            return None
+        parsed, slot = self._started.pop(cd.tool_call_id)
+        try:
+            same = json.loads(cd.arguments) == parsed
+        except (TypeError, ValueError):
+            same = False
+        if not same:
+            global_logger.warning(f"工具调用 {cd.tool_call_id} 的参数在提前执行后发生变化，重新执行")
+            return None
+        return slot
+
+    def _python_batch_stale(self, call_descriptors: List[action_type.CallDescriptor]) -> bool:
+        """批次中的片段必须是最终消息中 python 调用的前缀，且参数相同"""
+        early = [(tool_call_id, parsed) for tool_call_id, (parsed, slot) in self._started.items() if isinstance(slot, int)]
+        final = [
+            cd for cd in call_descriptors
+            if cd.kind == action_type.CallKind.TOOL and action_call_tool.is_python_call(cd.name)
+        ]
+        if [cd.tool_call_id for cd in final[:len(early)]] != [tool_call_id for tool_call_id, _ in early]:
+            return True
+        for cd, (_, parsed) in zip(final, early):
+            try:
+                if json.loads(cd.arguments) != parsed:
+                    return True
+            except (TypeError, ValueError):
+                return True
+        return False
+
+    async def gather(self, call_descriptors: List[action_type.CallDescriptor]) -> List[Any]:
+        """
+        执行整条消息的调用，复用已开始的执行，返回值与 call_descriptors 一一对应（异常原样放在对应位置）。
+        需要在 context 中调用（即工具任务内）。
+        """
+        if self._python_batch is not None and self._python_batch_stale(call_descriptors):
+            global_logger.warning("提前执行的代码片段与最终消息不一致，取消整个批次，按最终消息重新执行")
+            self._python_batch.cancel()
+            self._python_batch = None
+            self._python_count = 0
+            self._started = {k: v for k, v in self._started.items() if not isinstance(v[1], int)}
+        slots: List[Slot] = []
+        for cd in call_descriptors:
+            slot = self._reuse(cd)
+            slots.append(self._start(cd.name, cd.arguments) if slot is None else slot)
+        for tool_call_id, (_, slot) in self._started.items():
+            # 最终消息中没有的调用（不应出现）：独立任务取消（python 批次已在上面按最终消息重建）
+            global_logger.warning(f"提前执行的工具调用 {tool_call_id} 不在最终消息中")
+            if isinstance(slot, asyncio.Task):
+                slot.cancel()
+        self._started.clear()
+        python_outputs: List[Any] = []
+        if self._python_batch is not None:
+            try:
+                python_outputs = await self._python_batch.finish()
+            except Exception as e:
+                python_outputs = [e] * self._python_count
+        tasks = [slot for slot in slots if isinstance(slot, asyncio.Task)]
+        if tasks:
+            await asyncio.wait(tasks)
+        results: List[Any] = []
+        for slot in slots:
+            if isinstance(slot, asyncio.Task):
+                if slot.cancelled():
+                    results.append(asyncio.CancelledError())
+                else:
+                    results.append(slot.exception() or slot.result())
+            elif isinstance(slot, int):
+                results.append(python_outputs[slot])
+            else:
+                results.append(slot)
+        return results
+
+    def cancel(self) -> None:
+        """取消全部未结束的执行（消息不再处理工具调用，或处理被中断时）"""
+        for task in self._tasks:
+            task.cancel()
+        self._started.clear()
+        if self._python_batch is not None:
+            self._python_batch.cancel()
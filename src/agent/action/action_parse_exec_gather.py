@@ -64,14 +64,34 @@ def collect_call_descriptors(assist_msg: ChatCompletionMessage) -> List[action_t
 async def execute_calls_concurrently_async(
     call_descriptors: List[action_type.CallDescriptor],
 ) -> List[str]:
-    """并发执行所有调用并返回结果列表，顺序与 call_descriptors 对应"""
+    """
+    并发执行所有调用并返回结果列表，顺序与 call_descriptors 对应。
+    多个 execute_python_code 调用作为一批交给依赖感知的调度器：互不依赖的并行，有依赖的按顺序，工作区确定地合并。
+    """
+    python_indexes = [i for i, cd in enumerate(call_descriptors) if action_call_tool.is_python_call(cd.name)]
+    if len(python_indexes) < 2:
+        python_indexes = []
+    other_indexes = [i for i in range(len(call_descriptors)) if i not in python_indexes]
     tasks = [
         asyncio.create_task(
-            action_call_tool.execute_single_call_async(cd.name, cd.arguments)
+            action_call_tool.execute_single_call_async(call_descriptors[i].name, call_descriptors[i].arguments)
         )
-        for cd in call_descriptors
+        for i in other_indexes
     ]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    if python_indexes:
+        tasks.append(asyncio.create_task(
+            action_call_tool.execute_python_calls_async([call_descriptors[i].arguments for i in python_indexes])
+        ))
+    gathered = await asyncio.gather(*tasks, return_exceptions=True)
+    results: List[Any] = [None] * len(call_descriptors)
+    for i, result in zip(other_indexes, gathered):
+        results[i] = result
+    if python_indexes:
+        batch_results = gathered[-1]
+        if isinstance(batch_results, BaseException):
+            batch_results = [batch_results] * len(python_indexes)
+        for i, result in zip(python_indexes, batch_results):
+            results[i] = result
     return results
 
 
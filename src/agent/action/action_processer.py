@@ -22,17 +22,26 @@ from openai.types.chat.chat_completion_message_param import (
 from dataclasses import dataclass
 from typing import List, Tuple, Optional, Any
 from src.agent.action import action_parse_exec_gather 
+from src.agent.action import action_early_dispatch
 from src.agent.msg import msg_mem
 
-async def process_tool_calls(message_mem: msg_mem.MessageMemory, assist_msg: ChatCompletionMessage) -> msg_mem.MessageMemory:
+async def process_tool_calls(
+    message_mem: msg_mem.MessageMemory,
+    assist_msg: ChatCompletionMessage,
+    dispatcher: Optional[action_early_dispatch.EarlyToolDispatcher] = None,
+) -> msg_mem.MessageMemory:
     """
     封装：1) collect_call_descriptors 2) execute_calls_concurrently_async 3) append_results_to_messages
+    dispatcher 不为空时，复用流式输出期间已提前开始的执行
     返回 (call_descriptors, results)
     """
     # 1. 收集所有需要并发执行的调用描述
     call_descriptors = action_parse_exec_gather.collect_call_descriptors(assist_msg)
     # 2. 并发执行所有调用（协程）
-    results = await action_parse_exec_gather.execute_calls_concurrently_async(call_descriptors)
+    if dispatcher is not None:
+        results = await dispatcher.gather(call_descriptors)
+    else:
+        results = await action_parse_exec_gather.execute_calls_concurrently_async(call_descriptors)
     # 3. 将每个调用的输出按顺序追加到 messages
     action_parse_exec_gather.append_results_to_messages(message_mem, call_descriptors, results)
     return message_mem
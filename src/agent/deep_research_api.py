@@ -20,19 +20,32 @@ from openai.types.chat.chat_completion_message_param import (
 
 import pprint
 import asyncio
+import contextvars
 from typing import List, Tuple, Optional, Any, AsyncGenerator
 
 from src.utils.log_decorator import global_logger, traceable
 
 from src.agent import llm
 from src.agent.action import action_processer 
+from src.agent.action import action_early_dispatch
 from src.agent.msg import msg_mem 
 from src.agent.msg import msg_ctr 
+from src.agent.msg import msg_tokens
 from src.agent.tool import (
     tool_gen_descrip,
     tool_base
 )
 from src.mcp import mcp_2_tool 
+from src.runtime.ctx_mgr import stdout_stream
+from src.runtime.sub_kernel import kernel_python_executor
+
+
+def _new_tool_context(message_mem: msg_mem.MessageMemory) -> tuple[stdout_stream.StdoutStreamHub, contextvars.Context]:
+    """工具执行的上下文：实时输出汇总到 hub；内核执行引擎按 agent 分配常驻内核"""
+    hub = stdout_stream.StdoutStreamHub()
+    tool_context = stdout_stream.context_with_hub(hub)
+    tool_context.run(kernel_python_executor.current_kernel_key.set, message_mem.agent_name_id)
+    return hub, tool_context
 
 
 async def run_agent_generator(
@@ -44,16 +57,48 @@ async def run_agent_generator(
     tools_schema_list = tool_gen_descrip.get_tools_schema(tool_class_list)
     mcp_schema_list = mcp_2_tool.filter_schema_for_register(mcp_tool_name_list)
 
-    # 模型的第一轮调用
-    assist_msg: ChatCompletionMessage = llm.run_llm_once(message_mem, tools_schema_list+mcp_schema_list)
-    yield message_mem
+    while True:
+        # 1. 模型调用：流式生成期间 yield 已生成的部分（assistant_partial），供前端逐步渲染；
+        #    参数已完整的工具调用提前开始执行，与剩余部分的生成重叠
+        hub, tool_context = _new_tool_context(message_mem)
+        dispatcher = action_early_dispatch.EarlyToolDispatcher(tool_context) if action_early_dispatch.EARLY_DISPATCH_ENABLED else None
+        stream = llm.LLMStream(
+            message_mem, tools_schema_list+mcp_schema_list,
+            on_tool_call_ready=dispatcher.dispatch if dispatcher is not None else None,
+        )
+        try:
+            try:
+                async for _ in stream:
+                    message_mem.tool_stdout_partial = hub.tails()
+                    yield message_mem
+            except msg_tokens.TokenBudgetExceeded as e:
+                # 发送前的预算检查：预算已用完，不再请求模型
+                global_logger.info(f"对话控制：{e}，终止对话")
+                break
+            assist_msg: ChatCompletionMessage = stream.message
+            message_mem.tool_stdout_partial = {}
+            yield message_mem  # 返回assistant消息，供前端展示
 
-    # 如果需要调用工具，则进行模型的多轮调用，直到模型判断无需调用工具
-    while (assist_msg.tool_calls or assist_msg.function_call) and message_mem.need_msg_stop_control(message_mem.msg_ctr_cfg) == False:
-        # 1. 处理工具调用（包括函数调用），并将工具调用结果追加到消息中
-        yield await action_processer.process_tool_calls(message_mem, assist_msg) # 返回tool消息，供前端展示
-        
-        # 2. 让模型基于工具输出继续生成下一轮输出
-        assist_msg = llm.run_llm_once(message_mem, tools_schema_list+mcp_schema_list)
-        yield message_mem  # 返回assistant消息，供前端展示
+            # 如果需要调用工具，则进行模型的多轮调用，直到模型判断无需调用工具
+            if not (assist_msg.tool_calls or assist_msg.function_call) or message_mem.need_msg_stop_control(message_mem.msg_ctr_cfg):
+                break
+            # 2. 处理工具调用（包括函数调用），并将工具调用结果追加到消息中
+            #    执行期间把工具的实时输出放在 tool_stdout_partial 中 yield，供前端展示进度
+            tool_task = asyncio.create_task(
+                action_processer.process_tool_calls(message_mem, assist_msg, dispatcher),
+                context=tool_context,
+            )
+            try:
+                while await hub.wait_update(tool_task):
+                    message_mem.tool_stdout_partial = hub.tails()
+                    yield message_mem
+                message_mem.tool_stdout_partial = {}
+                yield await tool_task # 返回tool消息，供前端展示
+            finally:
+                tool_task.cancel()
+        finally:
+            # 不再处理的（或被中断的）提前执行
+            if dispatcher is not None:
+                dispatcher.cancel()
+        # 3. 回到 1，让模型基于工具输出继续生成下一轮输出
     yield message_mem
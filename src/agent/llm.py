@@ -22,29 +22,57 @@ from openai.types.chat.chat_completion_message_function_tool_call_param import (
     ChatCompletionMessageFunctionToolCallParam,
 )
 
-from typing import cast
+import os
+import time
+from typing import AsyncIterator, Callable, Optional, cast
 
 from src.agent.msg import msg_mem
+from src.agent.msg import msg_compact
+from src.agent.msg import msg_tokens
 from src.utils.log_decorator import global_logger, traceable
 from src.agent.llm_client import glm as chat_llm
+from src.agent.llm_client import stream_assembler
+from src.agent.llm_client import response_cache
 
-@traceable
-def _generate_chat_completion(message_mem: msg_mem.MessageMemory, tools_schema_list=None) -> ChatCompletion:
-    completion: ChatCompletion = chat_llm.client.chat.completions.create(
-        messages=message_mem.messages,
+# 流式输出：ALGO_AGENT_LLM_STREAM=0 时关闭，整条消息生成后一次返回
+STREAM_ENABLED = os.getenv("ALGO_AGENT_LLM_STREAM", "1") != "0"
+# 流式输出时最多每隔多少秒 yield 一次已生成的部分，避免前端逐 token 重绘
+STREAM_YIELD_INTERVAL = float(os.getenv("ALGO_AGENT_LLM_STREAM_INTERVAL", "0.05"))
+
+def _completion_params(message_mem: msg_mem.MessageMemory, tools_schema_list=None) -> dict:
+    """
+    chat.completions.create 的参数，同时用于计算响应缓存的键。
+    超出上下文预算时发送压缩后的消息；按 Token 预算限制 max_tokens，预算已用完时抛出 msg_tokens.TokenBudgetExceeded
+    """
+    messages = msg_compact.request_messages(message_mem)
+    params = dict(
+        messages=messages,
         model=chat_llm.default_glm_model,
         tools=tools_schema_list,
         parallel_tool_calls=True,
         temperature=0.2,
     )
-    return completion
+    max_tokens = msg_tokens.preflight(message_mem, messages)
+    if max_tokens is not None:
+        params["max_tokens"] = max_tokens
+    return params
+
+
+@traceable
+def _generate_chat_completion(params: dict) -> response_cache.CacheResult:
+    return response_cache.complete(
+        params, lambda: chat_llm.client.chat.completions.create(**params),
+    )
 
 
 def _extract_assistant_output_from_chat(message_mem: msg_mem.MessageMemory, tools_schema_list=None) -> ChatCompletionMessage:
-    completion: ChatCompletion = _generate_chat_completion(message_mem, tools_schema_list)
+    params = _completion_params(message_mem, tools_schema_list)
+    completion, cache_hit = _generate_chat_completion(params)
     choice: Choice = completion.choices[0]
     assistant_message: ChatCompletionMessage = choice.message
     
+    # 先记录用量：未压缩时 params["messages"] 就是 message_mem.messages，追加之后就不再是本次的 prompt
+    msg_tokens.record_turn(message_mem, params["messages"], assistant_message, completion.usage, cached=cache_hit)
     message_mem.add_message(assistant_message, choice.finish_reason)
     return assistant_message
 
@@ -59,3 +87,95 @@ def run_llm_once(message_mem: msg_mem.MessageMemory, tools_schema_list: list) ->
     """调用 LLM 生成一次 assistant 输出"""
     return _generate_assistant_output_append(message_mem, tools_schema_list)
 
+
+@traceable
+async def _generate_chat_completion_async(params: dict) -> response_cache.CacheResult:
+    # 异步客户端按服务商共享有上限的连接池，等待响应时不阻塞事件循环，多个 agent 的请求可以同时在途
+    return await response_cache.complete_async(
+        params, lambda: chat_llm.async_client().chat.completions.create(**params),
+    )
+
+
+async def run_llm_once_async(message_mem: msg_mem.MessageMemory, tools_schema_list: list) -> ChatCompletionMessage:
+    """run_llm_once 的异步版本"""
+    params = _completion_params(message_mem, tools_schema_list)
+    completion, cache_hit = await _generate_chat_completion_async(params)
+    choice: Choice = completion.choices[0]
+    assistant_message: ChatCompletionMessage = choice.message
+
+    # 先记录用量：未压缩时 params["messages"] 就是 message_mem.messages，追加之后就不再是本次的 prompt
+    msg_tokens.record_turn(message_mem, params["messages"], assistant_message, completion.usage, cached=cache_hit)
+    message_mem.add_message(assistant_message, choice.finish_reason)
+    return assistant_message
+
+
+
+class LLMStream:
+    """
+    调用一次 LLM，async for 迭代期间 message_mem.assistant_partial 为已生成的部分（供前端逐步渲染），
+    结束后完整的 assistant 消息追加到 message_mem，同时保存在 message 属性中。
+    用法：
+        stream = LLMStream(message_mem, tools_schema_list)
+        async for _ in stream:
+            yield message_mem
+        assist_msg = stream.message
+    启用响应缓存（ALGO_AGENT_LLM_CACHE）时按非流式调用，录制和回放的是完整的响应。
+    流式输出时，每个工具调用的参数一生成完整就调用 on_tool_call_ready(tool_call_id, name, arguments)（按调用顺序），
+    调用方可以提前开始执行；非流式时不调用。
+    """
+    def __init__(
+        self,
+        message_mem: msg_mem.MessageMemory,
+        tools_schema_list: list,
+        stream: Optional[bool] = None,
+        on_tool_call_ready: Optional[Callable[[str, str, str], None]] = None,
+    ):
+        self.message_mem = message_mem
+        self.tools_schema_list = tools_schema_list
+        self.stream = STREAM_ENABLED if stream is None else stream
+        if response_cache.MODE != response_cache.CacheMode.OFF:
+            self.stream = False
+        self.on_tool_call_ready = on_tool_call_ready
+        self.message: Optional[ChatCompletionMessage] = None
+        # 首个 token 的延迟（秒），非流式调用时为整条消息的耗时
+        self.ttft_seconds: Optional[float] = None
+
+    def __aiter__(self) -> AsyncIterator[msg_mem.MessageMemory]:
+        return self._run()
+
+    async def _run(self) -> AsyncIterator[msg_mem.MessageMemory]:
+        start = time.perf_counter()
+        if not self.stream:
+            self.message = await run_llm_once_async(self.message_mem, self.tools_schema_list)
+            self.ttft_seconds = time.perf_counter() - start
+            return
+        assembler = stream_assembler.StreamAssembler()
+        params = _completion_params(self.message_mem, self.tools_schema_list)
+        # include_usage：最后一个片段带有服务端统计的用量，本地估计只在服务端没有返回时使用
+        response = await chat_llm.async_client().chat.completions.create(
+            **params, stream=True, stream_options={"include_usage": True}
+        )
+        last_yield = start
+        try:
+            async for chunk in response:
+                if assembler.add_chunk(chunk) and self.ttft_seconds is None:
+                    self.ttft_seconds = time.perf_counter() - start
+                    global_logger.info(f"模型首个 token 延迟：{self.ttft_seconds * 1000:.0f} ms")
+                if self.on_tool_call_ready is not None:
+                    for parts in assembler.take_ready_tool_calls():
+                        self.on_tool_call_ready(parts.id, parts.name, parts.arguments)
+                now = time.perf_counter()
+                if now - last_yield >= STREAM_YIELD_INTERVAL:
+                    last_yield = now
+                    self.message_mem.assistant_partial = assembler.partial()
+                    yield self.message_mem
+        finally:
+            self.message_mem.assistant_partial = None
+            await response.close()
+        global_logger.info(
+            f"模型流式输出完成：{assembler.chunk_count} 个片段，总耗时 {(time.perf_counter() - start) * 1000:.0f} ms，"
+            f"finish_reason={assembler.finish_reason}"
+        )
+        self.message = assembler.to_message()
+        msg_tokens.record_turn(self.message_mem, params["messages"], self.message, assembler.usage)
+        self.message_mem.add_message(self.message, assembler.finish_reason)
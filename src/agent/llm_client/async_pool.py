@@ -0,0 +1,60 @@
+"""
+LLM 的异步客户端：每个服务商（base_url）共享一个 AsyncOpenAI，底层是有上限的 httpx 连接池，
+多个 agent / swarm 成员的请求可以同时在途，不占用线程，也不阻塞事件循环。
+
+- ALGO_AGENT_LLM_MAX_CONNECTIONS：每个服务商的最大连接数（即最多同时在途的请求数），默认 32，超出的请求在连接池中排队；
+- ALGO_AGENT_LLM_KEEPALIVE：保留的空闲连接数，默认与最大连接数相同；
+- ALGO_AGENT_LLM_TIMEOUT：单次请求的超时时间（秒），默认 600。
+
+httpx 的连接绑定在创建它的事件循环上，所以按事件循环区分客户端：
+同一个事件循环中的所有调用共享连接池；事件循环被回收后，对应的客户端随之释放。
+"""
+import asyncio
+import os
+import threading
+import weakref
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+MAX_CONNECTIONS = int(os.getenv("ALGO_AGENT_LLM_MAX_CONNECTIONS", "32"))
+MAX_KEEPALIVE = int(os.getenv("ALGO_AGENT_LLM_KEEPALIVE", str(MAX_CONNECTIONS)))
+REQUEST_TIMEOUT = float(os.getenv("ALGO_AGENT_LLM_TIMEOUT", "600"))
+
+# 事件循环 -> {(base_url, api_key): AsyncOpenAI}
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple[str, str | None], AsyncOpenAI]]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def _new_client(api_key: str | None, base_url: str) -> AsyncOpenAI:
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE),
+    )
+    return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, timeout=REQUEST_TIMEOUT)
+
+
+def get_async_client(api_key: str | None, base_url: str) -> AsyncOpenAI:
+    """当前事件循环中该服务商共享的异步客户端，必须在事件循环中调用"""
+    loop = asyncio.get_running_loop()
+    key = (base_url, api_key)
+    with _lock:
+        clients = _clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None or client.is_closed():
+            client = clients[key] = _new_client(api_key, base_url)
+    return client
+
+
+def pool_metrics() -> dict[str, int]:
+    """各事件循环中的客户端数量，用于日志"""
+    with _lock:
+        return {"event_loops": len(_clients), "clients": sum(len(c) for c in _clients.values())}
+
+
+async def aclose_all() -> None:
+    """关闭当前事件循环的全部客户端（释放连接），之后再调用 get_async_client 会重新创建"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _clients.pop(loop, {})
+    for client in clients.values():
+        await client.close()
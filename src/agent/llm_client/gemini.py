@@ -1,16 +1,24 @@
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
+from src.agent.llm_client import async_pool
+
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
 
 client = OpenAI(
     api_key=GEMINI_API_KEY,
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
+    base_url=GEMINI_BASE_URL
 ) 
 
+
+def async_client() -> AsyncOpenAI:
+    """当前事件循环共享的异步客户端（有上限的连接池，见 async_pool）"""
+    return async_pool.get_async_client(GEMINI_API_KEY, GEMINI_BASE_URL)
+
 gemini_3_flash_preview_model ="gemini-3-flash-preview"
 
 
@@ -1,15 +1,24 @@
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
+from src.agent.llm_client import async_pool
+
 
 ZHIPU_API_KEY = os.getenv("ZHIPU_API_KEY")
+GLM_BASE_URL = "https://open.bigmodel.cn/api/paas/v4/"
 
 client = OpenAI(
     api_key=ZHIPU_API_KEY,
-    base_url="https://open.bigmodel.cn/api/paas/v4/"
+    base_url=GLM_BASE_URL
 )
+
+
+def async_client() -> AsyncOpenAI:
+    """当前事件循环共享的异步客户端（有上限的连接池，见 async_pool）"""
+    return async_pool.get_async_client(ZHIPU_API_KEY, GLM_BASE_URL)
+
 glm_4_6_v_model = "glm-4.6v"
 glm_4_6_model = "glm-4.6"
 glm_4_7_flashx_model = "glm-4.7-flashx"
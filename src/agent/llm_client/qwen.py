@@ -1,16 +1,24 @@
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
+from src.agent.llm_client import async_pool
+
 
 QWEN_API_KEY = os.getenv("QWEN_API_KEY")
+QWEN_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
 
 client = OpenAI(
     api_key=QWEN_API_KEY,    
-    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",  # 填写DashScope SDK的base_url
+    base_url=QWEN_BASE_URL,  # 填写DashScope SDK的base_url
 )
 
+
+def async_client() -> AsyncOpenAI:
+    """当前事件循环共享的异步客户端（有上限的连接池，见 async_pool）"""
+    return async_pool.get_async_client(QWEN_API_KEY, QWEN_BASE_URL)
+
 qwen_plus_model="qwen-plus"
 
 """
@@ -0,0 +1,208 @@
+"""
+模型响应的磁盘缓存与录制 / 回放。
+
+ALGO_AGENT_LLM_CACHE 选择模式：
+- off（默认）：不使用缓存；
+- record：先查缓存，命中直接返回，未命中时调用模型并写入缓存。重新运行同一会话时，相同的前缀不再付出模型的延迟和费用；
+- replay：严格回放，只读缓存，未命中时抛出 CacheMissError。用于测试和基准，保证不访问模型、结果确定。
+
+缓存键是请求的规范化哈希：messages、model、tools 和采样参数按 key 排序后序列化。
+值为 None 的字段会去掉，所以流式组装的消息和非流式 model_dump 的结果得到相同的键。
+max_tokens 不参与键：它由剩余的 Token 预算得到，而缓存命中不计入已用量（见 msg_tokens），回放时会与录制时不同。
+工具输出中的溢出文件路径（output_budget，位于按启动时间区分的运行目录下）只保留文件名，重新运行同一会话时键不变。
+每个响应一个 JSON 文件，写入时先写临时文件再 rename。
+complete / complete_async 返回 CacheResult，hit 标记响应是否来自缓存，命中的请求不计入用量和费用。
+总大小超过 ALGO_AGENT_LLM_CACHE_MAX_MB（默认 512）时，按最近使用时间淘汰最旧的文件（命中时会更新 mtime）。
+ALGO_AGENT_LLM_CACHE_DIR 指定目录，默认 wst/llm_cache/，不按启动时间区分。
+"""
+import asyncio
+import contextlib
+import enum
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Awaitable, Callable, NamedTuple, Optional
+
+from openai.types.chat.chat_completion import ChatCompletion
+from pydantic import BaseModel
+
+from src.runtime.status_mgr import output_budget
+from src.utils.log_decorator import global_logger
+from src.utils.path_util import static_path
+
+
+class CacheMode(enum.StrEnum):
+    OFF = "off"
+    RECORD = "record"
+    REPLAY = "replay"
+
+
+MODE = CacheMode(os.getenv("ALGO_AGENT_LLM_CACHE", CacheMode.OFF.value))
+CACHE_DIR = Path(os.getenv("ALGO_AGENT_LLM_CACHE_DIR", str(static_path.Dir.LLM_CACHE_DIR)))
+MAX_BYTES = int(float(os.getenv("ALGO_AGENT_LLM_CACHE_MAX_MB", "512")) * 1024 * 1024)
+# 淘汰时降到上限的这个比例以下，避免每次写入都触发淘汰
+EVICT_TO_RATIO = 0.9
+
+
+class CacheMissError(RuntimeError):
+    """回放模式下请求没有录制过"""
+
+
+class CacheResult(NamedTuple):
+    completion: ChatCompletion
+    # 响应来自缓存，没有实际调用模型
+    hit: bool
+
+
+def _canonical(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        value = value.model_dump(mode="json")
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, str):
+        return output_budget.SPILL_PATH_RE.sub(r"<tool_output>/\1", value)
+    return value
+
+
+def request_key(params: dict[str, Any]) -> str:
+    """请求参数（chat.completions.create 的关键字参数）的规范化哈希"""
+    params = {k: v for k, v in params.items() if k != "max_tokens"}
+    payload = json.dumps(_canonical(params), sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, root: Path, max_bytes: int = MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 第一次写入时扫描目录得到，之后增量维护
+        self._total_bytes: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[ChatCompletion]:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        # 标记为最近使用，淘汰时保留（可能刚好被其他线程淘汰）
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(path)
+        with self._lock:
+            self.hits += 1
+        return ChatCompletion.model_validate_json(data)
+
+    def put(self, key: str, completion: ChatCompletion) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = completion.model_dump_json().encode("utf-8")
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        with self._lock:
+            old_size = path.stat().st_size if path.exists() else 0
+            os.replace(tmp, path)
+            self.writes += 1
+            if self._total_bytes is None:
+                self._total_bytes = sum(f.stat().st_size for f in self._files())
+            else:
+                self._total_bytes += len(data) - old_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _files(self) -> list[Path]:
+        return list(self.root.glob("*/*.json"))
+
+    def _evict(self) -> None:
+        entries = []
+        for f in self._files():
+            try:
+                stat = f.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, f))
+        entries.sort(key=lambda entry: entry[0])
+        target = self.max_bytes * EVICT_TO_RATIO
+        for _, size, f in entries:
+            if self._total_bytes <= target:
+                break
+            f.unlink(missing_ok=True)
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def metrics(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "bytes": self._total_bytes or 0,
+            }
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(CACHE_DIR, MAX_BYTES)
+        return _cache
+
+
+def cache_metrics() -> dict[str, Any]:
+    """命中 / 未命中 / 写入 / 淘汰次数与缓存大小，用于日志"""
+    return {"mode": MODE.value, **get_cache().metrics()}
+
+
+def _on_miss(key: str) -> None:
+    if MODE == CacheMode.REPLAY:
+        raise CacheMissError(f"回放模式下模型响应没有录制过：{key}（缓存目录 {get_cache().root}）")
+    global_logger.info(f"模型响应缓存未命中：{key[:12]}")
+
+
+def complete(params: dict[str, Any], create: Callable[[], ChatCompletion]) -> CacheResult:
+    """按缓存模式返回 create() 的结果，params 为请求参数（用于计算缓存键）"""
+    if MODE == CacheMode.OFF:
+        return CacheResult(create(), False)
+    cache = get_cache()
+    key = request_key(params)
+    cached = cache.get(key)
+    if cached is not None:
+        global_logger.info(f"模型响应缓存命中：{key[:12]}")
+        return CacheResult(cached, True)
+    _on_miss(key)
+    completion = create()
+    cache.put(key, completion)
+    return CacheResult(completion, False)
+
+
+async def complete_async(params: dict[str, Any], create: Callable[[], Awaitable[ChatCompletion]]) -> CacheResult:
+    """complete 的异步版本，文件读写不在事件循环线程上进行"""
+    if MODE == CacheMode.OFF:
+        return CacheResult(await create(), False)
+    cache = get_cache()
+    key = request_key(params)
+    cached = await asyncio.to_thread(cache.get, key)
+    if cached is not None:
+        global_logger.info(f"模型响应缓存命中：{key[:12]}")
+        return CacheResult(cached, True)
+    _on_miss(key)
+    completion = await create()
+    await asyncio.to_thread(cache.put, key, completion)
+    return CacheResult(completion, False)
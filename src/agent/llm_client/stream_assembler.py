@@ -0,0 +1,125 @@
+"""
+流式输出（stream=True）的增量组装：把 ChatCompletionChunk 中的 content、reasoning_content、tool_calls 片段
+拼装成与非流式调用相同的 ChatCompletionMessage。
+
+tool_calls 按 index 组装：id / name 只出现在该调用的第一个片段中，arguments 分多个片段依次拼接。
+reasoning_content 不是 OpenAI 的标准字段（GLM / Qwen 等扩展），从 delta 的额外字段中读取。
+take_ready_tool_calls 返回参数已经完整的调用（JSON 对象能解析，说明右括号已经到达），供流式期间提前执行。
+"""
+import json
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from openai.types.chat import ChatCompletionChunk, ChatCompletionMessage
+from openai.types.chat.chat_completion_message_function_tool_call import (
+    ChatCompletionMessageFunctionToolCall,
+    Function,
+)
+from openai.types.completion_usage import CompletionUsage
+
+
+@dataclass
+class ToolCallParts:
+    index: int
+    id: str = ""
+    name: str = ""
+    arguments_parts: list[str] = field(default_factory=list)
+    # 是否已由 take_ready_tool_calls 返回过
+    taken: bool = False
+
+    @property
+    def arguments(self) -> str:
+        return "".join(self.arguments_parts)
+
+
+class StreamAssembler:
+    def __init__(self):
+        self.content_parts: list[str] = []
+        self.reasoning_parts: list[str] = []
+        self.tool_calls: dict[int, ToolCallParts] = {}
+        self.finish_reason: Optional[str] = None
+        self.usage: Optional[CompletionUsage] = None
+        self.chunk_count = 0
+
+    def add_chunk(self, chunk: ChatCompletionChunk) -> bool:
+        """加入一个片段，返回该片段是否带有模型输出（用于统计首个 token 的延迟）"""
+        self.chunk_count += 1
+        if chunk.usage is not None:
+            self.usage = chunk.usage
+        has_output = False
+        for choice in chunk.choices:
+            if choice.index != 0:
+                continue
+            delta = choice.delta
+            if delta.content:
+                self.content_parts.append(delta.content)
+                has_output = True
+            reasoning = (delta.model_extra or {}).get("reasoning_content")
+            if reasoning:
+                self.reasoning_parts.append(reasoning)
+                has_output = True
+            for tool_delta in delta.tool_calls or []:
+                parts = self.tool_calls.setdefault(tool_delta.index, ToolCallParts(index=tool_delta.index))
+                if tool_delta.id:
+                    parts.id = tool_delta.id
+                if tool_delta.function is not None:
+                    if tool_delta.function.name:
+                        parts.name += tool_delta.function.name
+                    if tool_delta.function.arguments:
+                        parts.arguments_parts.append(tool_delta.function.arguments)
+                has_output = True
+            if choice.finish_reason:
+                self.finish_reason = choice.finish_reason
+        return has_output
+
+    @property
+    def content(self) -> str:
+        return "".join(self.content_parts)
+
+    @property
+    def reasoning_content(self) -> str:
+        return "".join(self.reasoning_parts)
+
+    def take_ready_tool_calls(self) -> list[ToolCallParts]:
+        """
+        参数已完整、且之前没有返回过的调用。严格按 index 顺序：前一个调用的参数还不完整时，后面的也不返回，
+        保证调用方看到的顺序与消息中的顺序一致。
+        """
+        ready: list[ToolCallParts] = []
+        for _, parts in sorted(self.tool_calls.items()):
+            if parts.taken:
+                continue
+            arguments = parts.arguments
+            # 只有以右括号结尾时才尝试解析，避免每个片段都对整个参数做一次 json.loads
+            if not (parts.id and parts.name and arguments.rstrip().endswith("}")):
+                break
+            try:
+                json.loads(arguments)
+            except ValueError:
+                break
+            parts.taken = True
+            ready.append(parts)
+        return ready
+
+    def _tool_call_dicts(self) -> list[dict[str, Any]]:
+        return [
+            {"id": parts.id, "type": "function", "function": {"name": parts.name, "arguments": parts.arguments}}
+            for _, parts in sorted(self.tool_calls.items())
+        ]
+
+    def partial(self) -> dict[str, Any]:
+        """已收到的部分，格式与 assistant 消息的 model_dump 一致（arguments 可能还不是完整的 JSON）"""
+        partial: dict[str, Any] = {"role": "assistant", "content": self.content, "tool_calls": self._tool_call_dicts()}
+        if self.reasoning_parts:
+            partial["reasoning_content"] = self.reasoning_content
+        return partial
+
+    def to_message(self) -> ChatCompletionMessage:
+        tool_calls = [
+            ChatCompletionMessageFunctionToolCall(
+                id=call["id"], type="function", function=Function(**call["function"]),
+            )
+            for call in self._tool_call_dicts()
+        ]
+        extra = {"reasoning_content": self.reasoning_content} if self.reasoning_parts else {}
+        return ChatCompletionMessage(role="assistant", content=self.content, tool_calls=tool_calls or None, **extra)
@@ -0,0 +1,124 @@
+"""
+发送给模型前的上下文压缩：MessageMemory.messages 保留完整历史（同时落盘），每次请求只发送压缩后的视图。
+
+- 预算：按 msg_tokens 的本地估计计算，MessageControlConfig.context_token_budget，未设置时取 ALGO_AGENT_CONTEXT_TOKEN_BUDGET，0 表示不压缩；
+- 超出预算时，从旧到新压缩消息，直到降到预算的 COMPACT_TO_RATIO 以下。以下消息不压缩：
+  - system 消息和第一条 user 消息（任务本身）；
+  - 最近的 ALGO_AGENT_CONTEXT_KEEP_RECENT 条消息（默认 6）；
+- 压缩的内容：
+  - 工具输出只保留状态行和开头、结尾各 ALGO_AGENT_CONTEXT_ELIDE_CHARS 个字符；
+  - 执行失败的代码（已被后续调用取代的尝试）换成一行说明；
+  - assistant 的 reasoning_content 去掉；
+- 前缀稳定：压缩结果只取决于消息本身，压缩边界（MessageMemory.compact_boundary）只向后移动，
+  且每次压缩一批而不是每轮压缩一条。所以相邻两轮请求中边界之前的部分逐字节相同，服务商的前缀缓存可以命中。
+"""
+import json
+import os
+from typing import Any, Optional
+
+# msg_mem 与 msg_ctr 互相导入，需要先导入 msg_mem
+from src.agent.msg import msg_mem
+from src.agent.msg import msg_ctr
+from src.agent.msg import msg_tokens
+from src.utils.log_decorator import global_logger
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("ALGO_AGENT_CONTEXT_TOKEN_BUDGET", "0"))
+KEEP_RECENT = int(os.getenv("ALGO_AGENT_CONTEXT_KEEP_RECENT", "6"))
+ELIDE_CHARS = int(os.getenv("ALGO_AGENT_CONTEXT_ELIDE_CHARS", "300"))
+# 超出预算时压缩到预算的这个比例以下，留出余量，避免边界每轮都移动、前缀缓存每轮失效
+COMPACT_TO_RATIO = 0.7
+
+PYTHON_TOOL_NAME = "execute_python_code"
+ELIDED_MARK = "[已压缩]"
+
+
+def _is_failed_python_output(content: Any) -> bool:
+    return isinstance(content, str) and content.startswith("## 代码执行") and not content.startswith("## 代码执行成功")
+
+
+def _failed_call_ids(messages: list) -> set[str]:
+    return {
+        m["tool_call_id"] for m in messages
+        if isinstance(m, dict) and m.get("role") == "tool" and _is_failed_python_output(m.get("content"))
+    }
+
+
+def _elide_text(text: str) -> str:
+    if len(text) <= ELIDE_CHARS * 2 + 100 or text.startswith(ELIDED_MARK):
+        return text
+    first_line, _, rest = text.partition("\n")
+    return (
+        f"{ELIDED_MARK} {first_line}\n{rest[:ELIDE_CHARS]}\n"
+        f"……（省略 {len(rest) - ELIDE_CHARS * 2} 字符，完整内容保存在对话记录中）……\n{rest[-ELIDE_CHARS:]}"
+    )
+
+
+def _elide_call(call: dict, failed_ids: set[str]) -> dict:
+    function = call.get("function") or {}
+    if call.get("id") not in failed_ids or function.get("name") != PYTHON_TOOL_NAME:
+        return call
+    try:
+        arguments = json.loads(function.get("arguments") or "{}")
+    except ValueError:
+        return call
+    code = arguments.get("python_code_snippet", "")
+    arguments["python_code_snippet"] = f"# {ELIDED_MARK} 该次尝试执行失败，已被后续调用取代（原代码 {len(code)} 字符）"
+    return {**call, "function": {**function, "arguments": json.dumps(arguments, ensure_ascii=False)}}
+
+
+def elide_message(message: Any, failed_ids: set[str]) -> Any:
+    """消息的压缩形式，只取决于消息本身和失败的调用，同一条消息每次得到相同的结果"""
+    if not isinstance(message, dict):
+        return message
+    role = message.get("role")
+    if role in ("tool", "function") and isinstance(message.get("content"), str):
+        return {**message, "content": _elide_text(message["content"])}
+    if role == "assistant":
+        elided = {k: v for k, v in message.items() if k != "reasoning_content"}
+        if message.get("tool_calls"):
+            elided["tool_calls"] = [_elide_call(call, failed_ids) for call in message["tool_calls"]]
+        return elided
+    return message
+
+
+def token_budget(config: Optional[msg_ctr.MessageControlConfig]) -> int:
+    if config is not None and config.context_token_budget is not None:
+        return config.context_token_budget
+    return DEFAULT_TOKEN_BUDGET
+
+
+def _first_compactable(messages: list) -> int:
+    """system 消息和第一条 user 消息之后的位置"""
+    for i, message in enumerate(messages):
+        if isinstance(message, dict) and message.get("role") == "user":
+            return i + 1
+    return 0
+
+
+def request_messages(message_mem: msg_mem.MessageMemory) -> list:
+    """本轮发送给模型的消息：边界之前的消息用压缩形式，超出预算时向后移动边界"""
+    messages = message_mem.messages
+    budget = token_budget(message_mem.msg_ctr_cfg)
+    if budget <= 0:
+        return messages
+    failed_ids = _failed_call_ids(messages)
+    start = _first_compactable(messages)
+    boundary = max(message_mem.compact_boundary, start)
+    view = [elide_message(m, failed_ids) if start <= i < boundary else m for i, m in enumerate(messages)]
+    tokens = [msg_tokens.estimate_message_tokens(m) for m in view]
+    total = sum(tokens)
+    if total > budget:
+        before = total
+        limit = len(messages) - KEEP_RECENT
+        while total > budget * COMPACT_TO_RATIO and boundary < limit:
+            view[boundary] = elide_message(messages[boundary], failed_ids)
+            elided_tokens = msg_tokens.estimate_message_tokens(view[boundary])
+            total += elided_tokens - tokens[boundary]
+            tokens[boundary] = elided_tokens
+            boundary += 1
+        message_mem.compact_boundary = boundary
+        global_logger.info(f"上下文压缩：约 {before} -> {total} tokens（预算 {budget}），压缩边界移动到第 {boundary} 条消息")
+        if total > budget:
+            global_logger.warning(f"上下文压缩后仍超出预算：约 {total} tokens（预算 {budget}），最近的消息不压缩")
+    # 视图中未压缩的消息与完整历史共享同一个对象，调用方不应修改
+    return view
@@ -46,6 +46,10 @@ class MessageControlConfig(BaseModel):
         default=None,
         description="单轮对话（单个角色单次发言）的最大 Token 长度上限，None表示不限制单轮",
     )
+    context_token_budget: Optional[int] = Field(
+        default=None,
+        description="每次请求发送给模型的上下文 Token 预算，超出时压缩较早的工具输出和失败的代码尝试（完整历史仍保留），None 表示使用 ALGO_AGENT_CONTEXT_TOKEN_BUDGET，0 表示不压缩",
+    )
     
     # 扩展控制：停止词触发
     stop_words: List[str] = Field(
@@ -0,0 +1,180 @@
+"""
+对话记录的持久化：快照 + 追加日志，每条消息的写入量与对话长度无关。
+
+- 快照：MsgMemPath（msg_all.json），格式与原来整份写入的 JSON 相同，先写临时文件再 rename；
+- 追加日志：MsgJournalPath（msg_journal.jsonl），每条消息一行，带序号（消息条数）和随消息变化的状态
+  （finish_reason、usage、compact_boundary、新增的用量记录）；
+- 第一次写入时生成快照，之后只追加；追加 ALGO_AGENT_MSG_SNAPSHOT_EVERY 条（默认 64）后重写快照并清空日志；
+- ALGO_AGENT_MSG_FSYNC 选择 fsync 策略：
+  - never：只交给操作系统缓冲，进程崩溃不丢，断电可能丢最近的写入；
+  - snapshot（默认）：快照 fsync 后再清空日志，日志本身不 fsync；
+  - always：每条日志都 fsync，最可靠也最慢；
+- 写入由 persist_writer 的后台线程完成，多条消息的追加合并为一次写入；
+- load_memory 读取快照再应用日志中更新的记录，最后一行不完整（写入中途崩溃）时忽略。
+"""
+import enum
+import json
+import os
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from openai.types.completion_usage import CompletionUsage
+
+from src.agent.msg import msg_tokens
+from src.utils import persist_writer
+from src.utils.log_decorator import global_logger
+from src.utils.path_util import dynamic_path
+
+if TYPE_CHECKING:
+    from src.agent.msg import msg_mem
+
+
+class FsyncPolicy(enum.StrEnum):
+    NEVER = "never"
+    SNAPSHOT = "snapshot"
+    ALWAYS = "always"
+
+
+FSYNC = FsyncPolicy(os.getenv("ALGO_AGENT_MSG_FSYNC", FsyncPolicy.SNAPSHOT.value))
+SNAPSHOT_EVERY = int(os.getenv("ALGO_AGENT_MSG_SNAPSHOT_EVERY", "64"))
+
+
+def _dumps(value: Any, **kwargs: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=lambda o: o.model_dump(), **kwargs)
+
+
+def snapshot_payload(memory: "msg_mem.MessageMemory") -> dict[str, Any]:
+    # messages 直接序列化，不经过字段类型（联合类型会丢掉 reasoning_content 等额外的键）
+    return {**memory.model_dump(mode="json", exclude={"messages"}), "messages": list(memory.messages)}
+
+
+class MessageJournal:
+    def __init__(self, agent_name_id: str):
+        self.snapshot_path = Path(dynamic_path.MsgMemPath(agent_name_id=agent_name_id).path())
+        self.journal_path = Path(dynamic_path.MsgJournalPath(agent_name_id=agent_name_id).path())
+        self.has_snapshot = False
+        # 上次快照之后追加的记录数
+        self.records = 0
+        # 已写入（快照或日志）的用量记录条数
+        self.ledger_written = 0
+        # 等待后台线程写入的操作：("line", 一行日志) 或 ("snapshot", 快照内容)，按顺序写入
+        self._pending: list[tuple[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {k: v for k, v in self.__dict__.items() if k not in ("_pending", "_lock")}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def append(self, memory: "msg_mem.MessageMemory") -> None:
+        """memory.messages 新增一条消息后调用：在调用线程中取出记录内容，写入交给后台线程"""
+        if not self.has_snapshot:
+            self.write_snapshot(memory)
+            return
+        record = {
+            "seq": len(memory.messages),
+            "message": memory.messages[-1],
+            "finish_reason": memory.finish_reason,
+            "usage": memory.usage.model_dump() if memory.usage else None,
+            "compact_boundary": memory.compact_boundary,
+            "ledger": [turn.model_dump() for turn in memory.usage_ledger[self.ledger_written:]],
+        }
+        self._enqueue("line", record)
+        self.ledger_written = len(memory.usage_ledger)
+        self.records += 1
+        if self.records >= SNAPSHOT_EVERY:
+            self.write_snapshot(memory)
+
+    def write_snapshot(self, memory: "msg_mem.MessageMemory") -> None:
+        """重写快照并清空日志（消息列表复制一份浅拷贝，已加入的消息不会再被修改）"""
+        self._enqueue("snapshot", snapshot_payload(memory))
+        self.has_snapshot = True
+        self.records = 0
+        self.ledger_written = len(memory.usage_ledger)
+
+    def _enqueue(self, kind: str, payload: Any) -> None:
+        with self._lock:
+            first = not self._pending
+            self._pending.append((kind, payload))
+        # 已有未执行的写入任务时，新的操作会被它一并写入
+        if first:
+            persist_writer.submit(self._drain)
+
+    def _drain(self) -> None:
+        with self._lock:
+            ops, self._pending = self._pending, []
+        lines: list[str] = []
+        for kind, payload in ops:
+            if kind == "line":
+                lines.append(_dumps(payload) + "\n")
+                continue
+            self._write_lines(lines)
+            lines = []
+            self._write_snapshot_file(payload)
+        self._write_lines(lines)
+
+    def _write_lines(self, lines: list[str]) -> None:
+        if not lines:
+            return
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write("".join(lines))
+            if FSYNC == FsyncPolicy.ALWAYS:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _write_snapshot_file(self, payload: dict[str, Any]) -> None:
+        """快照落盘之前日志保持不变，中途崩溃时仍能恢复"""
+        tmp = self.snapshot_path.with_name(f"{self.snapshot_path.name}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(_dumps(payload, indent=4))
+            if FSYNC != FsyncPolicy.NEVER:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        with open(self.journal_path, "w", encoding="utf-8"):
+            pass
+
+
+def _apply(memory: "msg_mem.MessageMemory", record: dict[str, Any]) -> None:
+    memory.messages.append(record["message"])
+    memory.finish_reason = record["finish_reason"]
+    memory.usage = CompletionUsage(**record["usage"]) if record["usage"] else None
+    memory.compact_boundary = record["compact_boundary"]
+    memory.usage_ledger.extend(msg_tokens.TurnUsage(**turn) for turn in record["ledger"])
+
+
+def load_memory(agent_name_id: str) -> "msg_mem.MessageMemory":
+    """从快照和追加日志恢复对话，沿用原来的 agent_name_id，之后的消息继续写入同一份记录"""
+    from src.agent.msg import msg_mem
+
+    # 等待后台线程写完此前的记录
+    persist_writer.flush()
+    journal = MessageJournal(agent_name_id)
+    data = json.loads(journal.snapshot_path.read_text(encoding="utf-8"))
+    messages = data.pop("messages")
+    memory = msg_mem.MessageMemory.model_validate(data, context={"restore": True})
+    memory.messages = messages
+    journal.has_snapshot = True
+    journal.ledger_written = len(memory.usage_ledger)
+    if journal.journal_path.exists():
+        with open(journal.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    global_logger.warning(f"对话日志 {journal.journal_path} 的最后一条记录不完整，已忽略")
+                    break
+                # 快照之后日志被清空前崩溃时，日志中可能还有快照已包含的记录
+                if record["seq"] <= len(memory.messages):
+                    continue
+                _apply(memory, record)
+                journal.records += 1
+                journal.ledger_written = len(memory.usage_ledger)
+    memory.set_journal(journal)
+    global_logger.info(f"从快照和 {journal.records} 条追加记录恢复对话 {agent_name_id}：{len(memory.messages)} 条消息")
+    return memory
+
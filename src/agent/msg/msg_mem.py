@@ -15,12 +15,13 @@ from openai.types.chat.chat_completion import (
 
 from src.agent.action import action_type
 from src.agent.msg import msg_ctr
+from src.agent.msg import msg_journal
+from src.agent.msg import msg_tokens
 from src.agent.msg.msg_mem_id import msg_mem_id_factory
 from src.utils.log_decorator import global_logger, traceable
-from src.utils.path_util import dynamic_path
 
-from pydantic import BaseModel, Field, field_validator
-from typing import List, Optional, Literal
+from pydantic import BaseModel, Field, PrivateAttr, ValidationInfo, field_validator
+from typing import Any, Dict, List, Optional, Literal
 import pprint
 import json
 import os
@@ -34,7 +35,7 @@ class MessageMemory(BaseModel):
     # 字段验证器：拦截手动传入的ID，执行查重和修正
     @field_validator('agent_name_id', mode='before')
     @classmethod
-    def validate_agent_id(cls, v: str) -> str:
+    def validate_agent_id(cls, v: str, info: ValidationInfo) -> str:
         """
         mode='before'：在Pydantic默认校验前执行，保证先修正ID再做格式校验
         :param v: 传入的agent_name_id值
@@ -42,6 +43,9 @@ class MessageMemory(BaseModel):
         """
         if not isinstance(v, str):
             v = str(v)
+        # 从磁盘恢复（msg_journal.load_memory）：沿用原来的 ID，继续写入同一份记录
+        if info.context and info.context.get("restore"):
+            return msg_mem_id_factory.claim(query_id=v)
         # 调用公共函数做查重和修正
         return msg_mem_id_factory.if_same_transform_unique(query_id=v)
 
@@ -58,11 +62,34 @@ class MessageMemory(BaseModel):
         default=None,
         description="对话过程中累计的 Token 使用情况，包括 prompt_tokens、completion_tokens 和 total_tokens",
     )
+    usage_ledger: List[msg_tokens.TurnUsage] = Field(
+        default_factory=list,
+        description="每次模型请求的 Token 用量，按请求顺序记录，见 msg_tokens",
+    )
     finish_reason: Optional[Literal["stop", "length", "tool_calls", "content_filter", "function_call"]] = Field(
         default=None,
         description="对话结束原因",
     )
-    
+    compact_boundary: int = Field(
+        default=0,
+        description="上下文压缩的边界：之前的消息以压缩形式发送给模型，只向后移动，见 msg_compact",
+    )
+    tool_stdout_partial: Dict[str, str] = Field(
+        default_factory=dict,
+        description="工具执行过程中的实时输出（工具调用目的 -> 最近输出），工具结束后清空，不持久化",
+        exclude=True,
+    )
+    assistant_partial: Optional[Dict[str, Any]] = Field(
+        default=None,
+        description="流式生成中的 assistant 消息（已收到的部分，格式同 assistant 消息），消息完成后清空，不持久化",
+        exclude=True,
+    )
+    # 持久化：快照 + 追加日志，第一次写入时创建，见 msg_journal
+    _journal: Optional[msg_journal.MessageJournal] = PrivateAttr(default=None)
+
+    def set_journal(self, journal: msg_journal.MessageJournal) -> None:
+        self._journal = journal
+
     def add_message(self, 
                     msg: ChatCompletionMessageParam|ChatCompletionMessage, 
                     finish_reason: Optional[Literal["stop", "length", "tool_calls", "content_filter", "function_call"]] = None
@@ -83,9 +110,9 @@ class MessageMemory(BaseModel):
             global_logger.info("-" * 60)
         
         self.messages.append(msg)
-        path = dynamic_path.MsgMemPath(agent_name_id=self.agent_name_id).path()
-        with open(path, "w", encoding="utf-8") as fileio:
-            json.dump (self, fileio, ensure_ascii=False, indent=4, default=lambda o: o.model_dump())                       
+        if self._journal is None:
+            self._journal = msg_journal.MessageJournal(self.agent_name_id)
+        self._journal.append(self)
 
     def need_msg_stop_control(self, config: msg_ctr.MessageControlConfig) -> bool:
         """
@@ -129,7 +156,7 @@ class MessageMemory(BaseModel):
         
         # 4. 检查单轮 Token 长度
         if config.max_tokens_per_turn and len(self.messages) >= 3:
-            last_assist_msg_tokens = self.usage.completion_tokens if self.usage and self.usage.completion_tokens else 0
+            last_assist_msg_tokens = self.usage_ledger[-1].completion_tokens if self.usage_ledger else 0
             if last_assist_msg_tokens >= config.max_tokens_per_turn:
                 global_logger.info(f"对话控制：当前单轮 Token 长度 {last_assist_msg_tokens} 已达到或超过 max_tokens_per_turn={config.max_tokens_per_turn}，终止对话")
                 return True
@@ -27,6 +27,12 @@ def if_same_transform_unique(query_id: str) -> str:
         _used_agent_ids.add(unique_id)
         return unique_id 
 
+def claim(query_id: str) -> str:
+    """从磁盘恢复对话时沿用原来的 ID（不追加后缀），同时登记为已使用"""
+    with _counter_lock:
+        _used_agent_ids.add(query_id)
+        return query_id
+
 def generate_unique() -> str:
     """默认工厂函数：生成基础三位数ID，再通过公共函数保证唯一"""
     with _counter_lock:
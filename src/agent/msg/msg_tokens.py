@@ -0,0 +1,180 @@
+"""
+本地 Token 统计：发送请求前估计 prompt 的长度并检查预算，请求结束后按轮记录用量。
+
+- 估计：中日韩字符约 1 token / 字，其余约 4 字符 / token。不依赖分词器，误差约 ±20%，用于预算检查和压缩；
+- 账本：每次请求一条 TurnUsage，MessageMemory.usage 为累计值。服务商没有返回 usage 时（如部分流式输出）用本地估计；
+  响应来自缓存（response_cache 命中）时记入账本并标记 cached，但不计入 MessageMemory.usage、费用和 agent 的 token 计数；
+- 发送前检查（preflight）：
+  - max_tokens_per_turn 作为请求的 max_tokens；
+  - max_tokens_all_turn 扣除已用量和本次 prompt 的估计后，剩余部分作为 max_tokens 的上限；
+  - 已经用完时抛出 TokenBudgetExceeded，不再发送请求；
+- 按 agent 汇总的 token / 费用计数：agent_usage_metrics() 供前端展示，每轮结束后写入 USAGE_METRICS_FILE。
+  单价由 ALGO_AGENT_LLM_PRICE_PROMPT / ALGO_AGENT_LLM_PRICE_COMPLETION 指定（每百万 token），默认 0。
+"""
+import json
+import os
+import re
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional
+
+from openai.types.completion_usage import CompletionUsage
+from pydantic import BaseModel
+
+from src.utils.log_decorator import global_logger
+from src.utils.path_util import static_path
+
+if TYPE_CHECKING:
+    from src.agent.msg import msg_mem
+
+PRICE_PROMPT = float(os.getenv("ALGO_AGENT_LLM_PRICE_PROMPT", "0"))
+PRICE_COMPLETION = float(os.getenv("ALGO_AGENT_LLM_PRICE_COMPLETION", "0"))
+USAGE_METRICS_FILE = static_path.Dir.MSG_DIR / "token_usage.json"
+
+_CJK_RE = re.compile("[\u2e80-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+
+class TokenBudgetExceeded(RuntimeError):
+    """max_tokens_all_turn 已经用完，不再发送请求"""
+
+
+def estimate_text_tokens(text: str) -> int:
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def estimate_message_tokens(message: Any) -> int:
+    if not isinstance(message, dict):
+        message = message.model_dump()
+    tokens = 4  # 角色等格式开销
+    for key in ("content", "reasoning_content"):
+        if isinstance(message.get(key), str):
+            tokens += estimate_text_tokens(message[key])
+    for call in message.get("tool_calls") or []:
+        function = call.get("function") or {}
+        tokens += estimate_text_tokens(function.get("name") or "") + estimate_text_tokens(function.get("arguments") or "")
+    return tokens
+
+
+def estimate_messages_tokens(messages: list) -> int:
+    return sum(estimate_message_tokens(m) for m in messages)
+
+
+class TurnUsage(BaseModel):
+    # 请求时的消息条数，用于对应到对话记录中的位置
+    turn: int
+    prompt_tokens: int
+    completion_tokens: int
+    # 服务商没有返回 usage，由本地估计
+    estimated: bool = False
+    # 响应来自缓存，没有实际调用模型，不计入用量和费用
+    cached: bool = False
+    cost: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+@dataclass
+class AgentUsage:
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    estimated_requests: int = 0
+    cached_requests: int = 0
+    cost: float = 0.0
+
+
+_agent_usage: dict[str, AgentUsage] = {}
+_lock = threading.Lock()
+
+
+def preflight(message_mem: "msg_mem.MessageMemory", request_messages: list) -> Optional[int]:
+    """发送前检查预算，返回本次请求的 max_tokens（不限制时为 None），预算已用完时抛出 TokenBudgetExceeded"""
+    config = message_mem.msg_ctr_cfg
+    if config is None:
+        return None
+    caps: list[int] = []
+    if config.max_tokens_per_turn:
+        caps.append(config.max_tokens_per_turn)
+    if config.max_tokens_all_turn:
+        # 已用量只包含实际调用模型的请求，缓存命中不计入
+        used = message_mem.usage.total_tokens if message_mem.usage else 0
+        prompt = estimate_messages_tokens(request_messages)
+        remaining = config.max_tokens_all_turn - used - prompt
+        if remaining <= 0:
+            raise TokenBudgetExceeded(
+                f"已用 {used} tokens，本次 prompt 约 {prompt} tokens，超出 max_tokens_all_turn={config.max_tokens_all_turn}"
+            )
+        caps.append(remaining)
+    return min(caps) if caps else None
+
+
+def record_turn(
+    message_mem: "msg_mem.MessageMemory",
+    request_messages: list,
+    assistant_message: Any,
+    usage: Optional[CompletionUsage],
+    cached: bool = False,
+) -> TurnUsage:
+    """记录一次请求的用量：追加到账本，累加到 MessageMemory.usage 和 agent 的计数（cached 时只记入账本）"""
+    if usage is not None:
+        turn = TurnUsage(
+            turn=len(request_messages), prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens, cached=cached,
+        )
+    else:
+        turn = TurnUsage(
+            turn=len(request_messages),
+            prompt_tokens=estimate_messages_tokens(request_messages),
+            completion_tokens=estimate_message_tokens(assistant_message),
+            estimated=True,
+            cached=cached,
+        )
+    message_mem.usage_ledger.append(turn)
+    if cached:
+        with _lock:
+            _agent_usage.setdefault(message_mem.agent_name_id, AgentUsage()).cached_requests += 1
+        global_logger.info(f"Token 用量：本轮响应来自缓存（prompt {turn.prompt_tokens} + completion {turn.completion_tokens}），不计入用量")
+        export_usage_metrics()
+        return turn
+    turn.cost = (turn.prompt_tokens * PRICE_PROMPT + turn.completion_tokens * PRICE_COMPLETION) / 1_000_000
+    previous = message_mem.usage
+    message_mem.usage = CompletionUsage(
+        prompt_tokens=(previous.prompt_tokens if previous else 0) + turn.prompt_tokens,
+        completion_tokens=(previous.completion_tokens if previous else 0) + turn.completion_tokens,
+        total_tokens=(previous.total_tokens if previous else 0) + turn.total_tokens,
+    )
+    with _lock:
+        counters = _agent_usage.setdefault(message_mem.agent_name_id, AgentUsage())
+        counters.requests += 1
+        counters.prompt_tokens += turn.prompt_tokens
+        counters.completion_tokens += turn.completion_tokens
+        counters.estimated_requests += int(turn.estimated)
+        counters.cost += turn.cost
+    global_logger.info(
+        f"Token 用量：本轮 prompt {turn.prompt_tokens} + completion {turn.completion_tokens}"
+        f"{'（本地估计）' if turn.estimated else ''}，累计 {message_mem.usage.total_tokens}"
+    )
+    export_usage_metrics()
+    return turn
+
+
+def agent_usage_metrics() -> dict[str, dict[str, Any]]:
+    """按 agent 汇总的请求数、token 数和费用"""
+    with _lock:
+        return {
+            agent: {**asdict(counters), "total_tokens": counters.prompt_tokens + counters.completion_tokens}
+            for agent, counters in _agent_usage.items()
+        }
+
+
+def export_usage_metrics(path: Optional[Path] = None) -> None:
+    """写入 JSON 文件（先写临时文件再 rename），供前端 / 外部看板读取"""
+    path = path or USAGE_METRICS_FILE
+    payload = json.dumps(agent_usage_metrics(), ensure_ascii=False, indent=2)
+    with _lock:
+        tmp = path.with_name(f"{path.name}.tmp")
+        tmp.write_text(payload, encoding="utf-8")
+        os.replace(tmp, path)
@@ -1,3 +1,5 @@
+import asyncio
+import contextlib
 import pprint
 from pydantic import BaseModel, Field, ValidationError
 from typing import Dict, Type, Any, Optional, Literal, List
@@ -5,6 +7,11 @@ import inspect
 
 from src.agent.tool import tool_base
 from src.runtime.sub_thread import subthread_python_executor
+from src.runtime.engine import engine_enum
+from src.runtime.engine import engine_router
+from src.runtime.engine import batch_scheduler
+from src.runtime.ctx_mgr import stdout_stream
+from src.runtime.status_mgr import var_snapshot
 from src.runtime.status_mgr import var_ws
 
 from src.utils.log_decorator import global_logger
@@ -37,16 +44,30 @@ class ExecutePythonCodeTool(tool_base.ToolBase):
         description="执行代码的最大时间（秒）。如果代码运行时间超过此值，将被终止并返回错误消息。"
     )
 
-    async def run(self) -> str:
-        execution_context: Optional[Dict[str, Any]] = var_ws.get_arg_globals()
+    async def _execute(
+        self,
+        engine: engine_enum.ExecutorEngine,
+        execution_context: Optional[Dict[str, Any]],
+        base: Optional[var_snapshot.WorkspaceSnapshot] = None,
+    ) -> subthread_python_executor.ExecutionResult:
+        """base 为 execution_context 的来源快照：提供时执行后只序列化变化的变量，并把变化告诉模型"""
         global_logger.info(f"执行Python代码片段：{pprint.pformat(self.python_code_snippet)}")
-        exec_result: subthread_python_executor.ExecutionResult =  subthread_python_executor.run_structured_in_thread(
-            command=self.python_code_snippet, 
-            _globals=execution_context,
-            timeout=self.timeout,  # 使用定义的超时时间
-        )
-        if isinstance(exec_result, subthread_python_executor.ExecutionSuccess):
-            var_ws.append_out_globals(exec_result.arg_chg_globals)
+        tracking = var_snapshot.track_changes(base, execution_context) if base is not None else contextlib.nullcontext()
+        with tracking, stdout_stream.open_stream(self.tool_call_purpose) as stream:
+            exec_result = await engine_router.run_structured_async(
+                command=self.python_code_snippet,
+                _globals=execution_context,
+                timeout=self.timeout,  # 使用定义的超时时间
+                engine=engine,
+                stdout_buffer=stream,
+            )
+        global_logger.info(f"执行状态：{exec_result.exit_status.value}，资源占用：{exec_result.resource_usage}")
+        if isinstance(exec_result, subthread_python_executor.ExecutionSuccess) and exec_result.var_changes is not None:
+            global_logger.info(f"工作区变量变化：{exec_result.var_changes}")
+        return exec_result
+
+    @staticmethod
+    def _tool_output(exec_result: subthread_python_executor.ExecutionResult) -> str:
         # ret_tool2llm may be a callable that returns a str or already a str; handle both cases.
         ret = exec_result.ret_tool2llm
         if callable(ret):
@@ -54,6 +75,133 @@ class ExecutePythonCodeTool(tool_base.ToolBase):
             return ret()
         return ret
 
+    def _precheck(self, engine: engine_enum.ExecutorEngine) -> Optional[str]:
+        # 语法错误在执行前即可发现：直接返回报错，不恢复工作区、不启动执行器
+        syntax_failure = engine_router.precheck(self.python_code_snippet, self.timeout, engine)
+        if syntax_failure is None:
+            return None
+        global_logger.info(f"代码片段存在语法错误：{syntax_failure.exception_value}")
+        return syntax_failure.ret_tool2llm
+
+    async def run(self) -> str:
+        engine = engine_enum.default_executor_engine
+        syntax_error = self._precheck(engine)
+        if syntax_error is not None:
+            return syntax_error
+        # 内核 / fork checkpoint 引擎的状态常驻在执行器中，不需要每次恢复和保存工作区快照
+        keep_snapshots = engine not in engine_enum.RESIDENT_ENGINES
+        # 快照的反序列化、执行、落盘都不在事件循环线程上进行，同一轮的其他工具调用（如 MCP）可以并行
+        base: Optional[var_snapshot.WorkspaceSnapshot] = None
+        execution_context: Optional[Dict[str, Any]] = None
+        if keep_snapshots:
+            base = await asyncio.to_thread(var_ws.get_arg_globals_snapshot)
+            execution_context = await asyncio.to_thread(base.restore)
+        exec_result = await self._execute(engine, execution_context, base)
+        if isinstance(exec_result, subthread_python_executor.ExecutionSuccess):
+            if keep_snapshots:
+                # 复用执行结果中已经生成的快照，避免再次序列化
+                await asyncio.to_thread(var_ws.append_out_globals, exec_result.globals_snapshot)
+            else:
+                await self._persist_resident_workspace(engine)
+        return self._tool_output(exec_result)
+
+    @staticmethod
+    async def _persist_resident_workspace(engine: engine_enum.ExecutorEngine) -> None:
+        """常驻引擎：工具调用结束后生成一次快照写入工作区历史和变量存储（同一轮的多个调用只生成一次）"""
+        snapshot = await asyncio.to_thread(engine_router.snapshot_resident, engine)
+        if snapshot is not None:
+            await asyncio.to_thread(var_ws.append_out_globals, snapshot)
+
+    @classmethod
+    async def run_batch(cls, tools: List["ExecutePythonCodeTool"]) -> List[Any]:
+        """
+        同一轮的多个代码片段：按 AST 读写集合构建依赖图，无依赖的片段并行执行，
+        工作区变化按调用顺序确定地合并。返回值与 tools 一一对应，执行异常原样放在对应位置。
+        """
+        batch = PythonCallBatch()
+        for tool in tools:
+            batch.add(tool)
+        return await batch.finish()
+
+
+class PythonCallBatch:
+    """
+    逐个加入的代码片段批次（run_batch 的增量版）：加入即按依赖开始执行，finish 时按加入顺序合并工作区变化。
+    用于模型流式输出期间提前执行参数已经完整的调用。必须在事件循环中调用。
+    """
+    def __init__(self):
+        self.engine = engine_enum.default_executor_engine
+        self.tools: List[ExecutePythonCodeTool] = []
+        # 每个调用的结果：语法错误直接是输出文本，其余为执行任务（常驻引擎）或批次中的下标
+        self._slots: List[Any] = []
+        self._batch_indexes: List[int] = []
+        self._batch: Optional[batch_scheduler.BatchRun] = None
+        self._last_task: Optional[asyncio.Task] = None
+        # 常驻引擎：本批次是否有执行成功（改变了工作区）的调用，finish 时据此生成一次快照
+        self._resident_changed = False
+
+    def add(self, tool: ExecutePythonCodeTool) -> None:
+        self.tools.append(tool)
+        if self.engine in engine_enum.RESIDENT_ENGINES:
+            # 常驻的状态只有一份，按加入顺序依次执行
+            self._last_task = asyncio.create_task(self._run_after(self._last_task, tool))
+            self._slots.append(self._last_task)
+            return
+        syntax_error = tool._precheck(self.engine)
+        if syntax_error is not None:
+            self._slots.append(syntax_error)
+            return
+        if self._batch is None:
+            self._batch = batch_scheduler.BatchRun(self._load_base, self._run_one)
+        self._batch_indexes.append(len(self.tools) - 1)
+        self._slots.append(self._batch.add(tool.python_code_snippet))
+
+    @staticmethod
+    async def _load_base() -> var_snapshot.WorkspaceSnapshot:
+        return await asyncio.to_thread(var_ws.get_arg_globals_snapshot)
+
+    async def _run_after(self, previous: Optional[asyncio.Task], tool: ExecutePythonCodeTool) -> str:
+        if previous is not None:
+            await asyncio.wait([previous])
+        syntax_error = tool._precheck(self.engine)
+        if syntax_error is not None:
+            return syntax_error
+        exec_result = await tool._execute(self.engine, None)
+        self._resident_changed |= isinstance(exec_result, subthread_python_executor.ExecutionSuccess)
+        return tool._tool_output(exec_result)
+
+    async def _run_one(
+        self,
+        index: int,
+        execution_context: Dict[str, Any],
+        start: var_snapshot.WorkspaceSnapshot,
+    ) -> subthread_python_executor.ExecutionResult:
+        return await self.tools[self._batch_indexes[index]]._execute(self.engine, execution_context, start)
+
+    def cancel(self) -> None:
+        for slot in self._slots:
+            if isinstance(slot, asyncio.Task):
+                slot.cancel()
+        if self._batch is not None:
+            self._batch.cancel()
+
+    async def finish(self) -> List[Any]:
+        """等待全部调用结束，返回值与加入顺序一一对应，执行异常原样放在对应位置"""
+        if self.engine in engine_enum.RESIDENT_ENGINES:
+            outputs = list(await asyncio.gather(*self._slots, return_exceptions=True))
+            if self._resident_changed:
+                await ExecutePythonCodeTool._persist_resident_workspace(self.engine)
+            return outputs
+        outputs = list(self._slots)
+        if self._batch is None:
+            return outputs
+        items = await self._batch.finish()
+        for i, item in zip(self._batch_indexes, items):
+            if item.merged_snapshot is not None:
+                await asyncio.to_thread(var_ws.append_out_globals, item.merged_snapshot)
+            outputs[i] = item.result if isinstance(item.result, BaseException) else ExecutePythonCodeTool._tool_output(item.result)
+        return outputs
+
 if __name__ == "__main__":
     # --- 测试工具 ---
     test_code = """import math
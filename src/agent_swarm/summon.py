@@ -1,7 +1,9 @@
+import asyncio
 from typing import List, Tuple, Optional, Any, AsyncGenerator
 
 from src.agent import deep_research_api
 from src.agent.msg import msg_mem
+from src.utils import persist_writer
 
 
 async def summon_agent_generator(
@@ -19,3 +21,5 @@ async def summon_agent_generator(
             yield ret_message_mem
     finally:
         await genor.aclose()  # 确保生成器被正确关闭，释放资源，不然后又 cancel 异常
+        # 等待对话记录、变量快照和日志写完；被再次取消时后台线程仍会继续写完
+        await asyncio.shield(asyncio.to_thread(persist_writer.flush))
@@ -0,0 +1,278 @@
+"""
+Python 执行运行时的基准测试：按执行引擎 × 场景测量一次工具调用的完整开销。
+
+每次迭代与 ExecutePythonCodeTool.run 的流程一致，分阶段计时：
+- snapshot：对起始工作区做快照（filter_and_deepcopy_globals 的序列化部分）；
+- restore：从快照恢复出本次执行的 globals（var_ws.get_arg_globals）；
+- exec：engine_router.run_structured（包含执行结果中的快照）；
+- persist：var_store.dump_globals 落盘（内容寻址，只有第一次会真正写入）。
+状态常驻的引擎（kernel / fork）只在第一次执行时用工作区初始化，没有 snapshot / restore / persist 阶段。
+
+报告每个组合的延迟分位数（p50 / p90 / p99）、落盘字节数、主进程与 worker 的峰值内存；
+可以与之前保存的 JSON 报告比较，p50 变慢超过阈值时以非零状态码退出，用于回归门禁。
+
+用法：
+    python -m src.runtime.bench.runtime_bench --engines thread,process --repeat 20 --json bench.json
+    python -m src.runtime.bench.runtime_bench --baseline bench.json --max-regression 0.25
+"""
+import argparse
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from src.runtime.ctx_mgr import resource_usage
+from src.runtime.engine import engine_enum
+from src.runtime.engine import engine_router
+from src.runtime.status_mgr import var_snapshot
+from src.runtime.status_mgr import var_store
+from src.runtime.sub_kernel import kernel_python_executor
+from src.runtime.sub_process import fork_checkpoint_executor
+from src.runtime.sub_thread.subthread_schemas import ExecutionSuccess
+
+_MB = 1024 * 1024
+# 每个 (引擎, 场景) 写入清单时使用的 success_cnt 起点，避免不同组合的清单互相覆盖
+_MANIFEST_STRIDE = 10000
+
+
+@dataclass
+class Scenario:
+    name: str
+    code: str
+    make_globals: Callable[[], dict[str, Any]] = dict
+    timeout: float = 60
+    # 只在这些引擎上运行（如 os._exit 会直接结束线程引擎所在的进程）
+    engines: Optional[frozenset[engine_enum.ExecutorEngine]] = None
+    # 超时 / 崩溃这类单次就很慢的场景限制迭代次数
+    max_repeat: Optional[int] = None
+
+
+def _numpy_globals(n: int) -> dict[str, Any]:
+    import numpy as np
+    return {"arr": np.random.default_rng(0).random(n), "idx": np.arange(n // 10)}
+
+
+def _pandas_globals(n: int) -> dict[str, Any]:
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(0)
+    return {"df": pd.DataFrame({
+        "a": rng.random(n),
+        "b": rng.integers(0, 1000, n),
+        "c": rng.choice(["x", "y", "z"], n),
+    })}
+
+
+def _many_small_globals(n: int) -> dict[str, Any]:
+    workspace: dict[str, Any] = {}
+    for i in range(n):
+        workspace[f"v_{i}"] = i if i % 2 else f"value {i}"
+    return workspace
+
+
+def _deep_graph_globals(depth: int, width: int) -> dict[str, Any]:
+    def build(level: int) -> dict[str, Any]:
+        if level == depth:
+            return {"leaf": level}
+        return {"level": level, "children": [build(level + 1) for _ in range(width)]}
+    # 调用日志会 pformat 参数，嵌套过深会触发 RecursionError，链长保持在 100 以内
+    chain: Any = None
+    for i in range(100):
+        chain = [i, chain]
+    return {"tree": build(0), "chain": chain}
+
+
+def default_scenarios(scale: float = 1.0) -> list[Scenario]:
+    killable = frozenset({
+        engine_enum.ExecutorEngine.PROCESS,
+        engine_enum.ExecutorEngine.KERNEL,
+        engine_enum.ExecutorEngine.FORK,
+    })
+    return [
+        Scenario("trivial", "x = 1"),
+        Scenario("numpy_large", "s = float(arr.sum())", lambda: _numpy_globals(int(2_000_000 * scale))),
+        Scenario("pandas_large", "m = df.groupby('c')['a'].mean()", lambda: _pandas_globals(int(200_000 * scale))),
+        Scenario("many_small", "x = v_1 + 1", lambda: _many_small_globals(int(5_000 * scale))),
+        Scenario("deep_graph", "n = len(tree['children'])", lambda: _deep_graph_globals(6, 4)),
+        # 线程无法被强制结束，用 sleep 而不是死循环，避免残留线程占满 CPU
+        Scenario("timeout", "import time\ntime.sleep(2)", timeout=0.3, max_repeat=3),
+        Scenario("crash", "import os\nos._exit(3)", engines=killable, max_repeat=3),
+    ]
+
+
+def percentile(samples: list[float], q: float) -> float:
+    """最近秩法分位数，q 取 0~100"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(min(rank, len(ordered))) - 1]
+
+
+def _summary(samples: list[float]) -> dict[str, float]:
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p90_ms": round(percentile(samples, 90) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0,
+    }
+
+
+@dataclass
+class _Samples:
+    phases: dict[str, list[float]] = field(default_factory=lambda: {"snapshot": [], "restore": [], "exec": [], "persist": [], "total": []})
+    statuses: dict[str, int] = field(default_factory=dict)
+    bytes_persisted: int = 0
+    snapshot_bytes: int = 0
+    worker_peak_rss: int = 0
+
+
+def _run_once(
+    engine: engine_enum.ExecutorEngine,
+    scenario: Scenario,
+    base_globals: dict[str, Any],
+    success_cnt: int,
+    samples: _Samples,
+    record: bool,
+) -> None:
+    resident = engine in engine_enum.RESIDENT_ENGINES
+    timings: dict[str, float] = {}
+    start = time.perf_counter()
+    if resident:
+        execution_context: Optional[dict[str, Any]] = base_globals
+    else:
+        t0 = time.perf_counter()
+        snapshot = var_snapshot.take_snapshot(base_globals)
+        t1 = time.perf_counter()
+        execution_context = snapshot.restore()
+        t2 = time.perf_counter()
+        timings["snapshot"], timings["restore"] = t1 - t0, t2 - t1
+    t3 = time.perf_counter()
+    result = engine_router.run_structured(scenario.code, execution_context, timeout=scenario.timeout, engine=engine)
+    timings["exec"] = time.perf_counter() - t3
+    persisted = 0
+    if not resident and isinstance(result, ExecutionSuccess):
+        t4 = time.perf_counter()
+        persisted = var_store.dump_globals(result.globals_snapshot, success_cnt)["bytes_written"]
+        timings["persist"] = time.perf_counter() - t4
+    timings["total"] = time.perf_counter() - start
+    # 预热迭代不计时，但内容寻址存储只在第一次写入，写盘字节要算上预热
+    samples.bytes_persisted += persisted
+    if not record:
+        return
+    for phase, seconds in timings.items():
+        samples.phases[phase].append(seconds)
+    status = result.exit_status.value
+    samples.statuses[status] = samples.statuses.get(status, 0) + 1
+    if isinstance(result, ExecutionSuccess):
+        samples.snapshot_bytes = max(samples.snapshot_bytes, result.globals_snapshot.total_bytes)
+    if result.resource_usage is not None and result.resource_usage.peak_rss_bytes:
+        samples.worker_peak_rss = max(samples.worker_peak_rss, result.resource_usage.peak_rss_bytes)
+
+
+def _reset_resident_state(engine: engine_enum.ExecutorEngine, key: str) -> None:
+    if engine == engine_enum.ExecutorEngine.KERNEL:
+        kernel_python_executor.get_default_pool().restart(key)
+    elif engine == engine_enum.ExecutorEngine.FORK:
+        fork_checkpoint_executor.get_default_pool().restart(key)
+
+
+def run_benchmark(
+    engines: list[engine_enum.ExecutorEngine],
+    scenarios: list[Scenario],
+    repeat: int = 10,
+    warmup: int = 1,
+) -> dict[str, Any]:
+    report: dict[str, Any] = {"repeat": repeat, "warmup": warmup, "results": {}}
+    for e_index, engine in enumerate(engines):
+        for s_index, scenario in enumerate(scenarios):
+            if scenario.engines is not None and engine not in scenario.engines:
+                continue
+            key = f"bench-{engine.value}-{scenario.name}"
+            token = kernel_python_executor.current_kernel_key.set(key)
+            try:
+                base_globals = scenario.make_globals()
+                samples = _Samples()
+                n = min(repeat, scenario.max_repeat or repeat)
+                success_cnt = (e_index * len(scenarios) + s_index + 1) * _MANIFEST_STRIDE
+                resource_usage._reset_peak_rss()
+                for i in range(warmup + n):
+                    _run_once(engine, scenario, base_globals, success_cnt + i, samples, i >= warmup)
+                main_peak = resource_usage._peak_rss_bytes() or 0
+            finally:
+                _reset_resident_state(engine, key)
+                kernel_python_executor.current_kernel_key.reset(token)
+            report["results"][f"{engine.value}/{scenario.name}"] = {
+                "engine": engine.value,
+                "scenario": scenario.name,
+                "iterations": n,
+                "statuses": samples.statuses,
+                "latency": {phase: _summary(values) for phase, values in samples.phases.items() if values},
+                "bytes_persisted": samples.bytes_persisted,
+                "snapshot_bytes": samples.snapshot_bytes,
+                "main_peak_rss_mb": round(main_peak / _MB, 1),
+                "worker_peak_rss_mb": round(samples.worker_peak_rss / _MB, 1) if samples.worker_peak_rss else None,
+            }
+    return report
+
+
+def format_report(report: dict[str, Any]) -> str:
+    header = f"{'engine/scenario':<28}{'n':>4}{'p50 ms':>11}{'p90 ms':>11}{'p99 ms':>11}{'exec p50':>11}{'persisted':>12}{'snapshot':>12}{'main MB':>9}{'worker MB':>10}  status"
+    lines = [header, "-" * len(header)]
+    for name, row in report["results"].items():
+        total, exec_ = row["latency"]["total"], row["latency"]["exec"]
+        lines.append(
+            f"{name:<28}{row['iterations']:>4}{total['p50_ms']:>11.2f}{total['p90_ms']:>11.2f}{total['p99_ms']:>11.2f}"
+            f"{exec_['p50_ms']:>11.2f}{row['bytes_persisted']:>12}{row['snapshot_bytes']:>12}{row['main_peak_rss_mb']:>9}"
+            f"{row['worker_peak_rss_mb'] if row['worker_peak_rss_mb'] is not None else '-':>10}  {row['statuses']}"
+        )
+    return "\n".join(lines)
+
+
+def compare_with_baseline(report: dict[str, Any], baseline: dict[str, Any], max_regression: float) -> list[str]:
+    """返回 p50 总耗时比基线慢超过 max_regression（比例）的组合；基线中没有的组合不比较"""
+    regressions: list[str] = []
+    for name, row in report["results"].items():
+        base_row = baseline.get("results", {}).get(name)
+        if base_row is None:
+            continue
+        now, before = row["latency"]["total"]["p50_ms"], base_row["latency"]["total"]["p50_ms"]
+        if before > 0 and now > before * (1 + max_regression):
+            regressions.append(f"{name}: p50 {before:.2f} ms -> {now:.2f} ms (+{(now / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Python 执行运行时基准测试")
+    parser.add_argument("--engines", default="thread,process", help="逗号分隔：thread,process,kernel,fork")
+    parser.add_argument("--scenarios", default="", help="逗号分隔的场景名，默认全部")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--scale", type=float, default=1.0, help="大工作区场景的规模倍数")
+    parser.add_argument("--json", dest="json_path", help="把报告保存为 JSON")
+    parser.add_argument("--baseline", help="与之前保存的 JSON 报告比较")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="允许的 p50 变慢比例")
+    args = parser.parse_args(argv)
+
+    engines = [engine_enum.ExecutorEngine(name.strip()) for name in args.engines.split(",") if name.strip()]
+    scenarios = default_scenarios(args.scale)
+    if args.scenarios:
+        wanted = {name.strip() for name in args.scenarios.split(",")}
+        scenarios = [s for s in scenarios if s.name in wanted]
+    report = run_benchmark(engines, scenarios, repeat=args.repeat, warmup=args.warmup)
+    print(format_report(report))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_with_baseline(report, json.load(f), args.max_regression)
+        for line in regressions:
+            print(f"回归：{line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,51 +1,112 @@
-
+import contextvars
 import sys
 import os
+import threading
+from typing import Any, Optional
 from src.utils.log_decorator import global_logger
 
 
 class ChangeDirectory:
-    """目录切换上下文管理器，退出时自动恢复原目录"""
+    """
+    目录切换上下文管理器，退出时自动恢复原目录。
+    os.chdir 是进程级的：并发执行时如果各自切换、各自恢复，先退出的会把仍在执行的代码切回原目录。
+    因此这里做引用计数：目标目录相同的执行共享同一次切换，最后一个退出时才恢复原目录；
+    目标目录不同的执行排队等待。需要真正独立的工作目录时使用进程池引擎（每个 worker 各自 chdir）。
+    """
+    _cond = threading.Condition()
+    _active_dir: Optional[str] = None
+    _active_count = 0
+    _original_dir: Optional[str] = None
+
     def __init__(self, target_dir_fullpath: str):
         self.target_dir = target_dir_fullpath  # 目标目录
-        # 1. 记录当前工作目录（原目录）
-        self.original_dir = os.getcwd()      # 保存原目录
-    
+
     def __enter__(self):
-        # 2. 确保目标目录存在（可选，根据你的需求）
-        global_logger.info(f"切换目录到: {self.target_dir}")
-        # 3. 切换到目标目录
-        os.chdir(self.target_dir)
+        cls = ChangeDirectory
+        with cls._cond:
+            cls._cond.wait_for(lambda: cls._active_count == 0 or cls._active_dir == self.target_dir)
+            if cls._active_count == 0:
+                # 第一个进入：记录原目录并切换
+                cls._original_dir = os.getcwd()
+                global_logger.info(f"切换目录到: {self.target_dir}")
+                os.chdir(self.target_dir)
+                cls._active_dir = self.target_dir
+            cls._active_count += 1
         # 返回当前上下文（可选，可用于链式操作）
         return self
-    
+
     def __exit__(self, exc_type, exc_val, exc_tb):
-        # 无论是否发生异常，都恢复原目录
-        if self.original_dir:
-            os.chdir(self.original_dir)
-            global_logger.info(f"恢复目录到: {self.original_dir}")
+        cls = ChangeDirectory
+        with cls._cond:
+            cls._active_count -= 1
+            if cls._active_count == 0:
+                # 最后一个退出：无论是否发生异常，都恢复原目录
+                if cls._original_dir:
+                    os.chdir(cls._original_dir)
+                    global_logger.info(f"恢复目录到: {cls._original_dir}")
+                cls._active_dir = None
+                cls._original_dir = None
+                cls._cond.notify_all()
         # 若返回 False，异常会向上抛出；返回 True 则抑制异常（按需选择）
         return False
 
+
+# 当前上下文（线程/协程）的输出目标，None 表示使用原始输出
+_stdout_target: contextvars.ContextVar[Any] = contextvars.ContextVar("algo_agent_stdout_target", default=None)
+_stderr_target: contextvars.ContextVar[Any] = contextvars.ContextVar("algo_agent_stderr_target", default=None)
+_install_lock = threading.Lock()
+
+
+class _ContextLocalStream:
+    """安装为 sys.stdout/sys.stderr 的路由器：按当前上下文把写入分发到各自的目标，没有目标时写到原始输出"""
+    def __init__(self, fallback, target_var: contextvars.ContextVar):
+        self._fallback = fallback
+        self._target_var = target_var
+
+    def _target(self):
+        target = self._target_var.get()
+        return self._fallback if target is None else target
+
+    def write(self, msg: str):
+        return self._target().write(msg)
+
+    def flush(self):
+        return self._target().flush()
+
+    def __getattr__(self, name: str):
+        # encoding / isatty / fileno 等属性交给实际目标
+        return getattr(self._target(), name)
+
+
+def _install_router() -> None:
+    """幂等：sys.stdout/sys.stderr 被其他代码（如 pytest、streamlit）替换后会重新包一层"""
+    with _install_lock:
+        if not isinstance(sys.stdout, _ContextLocalStream):
+            sys.stdout = _ContextLocalStream(sys.stdout, _stdout_target)
+        if not isinstance(sys.stderr, _ContextLocalStream):
+            sys.stderr = _ContextLocalStream(sys.stderr, _stderr_target)
+
+
 class Change_STDOUT_STDERR:
-    """标准输出切换上下文管理器，退出时自动恢复原输出"""
+    """
+    标准输出切换上下文管理器，退出时自动恢复原输出。
+    只对当前上下文（线程/协程）生效，不再替换进程级的 sys.stdout，并发执行的代码输出互不串扰。
+    注意：被执行代码自己创建的子线程不继承上下文，其输出写到原始输出。
+    """
     def __init__(self, new_stdout, new_stderr=None):
-        self.original_stdout = sys.stdout   # 保存原标准输出
-        self.original_stderr = sys.stderr   # 保存原标准错误输出
         self.new_stdout = new_stdout  # 新的标准输出
-        self.new_stderr = new_stderr or new_stdout  # 新的标准错误输出
-    
+        self.new_stderr = new_stdout if new_stderr is None else new_stderr  # 新的标准错误输出
+
     def __enter__(self):
-        # 1. 记录当前标准输出（原输出）
-        # 2. 切换到新的标准输出
-        sys.stdout = self.new_stdout
-        sys.stderr = self.new_stderr
+        _install_router()
+        self._stdout_token = _stdout_target.set(self.new_stdout)
+        self._stderr_token = _stderr_target.set(self.new_stderr)
         # 返回当前上下文（可选，可用于链式操作）
         return self
-    
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         # 无论是否发生异常，都恢复原标准输出
-        sys.stdout = self.original_stdout
-        sys.stderr = self.original_stderr
+        _stdout_target.reset(self._stdout_token)
+        _stderr_target.reset(self._stderr_token)
         # 若返回 False，异常会向上抛出；返回 True 则抑制异常（按需选择）
         return False
@@ -0,0 +1,247 @@
+"""
+单次代码执行的资源统计与限制。
+
+统计（ResourceRecorder）：
+- CPU 用户态 / 内核态时间：进程模式统计整个 worker 进程，线程模式统计执行线程（RUSAGE_THREAD，仅 Linux）；
+- 峰值 RSS：只在进程模式统计（执行前通过 /proc/self/clear_refs 重置峰值）。线程模式与主进程共享内存，无法区分，记为 None；
+- 写入的字节数：只在进程模式统计，取 worker 进程 I/O 计数（/proc/self/io 的 wchar）的增量，
+  扣除发回主进程的 print 输出（excluded_bytes）。开销与工作目录中的文件数无关；
+  线程模式与主进程和其他并发执行共享计数，无法区分，记为 None。
+
+限制（ResourceLimits，只在进程模式生效）：通过 setrlimit 设置软限制，执行结束后恢复。
+- memory_mb：本次执行可额外申请的虚拟内存（RLIMIT_AS = 当前虚拟内存 + memory_mb），超出时抛 MemoryError；
+- cpu_seconds：本次执行可使用的 CPU 时间（RLIMIT_CPU），超出时收到 SIGXCPU，转为 ResourceLimitExceeded；
+- file_size_mb：单个文件的最大大小（RLIMIT_FSIZE），超出时写入失败（EFBIG）。
+环境变量：ALGO_AGENT_LIMIT_MEMORY_MB / ALGO_AGENT_LIMIT_CPU_SECONDS / ALGO_AGENT_LIMIT_FILE_MB，未设置表示不限制。
+
+注意：该模块也会在进程池 worker 中被导入，只能依赖标准库。
+"""
+import errno
+import math
+import os
+import signal
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Optional
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块：只统计墙钟以外能拿到的部分，限制不生效
+    resource = None  # type: ignore[assignment]
+
+_MB = 1024 * 1024
+
+# 限制种类 -> (描述, 单位)，用于给模型的提示
+LIMIT_LABELS = {
+    "memory": ("内存", "MB"),
+    "cpu": ("CPU 时间", "秒"),
+    "file_size": ("单个文件大小", "MB"),
+}
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+@dataclass(frozen=True)
+class ResourceLimits:
+    memory_mb: Optional[float] = None
+    cpu_seconds: Optional[float] = None
+    file_size_mb: Optional[float] = None
+
+    @classmethod
+    def from_env(cls) -> "ResourceLimits":
+        return cls(
+            memory_mb=_env_float("ALGO_AGENT_LIMIT_MEMORY_MB"),
+            cpu_seconds=_env_float("ALGO_AGENT_LIMIT_CPU_SECONDS"),
+            file_size_mb=_env_float("ALGO_AGENT_LIMIT_FILE_MB"),
+        )
+
+    def to_dict(self) -> dict[str, Optional[float]]:
+        return asdict(self)
+
+
+class ResourceLimitExceeded(Exception):
+    """执行超出资源限制，kind 为 memory / cpu / file_size"""
+    def __init__(self, kind: str, limit: Optional[float], detail: str = ""):
+        super().__init__(f"{kind} limit {limit} exceeded {detail}".strip())
+        self.kind = kind
+        self.limit = limit
+        self.detail = detail
+
+
+def classify_limit_error(exc: BaseException, limits: ResourceLimits) -> Optional[ResourceLimitExceeded]:
+    """把执行中抛出的异常归类为超出某项限制；与已设置的限制无关的异常返回 None"""
+    if isinstance(exc, ResourceLimitExceeded):
+        return exc
+    if isinstance(exc, MemoryError) and limits.memory_mb is not None:
+        return ResourceLimitExceeded("memory", limits.memory_mb, repr(exc))
+    if isinstance(exc, OSError) and exc.errno == errno.EFBIG and limits.file_size_mb is not None:
+        return ResourceLimitExceeded("file_size", limits.file_size_mb, str(exc))
+    return None
+
+
+def _vm_size_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _raise_cpu_limit(signum, frame) -> None:
+    raise ResourceLimitExceeded("cpu", _active_cpu_limit[0] if _active_cpu_limit else None, "SIGXCPU")
+
+
+# 当前生效的 CPU 限制（供 SIGXCPU 处理函数生成报错信息）
+_active_cpu_limit: list[float] = []
+
+
+class ApplyLimits:
+    """
+    在当前进程上临时设置资源限制（只修改软限制，退出时恢复）。
+    信号处理函数只能在主线程安装：worker 在主线程中执行代码，满足这个条件。
+    """
+    def __init__(self, limits: ResourceLimits):
+        self.limits = limits
+        self._saved: list[tuple[int, tuple[int, int]]] = []
+        self._saved_handlers: list[tuple[int, Any]] = []
+
+    def _set_soft(self, kind: int, soft: int) -> None:
+        old_soft, hard = resource.getrlimit(kind)
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        self._saved.append((kind, (old_soft, hard)))
+        resource.setrlimit(kind, (soft, hard))
+
+    def _set_handler(self, signum: int, handler: Any) -> None:
+        self._saved_handlers.append((signum, signal.signal(signum, handler)))
+
+    def __enter__(self):
+        if resource is None:
+            return self
+        limits = self.limits
+        in_main_thread = threading.current_thread() is threading.main_thread()
+        if limits.memory_mb is not None:
+            vm_size = _vm_size_bytes() or 0
+            self._set_soft(resource.RLIMIT_AS, vm_size + int(limits.memory_mb * _MB))
+        if limits.cpu_seconds is not None:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            self._set_soft(resource.RLIMIT_CPU, math.ceil(usage.ru_utime + usage.ru_stime + limits.cpu_seconds))
+            _active_cpu_limit.append(limits.cpu_seconds)
+            if in_main_thread:
+                self._set_handler(signal.SIGXCPU, _raise_cpu_limit)
+        if limits.file_size_mb is not None:
+            if in_main_thread:
+                # 忽略 SIGXFSZ，超出大小的写入改为抛出 OSError(EFBIG)
+                self._set_handler(signal.SIGXFSZ, signal.SIG_IGN)
+            self._set_soft(resource.RLIMIT_FSIZE, int(limits.file_size_mb * _MB))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for kind, old in reversed(self._saved):
+            resource.setrlimit(kind, old)
+        for signum, handler in reversed(self._saved_handlers):
+            signal.signal(signum, handler)
+        if self.limits.cpu_seconds is not None and _active_cpu_limit:
+            _active_cpu_limit.pop()
+        self._saved.clear()
+        self._saved_handlers.clear()
+        return False
+
+
+def _written_chars() -> Optional[int]:
+    """进程通过 write 类系统调用写出的字节数（Linux），拿不到时返回 None"""
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    """重置进程的峰值 RSS（Linux 4.0+），失败时峰值为进程启动以来的最大值"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return None
+    # ru_maxrss 在 Linux 上单位是 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _cpu_times(per_thread: bool) -> tuple[Optional[float], Optional[float]]:
+    if resource is not None:
+        who = getattr(resource, "RUSAGE_THREAD", None) if per_thread else resource.RUSAGE_SELF
+        if who is not None:
+            usage = resource.getrusage(who)
+            return usage.ru_utime, usage.ru_stime
+    if per_thread:
+        return time.thread_time(), None
+    return time.process_time(), None
+
+
+def _delta(end: Optional[float], start: Optional[float]) -> Optional[float]:
+    return None if end is None or start is None else end - start
+
+
+class ResourceRecorder:
+    """
+    上下文资源记录器，与 TimerRecorder 用法一致：退出时把统计结果写入 usage_container（dict）。
+    用法:
+        with ResourceRecorder(usage_container, per_thread=True):
+            ... 执行代码 ...
+    """
+    def __init__(
+        self,
+        usage_container: dict[str, Any],
+        per_thread: bool,
+        excluded_bytes: Optional[Callable[[], int]] = None,
+    ):
+        """excluded_bytes 返回不计入写入量的累计字节数（如发回主进程的输出），只在进程模式使用"""
+        self.usage_container = usage_container
+        self.per_thread = per_thread
+        self.excluded_bytes = excluded_bytes or (lambda: 0)
+
+    def __enter__(self):
+        self.written_before = None
+        if not self.per_thread:
+            _reset_peak_rss()
+            self.written_before = _written_chars()
+            self.excluded_before = self.excluded_bytes()
+        self.cpu_before = _cpu_times(self.per_thread)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        cpu_after = _cpu_times(self.per_thread)
+        bytes_written = None
+        if self.written_before is not None:
+            written_after = _written_chars()
+            if written_after is not None:
+                excluded = self.excluded_bytes() - self.excluded_before
+                bytes_written = max(0, written_after - self.written_before - excluded)
+        self.usage_container.update(
+            cpu_user_seconds=_delta(cpu_after[0], self.cpu_before[0]),
+            cpu_sys_seconds=_delta(cpu_after[1], self.cpu_before[1]),
+            peak_rss_bytes=None if self.per_thread else _peak_rss_bytes(),
+            bytes_written=bytes_written,
+        )
+        return False
@@ -0,0 +1,198 @@
+"""
+执行器 stdout/stderr 的实时输出流。
+
+- StdoutStream：可直接作为 sys.stdout 使用（write/flush），线程安全。
+  完整输出一直保留，用于最终的 ret_stdout；同时用有界环形缓冲区保存最近的输出片段，
+  异步消费者可以 `async for chunk in stream` 增量读取，消费过慢时只会丢弃最旧的片段。
+- StdoutStreamHub：一个 agent 当前所有运行中工具的输出流集合，
+  run_agent_generator 通过它等待增量输出并 yield 给前端。
+"""
+import asyncio
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Iterator, Optional
+
+
+# 环形缓冲区最多保留的输出片段数（每次 write 为一个片段）
+RING_MAX_CHUNKS = int(os.getenv("ALGO_AGENT_STDOUT_RING_CHUNKS", "1024"))
+# 向前端推送增量输出的最小间隔（秒），避免每个 print 都触发一次重绘
+STREAM_MIN_INTERVAL = float(os.getenv("ALGO_AGENT_STDOUT_STREAM_INTERVAL", "0.5"))
+
+
+class _Notifier:
+    """跨线程唤醒 asyncio 等待者：写线程调用 notify，事件循环中的协程 await wait"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+
+    def notify(self) -> None:
+        with self._lock:
+            waiters, self._waiters = self._waiters, []
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # 事件循环已关闭，没有人再等待
+                pass
+
+    def register(self) -> asyncio.Event:
+        event = asyncio.Event()
+        with self._lock:
+            self._waiters.append((asyncio.get_running_loop(), event))
+        return event
+
+
+class StdoutStream:
+    """线程安全的输出流：完整输出 + 有界环形缓冲区 + 异步增量读取"""
+    def __init__(self, label: str = "", ring_max_chunks: Optional[int] = None, hub: Optional["StdoutStreamHub"] = None):
+        self.label = label
+        self._lock = threading.Lock()
+        self._chunks: list[str] = []
+        self._ring: deque[str] = deque(maxlen=ring_max_chunks or RING_MAX_CHUNKS)
+        self._seq = 0  # 已写入的片段总数，环形缓冲区中最旧片段的序号为 _seq - len(_ring)
+        self._closed = False
+        self._notifier = _Notifier()
+        self._hub = hub
+
+    def write(self, msg: str) -> int:
+        if not msg:
+            return 0
+        with self._lock:
+            if self._closed:
+                return 0
+            self._chunks.append(msg)
+            self._ring.append(msg)
+            self._seq += 1
+        self._notifier.notify()
+        if self._hub is not None:
+            self._hub._notifier.notify()
+        return len(msg)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+        self._notifier.notify()
+        if self._hub is not None:
+            self._hub._remove(self)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def getvalue(self) -> str:
+        """完整输出，作为最终的 ret_stdout"""
+        with self._lock:
+            return "".join(self._chunks)
+
+    def tail(self) -> str:
+        """环形缓冲区中最近的输出，供前端展示进度"""
+        with self._lock:
+            return "".join(self._ring)
+
+    def _read_since(self, seq: int) -> tuple[int, int, str]:
+        """返回 (新的序号, 因消费过慢被丢弃的片段数, 新增文本)"""
+        with self._lock:
+            oldest = self._seq - len(self._ring)
+            dropped = max(0, oldest - seq)
+            start = max(seq, oldest) - oldest
+            text = "".join(list(self._ring)[start:])
+            return self._seq, dropped, text
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        seq = 0
+        while True:
+            event = self._notifier.register()
+            seq, dropped, text = self._read_since(seq)
+            if dropped:
+                yield f"\n...[输出过快，省略 {dropped} 段]...\n"
+            if text:
+                yield text
+            if self._closed:
+                # 关闭前的最后一次写入可能发生在上面的读取之后
+                seq, dropped, text = self._read_since(seq)
+                if text:
+                    yield text
+                return
+            await event.wait()
+
+
+class StdoutStreamHub:
+    """一个 agent 当前所有运行中工具的输出流，工具执行结束（stream.close）后自动移除"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._streams: list[StdoutStream] = []
+        self._notifier = _Notifier()
+        self._last_push = 0.0
+
+    def open(self, label: str = "") -> StdoutStream:
+        stream = StdoutStream(label=label, hub=self)
+        with self._lock:
+            self._streams.append(stream)
+        self._notifier.notify()
+        return stream
+
+    def _remove(self, stream: StdoutStream) -> None:
+        with self._lock:
+            if stream in self._streams:
+                self._streams.remove(stream)
+        self._notifier.notify()
+
+    def tails(self) -> dict[str, str]:
+        """label -> 最近输出，label 重复时追加序号"""
+        with self._lock:
+            streams = list(self._streams)
+        result: dict[str, str] = {}
+        for i, stream in enumerate(streams):
+            label = stream.label or f"#{i}"
+            if label in result:
+                label = f"{label} #{i}"
+            result[label] = stream.tail()
+        return result
+
+    async def wait_update(self, until: asyncio.Future) -> bool:
+        """等待任一输出流有新内容（返回 True）或 until 完成（返回 False），两次推送之间至少间隔 STREAM_MIN_INTERVAL"""
+        event = self._notifier.register()
+        waiter = asyncio.ensure_future(event.wait())
+        try:
+            await asyncio.wait({waiter, until}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+        if until.done():
+            return False
+        remaining = self._last_push + STREAM_MIN_INTERVAL - time.monotonic()
+        if remaining > 0:
+            await asyncio.wait({until}, timeout=remaining)
+            if until.done():
+                return False
+        self._last_push = time.monotonic()
+        return True
+
+
+_current_hub: contextvars.ContextVar[Optional[StdoutStreamHub]] = contextvars.ContextVar(
+    "algo_agent_stdout_stream_hub", default=None
+)
+
+
+def context_with_hub(hub: StdoutStreamHub) -> contextvars.Context:
+    """复制当前上下文并绑定 hub，用于 asyncio.create_task(..., context=...)，不污染调用方的上下文"""
+    ctx = contextvars.copy_context()
+    ctx.run(_current_hub.set, hub)
+    return ctx
+
+
+@contextlib.contextmanager
+def open_stream(label: str = "") -> Iterator[StdoutStream]:
+    """在当前上下文的 hub 中打开一个输出流（没有 hub 时为独立的流），退出时关闭"""
+    hub = _current_hub.get()
+    stream = hub.open(label) if hub is not None else StdoutStream(label=label)
+    try:
+        yield stream
+    finally:
+        stream.close()
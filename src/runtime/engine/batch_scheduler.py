@@ -0,0 +1,135 @@
+"""
+同一轮中多个代码片段的依赖感知调度。
+
+模型在一条消息中发出多个 execute_python_code 调用时：
+1. 用 code_cache 的 AST 预分析得到每个片段的读写集合，构建依赖图：
+   后面的片段读取了前面片段写入的名字（写后读），或任一片段无法静态分析（opaque），就必须排在其后；
+2. 没有依赖的片段并行执行，一轮的耗时约等于最长的一条依赖链；
+3. 每个片段的起始工作区 = 本轮起点 + 其全部祖先片段的变化（按调用顺序应用）；
+4. 执行结束后，按调用顺序依次合并每个成功片段的变化（同名变量后者覆盖前者），结果与依次执行一致且确定。
+片段也可以逐个加入（BatchRun.add），依赖只指向更早的片段，加入即可开始执行。
+
+注意：文件等外部副作用无法从 AST 中看出，先写文件、再在另一个片段中读文件的调用仍可能并行。
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional, Union
+
+from src.runtime.status_mgr import code_cache
+from src.runtime.status_mgr import var_snapshot
+from src.runtime.sub_thread.subthread_schemas import ExecutionResult, ExecutionSuccess
+from src.utils.log_decorator import global_logger
+
+# run_one(index, globals, start) 执行第 index 个片段，globals 由起始快照 start 恢复而来
+RunOne = Callable[[int, dict[str, Any], var_snapshot.WorkspaceSnapshot], Awaitable[ExecutionResult]]
+
+
+@dataclass
+class BatchItem:
+    # 执行结果；run_one 抛出的异常原样放在这里，与 asyncio.gather(return_exceptions=True) 一致
+    result: Union[ExecutionResult, BaseException]
+    # 按调用顺序合并到该片段为止的工作区快照，只有执行成功的片段才有
+    merged_snapshot: Optional[var_snapshot.WorkspaceSnapshot] = None
+
+
+def _direct_deps(earlier: list[code_cache.CodeAnalysis], later: code_cache.CodeAnalysis) -> frozenset[int]:
+    return frozenset(
+        i for i, analysis in enumerate(earlier)
+        if later.opaque or analysis.opaque or (analysis.writes & later.reads)
+    )
+
+
+def plan_dependencies(commands: list[str]) -> list[frozenset[int]]:
+    """返回每个片段直接依赖的（更早的）片段下标"""
+    analyses = [code_cache.analyze(command) for command in commands]
+    return [_direct_deps(analyses[:j], later) for j, later in enumerate(analyses)]
+
+
+class BatchRun:
+    """
+    增量版的批次：片段可以逐个加入（如模型流式输出时，参数刚生成完整的调用），加入时即按依赖开始执行。
+    依赖只指向更早加入的片段，所以逐个加入与一次性规划得到的依赖图相同。
+    base 可以是快照，也可以是返回快照的协程函数（第一个片段开始执行时才获取）。
+    """
+    def __init__(
+        self,
+        base: Union[var_snapshot.WorkspaceSnapshot, Callable[[], Awaitable[var_snapshot.WorkspaceSnapshot]]],
+        run_one: RunOne,
+    ):
+        self._base = base
+        self._base_task: Optional[asyncio.Task] = None
+        self.run_one = run_one
+        self.analyses: list[code_cache.CodeAnalysis] = []
+        self.deps: list[frozenset[int]] = []
+        self.ancestors: list[list[int]] = []
+        self.deltas: list[Optional[var_snapshot.SnapshotDelta]] = []
+        self.tasks: list[asyncio.Task] = []
+
+    async def _get_base(self) -> var_snapshot.WorkspaceSnapshot:
+        if isinstance(self._base, var_snapshot.WorkspaceSnapshot):
+            return self._base
+        if self._base_task is None:
+            self._base_task = asyncio.ensure_future(self._base())
+        return await asyncio.shield(self._base_task)
+
+    def add(self, command: str) -> int:
+        """加入一个片段并开始调度，返回其下标"""
+        j = len(self.tasks)
+        analysis = code_cache.analyze(command)
+        direct = _direct_deps(self.analyses, analysis)
+        found = set(direct)
+        for i in direct:
+            found.update(self.ancestors[i])
+        self.analyses.append(analysis)
+        self.deps.append(direct)
+        self.ancestors.append(sorted(found))
+        self.deltas.append(None)
+        self.tasks.append(asyncio.create_task(self._run_index(j)))
+        return j
+
+    async def _run_index(self, j: int) -> ExecutionResult:
+        if self.deps[j]:
+            # 直接依赖结束时，其自身的依赖也都已结束；失败的依赖没有变化可应用
+            await asyncio.wait([self.tasks[i] for i in self.deps[j]])
+        start = await self._get_base()
+        for i in self.ancestors[j]:
+            if self.deltas[i] is not None:
+                start = start.apply(self.deltas[i])
+        execution_context = await asyncio.to_thread(start.restore)
+        result = await self.run_one(j, execution_context, start)
+        if isinstance(result, ExecutionSuccess):
+            # 未变化的变量复用 start 中的 VarSnapshot，哈希已缓存，比较只是查表
+            self.deltas[j] = var_snapshot.diff_snapshots(start, result.globals_snapshot)
+        return result
+
+    def cancel(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+
+    async def finish(self) -> list[BatchItem]:
+        """等待全部片段结束，按加入顺序合并工作区变化"""
+        global_logger.info(f"代码片段依赖图：{[sorted(d) for d in self.deps]}")
+        try:
+            results = await asyncio.gather(*self.tasks, return_exceptions=True)
+        finally:
+            self.cancel()
+        items: list[BatchItem] = []
+        merged = await self._get_base() if self.tasks else None
+        for result, delta in zip(results, self.deltas):
+            if delta is None:
+                items.append(BatchItem(result=result))
+                continue
+            merged = merged.apply(delta)
+            items.append(BatchItem(result=result, merged_snapshot=merged))
+        return items
+
+
+async def run_batch_async(
+    commands: list[str],
+    base: var_snapshot.WorkspaceSnapshot,
+    run_one: RunOne,
+) -> list[BatchItem]:
+    batch = BatchRun(base, run_one)
+    for command in commands:
+        batch.add(command)
+    return await batch.finish()
@@ -0,0 +1,18 @@
+import os
+from enum import Enum, unique
+
+
+@unique
+class ExecutorEngine(str, Enum):
+    THREAD = "thread"      # 子线程执行：启动最快，但超时后线程无法被强制结束
+    PROCESS = "process"    # 预热进程池执行：超时可 SIGKILL，崩溃可拿到真实退出码，多核并行
+    KERNEL = "kernel"      # 每个 agent 一个常驻 Jupyter 内核：状态留在内核中，不再每次序列化工作区
+    FORK = "fork"          # 每个 agent 一条 fork checkpoint 链：执行前 fork，失败即丢弃子进程，O(1) 回滚（Linux / macOS）
+
+
+# 状态常驻在执行器中的引擎：不需要每次恢复和保存工作区快照，同一 agent 的执行按顺序进行
+RESIDENT_ENGINES = frozenset({ExecutorEngine.KERNEL, ExecutorEngine.FORK})
+
+
+# 通过环境变量切换默认执行引擎，例如：ALGO_AGENT_EXECUTOR_ENGINE=process
+default_executor_engine = ExecutorEngine(os.getenv("ALGO_AGENT_EXECUTOR_ENGINE", ExecutorEngine.THREAD.value))
@@ -0,0 +1,96 @@
+from typing import Any, Dict, Optional
+
+from src.runtime.engine import engine_enum
+from src.runtime.ctx_mgr import stdout_stream
+from src.runtime.status_mgr import code_cache
+from src.runtime.status_mgr import var_snapshot
+from src.runtime.sub_thread.subthread_schemas import ExecutionFailure, ExecutionResult
+from src.runtime.sub_thread import subthread_python_executor
+from src.runtime.sub_process import subprocess_python_executor
+from src.runtime.sub_process import fork_checkpoint_executor
+from src.runtime.sub_kernel import kernel_python_executor
+
+
+def precheck(
+    command: str,
+    timeout: Optional[float] = None,
+    engine: Optional[engine_enum.ExecutorEngine] = None,
+) -> Optional[ExecutionFailure]:
+    """
+    执行前的静态检查（结果按源码哈希缓存）：有语法错误时直接返回 ExecutionFailure，不必启动执行器或恢复工作区。
+    内核引擎支持 %magic / !shell 等 IPython 语法，不做检查。
+    """
+    engine = engine or engine_enum.default_executor_engine
+    if engine == engine_enum.ExecutorEngine.KERNEL:
+        return None
+    analysis = code_cache.analyze(command)
+    if not analysis.has_syntax_error:
+        return None
+    return ExecutionFailure(
+        arg_command=command,
+        arg_timeout=timeout,
+        exec_timeout=0.0,
+        exception_repr=f"{analysis.error_type}({analysis.error_value!r})",
+        exception_type=analysis.error_type,
+        exception_value=analysis.error_value,
+        exception_traceback=analysis.error_traceback,
+    )
+
+
+def snapshot_resident(engine: Optional[engine_enum.ExecutorEngine] = None) -> Optional[var_snapshot.WorkspaceSnapshot]:
+    """常驻引擎（状态保存在执行器中）按需生成当前 agent 工作区的快照，其他引擎返回 None"""
+    engine = engine or engine_enum.default_executor_engine
+    if engine == engine_enum.ExecutorEngine.KERNEL:
+        return kernel_python_executor.snapshot_kernel()
+    if engine == engine_enum.ExecutorEngine.FORK:
+        return fork_checkpoint_executor.snapshot_checkpoint()
+    return None
+
+
+def run_structured(
+    command: str,
+    _globals: dict[str, Any] | None = None,
+    _locals: Optional[Dict] = None,
+    timeout: Optional[float] = None,
+    engine: Optional[engine_enum.ExecutorEngine] = None,
+    stdout_buffer: Optional[stdout_stream.StdoutStream] = None,
+    work_dir: Optional[str] = None,
+) -> ExecutionResult:
+    """
+    按执行引擎分发，所有引擎的参数和返回值（ExecutionResult）保持一致。
+    stdout_buffer 用于实时读取输出；work_dir 为执行时的工作目录，默认 PY_OUTPUT_DIR。
+    """
+    engine = engine or engine_enum.default_executor_engine
+    failure = precheck(command, timeout, engine)
+    if failure is not None:
+        return failure
+    if engine == engine_enum.ExecutorEngine.PROCESS:
+        return subprocess_python_executor.run_structured_in_process(command, _globals, _locals, timeout, stdout_buffer, work_dir)
+    if engine == engine_enum.ExecutorEngine.KERNEL:
+        return kernel_python_executor.run_structured_in_kernel(command, _globals, _locals, timeout, stdout_buffer, work_dir)
+    if engine == engine_enum.ExecutorEngine.FORK:
+        return fork_checkpoint_executor.run_structured_in_fork(command, _globals, _locals, timeout, stdout_buffer, work_dir)
+    return subthread_python_executor.run_structured_in_thread(command, _globals, _locals, timeout, stdout_buffer, work_dir)
+
+
+async def run_structured_async(
+    command: str,
+    _globals: dict[str, Any] | None = None,
+    _locals: Optional[Dict] = None,
+    timeout: Optional[float] = None,
+    engine: Optional[engine_enum.ExecutorEngine] = None,
+    stdout_buffer: Optional[stdout_stream.StdoutStream] = None,
+    work_dir: Optional[str] = None,
+) -> ExecutionResult:
+    """run_structured 的可等待版本：不阻塞事件循环，支持取消（进程池引擎取消时会 SIGKILL worker，内核引擎会 interrupt 内核）"""
+    engine = engine or engine_enum.default_executor_engine
+    failure = precheck(command, timeout, engine)
+    if failure is not None:
+        return failure
+    if engine == engine_enum.ExecutorEngine.PROCESS:
+        return await subprocess_python_executor.run_structured_in_process_async(command, _globals, _locals, timeout, stdout_buffer, work_dir)
+    if engine == engine_enum.ExecutorEngine.KERNEL:
+        return await kernel_python_executor.run_structured_in_kernel_async(command, _globals, _locals, timeout, stdout_buffer, work_dir)
+    if engine == engine_enum.ExecutorEngine.FORK:
+        return await fork_checkpoint_executor.run_structured_in_fork_async(command, _globals, _locals, timeout, stdout_buffer, work_dir)
+    return await subthread_python_executor.run_structured_in_thread_async(command, _globals, _locals, timeout, stdout_buffer, work_dir)
@@ -0,0 +1,365 @@
+"""
+执行代码的编译缓存与 AST 预分析：同一段源码（按 sha256 寻址）只解析、编译一次。
+
+预分析结果（CodeAnalysis）：
+- reads：代码依赖的外部变量（在本段代码中赋值之前就被读取的模块级名字，函数体内读取的全局名字也算），不含内置名字；
+- writes：代码在模块级绑定、删除或可能原地修改的名字。可能的原地修改：x[...] = / x.attr =、
+  调用 x 的任意方法（x.fit(...) / x.add_edge(...)）、把 x 作为参数传给任意调用（f(x)），宁可多算，调度时只会多一条依赖。
+  模块不是工作区变量：本段代码中 import 的名字和 worker 预先注入的别名（np / pd 等）上的方法调用不算写入；
+  del x 要求 x 已经存在，同时算作读取；
+- imports：导入的模块名；
+- opaque：使用了 globals() / exec / from m import * 等无法静态分析名字的写法；
+- 语法错误：执行前即可发现，直接返回 ExecutionFailure，不必启动线程或恢复工作区快照。
+
+注意：该模块也会在进程池 worker 中被导入，只能依赖标准库。
+"""
+import ast
+import builtins
+import hashlib
+import os
+import threading
+import traceback
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import CodeType
+from typing import Iterable, Optional
+
+# exec 执行的代码统一使用 <string> 作为文件名，source_code.filter_exec_traceback 依赖它过滤栈帧
+EXEC_FILENAME = "<string>"
+CODE_CACHE_SIZE = int(os.getenv("ALGO_AGENT_CODE_CACHE_SIZE", "256"))
+
+_BUILTIN_NAMES = frozenset(dir(builtins))
+# 通过这些内置函数可以读写任意名字，静态分析无法得到准确的读写集合
+_OPAQUE_NAMES = frozenset({"globals", "locals", "vars", "exec", "eval", "__import__"})
+
+
+@dataclass(frozen=True)
+class CodeAnalysis:
+    source_hash: str
+    reads: frozenset[str] = frozenset()
+    writes: frozenset[str] = frozenset()
+    imports: tuple[str, ...] = ()
+    opaque: bool = False
+    # 语法错误（类型、描述、与运行时一致的报错信息），没有语法错误时均为 None
+    error_type: Optional[str] = None
+    error_value: Optional[str] = None
+    error_traceback: Optional[str] = None
+
+    @property
+    def has_syntax_error(self) -> bool:
+        return self.error_type is not None
+
+
+@dataclass(frozen=True)
+class PreparedCode:
+    code: Optional[CodeType]
+    analysis: CodeAnalysis
+
+
+def _target_names(target: ast.AST) -> Iterable[str]:
+    """赋值目标中被绑定的名字：a / a, b / *a"""
+    if isinstance(target, ast.Name):
+        yield target.id
+    elif isinstance(target, (ast.Tuple, ast.List)):
+        for elt in target.elts:
+            yield from _target_names(elt)
+    elif isinstance(target, ast.Starred):
+        yield from _target_names(target.value)
+
+
+def _mutated_root(target: ast.AST) -> Optional[str]:
+    """x[...] = / x.attr = 原地修改的根变量名"""
+    while isinstance(target, (ast.Subscript, ast.Attribute)):
+        target = target.value
+    return target.id if isinstance(target, ast.Name) else None
+
+
+def _import_bindings(node: ast.Import | ast.ImportFrom) -> Iterable[str]:
+    for alias in node.names:
+        if alias.name == "*":
+            continue
+        yield alias.asname or alias.name.split(".")[0]
+
+
+class _ScopeVisitor(ast.NodeVisitor):
+    """
+    收集一个作用域（模块级语句 / 函数体 / 推导式 / 类体）内的名字：
+    loads 为读取的名字，stores 为在该作用域绑定的名字，global_stores 为通过 global 声明写入模块级的名字，
+    mutations 为可能原地修改（不重新绑定）的名字，outer_stores 为推导式中海象赋值绑定到外层作用域的名字。
+    """
+    def __init__(self, is_module: bool, is_comprehension: bool = False):
+        self.is_module = is_module
+        self.is_comprehension = is_comprehension
+        self.outer_stores: set[str] = set()
+        self.loads: set[str] = set()
+        self.stores: set[str] = set()
+        self.global_decls: set[str] = set()
+        self.global_stores: set[str] = set()
+        self.mutations: set[str] = set()
+        self.imports: list[str] = []
+        # 本作用域中 import 绑定的名字
+        self.import_names: set[str] = set()
+        self.star_import = False
+
+    def _store(self, name: str) -> None:
+        if not self.is_module and name in self.global_decls:
+            self.global_stores.add(name)
+        else:
+            self.stores.add(name)
+
+    def _store_named(self, name: str) -> None:
+        # 海象赋值绑定到最近的非推导式作用域
+        if self.is_comprehension:
+            self.outer_stores.add(name)
+        else:
+            self._store(name)
+
+    def _mutate(self, target: ast.AST) -> None:
+        root = _mutated_root(target)
+        if root is not None:
+            self.loads.add(root)
+            self.mutations.add(root)
+
+    def _visit_child_scope(
+        self, nodes: Iterable[ast.AST], local_names: Iterable[str], is_comprehension: bool = False,
+    ) -> None:
+        child = _ScopeVisitor(is_module=False, is_comprehension=is_comprehension)
+        child.stores.update(local_names)
+        for node in nodes:
+            child.visit(node)
+        # 子作用域中未在本地绑定的名字，是对外层（最终是模块级）的读取
+        # 推导式中海象赋值的名字在推导式内读取时（if (y := f(x)) 之后的 y）已经绑定
+        self.loads.update(child.loads - child.stores - child.outer_stores)
+        self.mutations.update(child.mutations - child.stores)
+        self.global_stores.update(child.global_stores)
+        self.imports.extend(child.imports)
+        self.star_import |= child.star_import
+        for name in child.outer_stores:
+            self._store_named(name)
+        if self.is_module:
+            self.stores.update(child.global_stores)
+
+    def visit_Name(self, node: ast.Name) -> None:
+        if isinstance(node.ctx, ast.Load):
+            self.loads.add(node.id)
+        else:
+            self._store(node.id)
+
+    def visit_AugAssign(self, node: ast.AugAssign) -> None:
+        # x += 1 同时读写 x；x[0] += 1 原地修改 x
+        if isinstance(node.target, ast.Name):
+            self.loads.add(node.target.id)
+            self._store(node.target.id)
+        else:
+            self._visit_target(node.target)
+        self.visit(node.value)
+
+    def visit_Assign(self, node: ast.Assign) -> None:
+        self.visit(node.value)
+        for target in node.targets:
+            self._visit_target(target)
+
+    def visit_AnnAssign(self, node: ast.AnnAssign) -> None:
+        if node.value is not None:
+            self.visit(node.value)
+        self.visit(node.annotation)
+        self._visit_target(node.target)
+
+    def visit_Delete(self, node: ast.Delete) -> None:
+        # del x 与 x += 1 相同：x 必须已经存在，既读又写
+        for target in node.targets:
+            self.loads.update(_target_names(target))
+            self._visit_target(target)
+
+    def _visit_target(self, target: ast.AST) -> None:
+        if isinstance(target, (ast.Subscript, ast.Attribute)):
+            self._mutate(target)
+            # 下标、属性表达式中的其他名字照常读取
+            self.generic_visit(target)
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            for elt in target.elts:
+                self._visit_target(elt)
+        elif isinstance(target, ast.Starred):
+            self._visit_target(target.value)
+        else:
+            self.visit(target)
+
+    def visit_NamedExpr(self, node: ast.NamedExpr) -> None:
+        self.visit(node.value)
+        self._store_named(node.target.id)
+
+    def visit_Call(self, node: ast.Call) -> None:
+        # 方法调用（model.fit(...)）和作为参数传入的对象（f(G)）都可能被原地修改，无法静态区分，一律视为写入
+        if isinstance(node.func, ast.Attribute):
+            self._mutate(node.func.value)
+        for arg in node.args + [kw.value for kw in node.keywords]:
+            self._mutate(arg.value if isinstance(arg, ast.Starred) else arg)
+        self.generic_visit(node)
+
+    def visit_Global(self, node: ast.Global) -> None:
+        self.global_decls.update(node.names)
+
+    def visit_Import(self, node: ast.Import) -> None:
+        self.imports.extend(alias.name for alias in node.names)
+        for name in _import_bindings(node):
+            self.import_names.add(name)
+            self._store(name)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        self.imports.append("." * node.level + (node.module or ""))
+        self.star_import |= any(alias.name == "*" for alias in node.names)
+        for name in _import_bindings(node):
+            self.import_names.add(name)
+            self._store(name)
+
+    def _visit_function(self, node: ast.FunctionDef | ast.AsyncFunctionDef | ast.Lambda) -> None:
+        args = node.args
+        for default in args.defaults + [d for d in args.kw_defaults if d is not None]:
+            self.visit(default)
+        params = [a.arg for a in args.posonlyargs + args.args + args.kwonlyargs]
+        params += [a.arg for a in (args.vararg, args.kwarg) if a is not None]
+        body = node.body if isinstance(node.body, list) else [node.body]
+        self._visit_child_scope(body, params)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        self._visit_function(node)
+        self._store(node.name)
+
+    visit_AsyncFunctionDef = visit_FunctionDef  # type: ignore[assignment]
+
+    def visit_Lambda(self, node: ast.Lambda) -> None:
+        self._visit_function(node)
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        for expr in node.decorator_list + node.bases + [kw.value for kw in node.keywords]:
+            self.visit(expr)
+        self._visit_child_scope(node.body, [])
+        self._store(node.name)
+
+    def _visit_comprehension(self, node: ast.ListComp | ast.SetComp | ast.DictComp | ast.GeneratorExp) -> None:
+        # 第一个 iter 在外层作用域求值，其余部分在推导式自己的作用域中
+        self.visit(node.generators[0].iter)
+        targets = [name for gen in node.generators for name in _target_names(gen.target)]
+        inner: list[ast.AST] = []
+        for i, gen in enumerate(node.generators):
+            if i:
+                inner.append(gen.iter)
+            inner.extend(gen.ifs)
+        if isinstance(node, ast.DictComp):
+            inner.extend([node.key, node.value])
+        else:
+            inner.append(node.elt)
+        self._visit_child_scope(inner, targets, is_comprehension=True)
+
+    visit_ListComp = visit_SetComp = visit_DictComp = visit_GeneratorExp = _visit_comprehension  # type: ignore[assignment]
+
+
+def _preloaded_aliases() -> frozenset[str]:
+    """进程池 / fork worker 预先注入的模块别名（ALGO_AGENT_WARM_MODULES 中的 "numpy as np" 等）"""
+    # 延迟导入：subprocess_worker 在模块级导入了本模块
+    from src.runtime.sub_process import subprocess_worker
+    return frozenset(alias for _, alias in subprocess_worker.parse_warm_modules() if alias)
+
+
+def analyze_tree(tree: ast.Module, source_hash: str) -> CodeAnalysis:
+    """按语句顺序分析：某个名字在本段代码中赋值之前被读取，才算作对外部工作区的依赖"""
+    reads: set[str] = set()
+    written: set[str] = set()
+    imports: list[str] = []
+    # 指向模块的名字，对它们的方法调用不是对工作区变量的修改
+    module_names = set(_preloaded_aliases())
+    opaque = False
+    for stmt in tree.body:
+        visitor = _ScopeVisitor(is_module=True)
+        visitor.visit(stmt)
+        module_names.update(visitor.import_names)
+        reads.update(visitor.loads - written)
+        written.update(visitor.stores | (visitor.mutations - module_names))
+        imports.extend(visitor.imports)
+        opaque = opaque or visitor.star_import or bool(visitor.loads & _OPAQUE_NAMES)
+    return CodeAnalysis(
+        source_hash=source_hash,
+        reads=frozenset(reads - _BUILTIN_NAMES),
+        writes=frozenset(written),
+        imports=tuple(dict.fromkeys(imports)),
+        opaque=opaque,
+    )
+
+
+def source_hash(source: str) -> str:
+    return hashlib.sha256(source.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def _prepare_uncached(source: str, digest: str) -> PreparedCode:
+    try:
+        tree = ast.parse(source, filename=EXEC_FILENAME, mode="exec")
+        code = compile(tree, EXEC_FILENAME, "exec")
+    except (SyntaxError, ValueError) as e:
+        # ValueError：源码中包含空字节等无法编译的内容
+        return PreparedCode(
+            code=None,
+            analysis=CodeAnalysis(
+                source_hash=digest,
+                error_type=type(e).__name__,
+                error_value=str(e),
+                error_traceback="".join(traceback.format_exception_only(type(e), e)).rstrip("\n"),
+            ),
+        )
+    return PreparedCode(code=code, analysis=analyze_tree(tree, digest))
+
+
+class _CodeCache:
+    """按源码哈希缓存编译结果和预分析结果的 LRU"""
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, PreparedCode] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, source: str) -> PreparedCode:
+        digest = source_hash(source)
+        with self._lock:
+            prepared = self._entries.get(digest)
+            if prepared is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return prepared
+            self.misses += 1
+        prepared = _prepare_uncached(source, digest)
+        with self._lock:
+            self._entries[digest] = prepared
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return prepared
+
+    def info(self) -> dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "max_size": self.max_size}
+
+
+_cache = _CodeCache(CODE_CACHE_SIZE)
+
+
+def prepare(source: str) -> PreparedCode:
+    """解析 + 编译 + 预分析，结果按源码哈希缓存"""
+    return _cache.get(source)
+
+
+def analyze(source: str) -> CodeAnalysis:
+    return prepare(source).analysis
+
+
+def compile_cached(source: str) -> CodeType:
+    """与 compile(source, "<string>", "exec") 等价；有语法错误时重新编译一次，抛出原样的异常"""
+    prepared = prepare(source)
+    if prepared.code is None:
+        return compile(source, EXEC_FILENAME, "exec")
+    return prepared.code
+
+
+def cache_info() -> dict[str, int]:
+    return _cache.info()
@@ -0,0 +1,132 @@
+"""
+给模型的终端输出预算：超出预算时保留开头和结尾，中间省略，完整输出写入 PY_OUTPUT_DIR/tool_output 下的文件，
+并把路径告诉模型（之后的代码可以直接读取该文件）。
+
+- ALGO_AGENT_OUTPUT_BUDGET_CHARS：给模型的输出最多多少个字符，默认 8000；
+- ALGO_AGENT_OUTPUT_HEAD_RATIO：预算中留给开头的比例，其余留给结尾，默认 0.6。
+
+截断时对本次代码写入的 DataFrame / ndarray / 容器等变量生成结构概览（形状、列、类型），
+模型不需要看到完整的打印内容也能了解结果的结构。
+"""
+import hashlib
+import itertools
+import os
+import re
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional
+
+from src.utils.path_util import static_path
+
+OUTPUT_BUDGET_CHARS = int(os.getenv("ALGO_AGENT_OUTPUT_BUDGET_CHARS", "8000"))
+OUTPUT_HEAD_RATIO = float(os.getenv("ALGO_AGENT_OUTPUT_HEAD_RATIO", "0.6"))
+SPILL_DIR_NAME = "tool_output"
+# 溢出文件按内容寻址（stdout_<内容哈希>.txt），同样的输出在不同运行中文件名相同，只有所在的运行目录不同
+SPILL_PATH_RE = re.compile(r"[^\s'\"]*/" + SPILL_DIR_NAME + r"/(stdout_[0-9a-f]{12}\.txt)")
+# 结构概览最多列出的变量数、每个概览的最大长度
+SUMMARY_MAX_VARS = 10
+SUMMARY_MAX_CHARS = 300
+
+
+@dataclass
+class TruncatedOutput:
+    text: str
+    total_chars: int
+    total_lines: int
+    shown_chars: int
+    omitted_chars: int
+    omitted_lines: int
+    spill_path: Optional[str]
+
+
+def spill(text: str) -> Optional[str]:
+    """完整输出写入文件，返回绝对路径；写入失败时返回 None（只影响提示，不影响执行结果）"""
+    digest = hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()[:12]
+    path = static_path.Dir.PY_OUTPUT_DIR / SPILL_DIR_NAME / f"stdout_{digest}.txt"
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if not path.exists():
+            path.write_text(text, encoding="utf-8", errors="surrogatepass")
+    except OSError:
+        return None
+    return path.resolve().as_posix()
+
+
+def _cut_head(text: str, limit: int) -> str:
+    head = text[:limit]
+    newline = head.rfind("\n")
+    # 尽量在行尾截断，但不为此丢掉一半以上的预算
+    return head[:newline + 1] if newline >= limit // 2 else head
+
+
+def _cut_tail(text: str, limit: int) -> str:
+    if limit <= 0:
+        return ""
+    tail = text[-limit:]
+    newline = tail.find("\n")
+    return tail[newline + 1:] if 0 <= newline < limit // 2 else tail
+
+
+def truncate(text: str, budget: Optional[int] = None, head_ratio: Optional[float] = None) -> Optional[TruncatedOutput]:
+    """输出在预算内时返回 None；否则返回保留首尾的文本，并把完整输出写入文件"""
+    budget = OUTPUT_BUDGET_CHARS if budget is None else budget
+    if budget <= 0 or len(text) <= budget:
+        return None
+    head_ratio = OUTPUT_HEAD_RATIO if head_ratio is None else head_ratio
+    head = _cut_head(text, int(budget * head_ratio))
+    tail = _cut_tail(text[len(head):], budget - len(head))
+    omitted = text[len(head):len(text) - len(tail)]
+    spill_path = spill(text)
+    where = f"完整输出已保存到 {spill_path}" if spill_path else "完整输出保存失败"
+    marker = f"\n...（省略 {omitted.count(chr(10))} 行，{len(omitted)} 个字符；{where}）...\n"
+    return TruncatedOutput(
+        text=head + marker + tail,
+        total_chars=len(text),
+        total_lines=text.count("\n") + (not text.endswith("\n")),
+        shown_chars=len(head) + len(tail),
+        omitted_chars=len(omitted),
+        omitted_lines=omitted.count("\n"),
+        spill_path=spill_path,
+    )
+
+
+def _clip(text: str) -> str:
+    return text if len(text) <= SUMMARY_MAX_CHARS else text[:SUMMARY_MAX_CHARS] + "..."
+
+
+def summarize_value(value: Any) -> Optional[str]:
+    """常见对象的结构概览，按类型名判断，不导入 pandas / numpy；不认识的对象返回 None"""
+    type_name = type(value).__name__
+    if type_name == "DataFrame" and hasattr(value, "dtypes"):
+        columns = ", ".join(f"{col}: {dtype}" for col, dtype in value.dtypes.items())
+        return _clip(f"DataFrame shape={tuple(value.shape)} columns=[{columns}]")
+    if type_name == "Series" and hasattr(value, "dtype"):
+        return _clip(f"Series len={len(value)} dtype={value.dtype} name={value.name!r}")
+    if type_name == "ndarray" and hasattr(value, "shape"):
+        return f"ndarray shape={tuple(value.shape)} dtype={value.dtype}"
+    if isinstance(value, (list, tuple, set, frozenset)):
+        element_types = sorted({type(v).__name__ for v in itertools.islice(value, 100)})
+        return f"{type_name} len={len(value)} element_types={element_types}"
+    if isinstance(value, dict):
+        keys = list(itertools.islice(value, 5))
+        return _clip(f"dict len={len(value)} keys[:5]={keys!r}")
+    if isinstance(value, (str, bytes)) and len(value) > SUMMARY_MAX_CHARS:
+        return f"{type_name} len={len(value)}"
+    return None
+
+
+def summarize_variables(_globals: Mapping[str, Any], names: Iterable[str]) -> list[str]:
+    """为 names 中（按名字排序）存在于工作区、且能生成概览的变量各生成一行概览"""
+    lines: list[str] = []
+    for name in sorted(names):
+        if name not in _globals:
+            continue
+        try:
+            summary = summarize_value(_globals[name])
+        except Exception:
+            continue
+        if summary is not None:
+            lines.append(f"{name}: {summary}")
+        if len(lines) >= SUMMARY_MAX_VARS:
+            break
+    return lines
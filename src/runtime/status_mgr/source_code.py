@@ -48,6 +48,28 @@ def get_exception_traceback() -> str:
     return "\n".join(error_lines)
 
 
+def filter_exec_traceback() -> str:
+    """只保留 exec 执行的 <string> 代码相关的栈帧，过滤掉执行器自身的栈帧"""
+    exc_str = traceback.format_exc()
+    # 按行拆分栈信息，过滤出 <string> 相关的行（exec 内部代码）
+    lines = exc_str.splitlines()
+    exec_lines = []
+    for line in lines:
+        # 核心特征：包含 "<string>"（exec 执行字符串代码的标记）
+        if "Traceback" in line:
+            exec_lines.append(line)
+        elif "<string>" in line:
+            exec_lines.append(line)
+        # 保留 exec 栈段的后续行（如出错代码行、异常描述）
+        elif exec_lines and "<string>" in exec_lines[-1]:
+            # 终止条件：遇到新的栈帧（以 "File " 开头但不含 <string>）
+            if line.startswith("File ") and "<string>" not in line:
+                continue
+            exec_lines.append(line)
+    # 重新拼接过滤后的字符串
+    return "\n".join(exec_lines)
+
+
 def get_code_and_traceback(command: str) -> str:
     """
 原始代码：
@@ -0,0 +1,124 @@
+"""
+有内存预算的快照历史：替代 var_ws 中无限增长的快照列表。
+- 每条历史在落盘（var_store 清单）之后才允许被淘汰，淘汰只是丢弃内存中的快照，清单仍在磁盘上；
+- 超出内存预算时按 LRU（最久未访问）淘汰，空闲时间超过 max_idle_seconds 的历史也会被淘汰；
+- 最新一条历史始终常驻内存（下一次执行总是从它开始）；
+- 访问已淘汰的历史时，按清单从磁盘重新加载。
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from src.runtime.status_mgr import var_snapshot
+from src.runtime.status_mgr import var_store
+from src.utils.log_decorator import global_logger
+
+# 通过环境变量配置历史快照的内存预算和空闲淘汰时间
+DEFAULT_MEMORY_BUDGET_BYTES = int(float(os.getenv("ALGO_AGENT_VAR_HISTORY_BUDGET_MB", "1024")) * 1024 * 1024)
+DEFAULT_MAX_IDLE_SECONDS: Optional[float] = (
+    float(os.environ["ALGO_AGENT_VAR_HISTORY_MAX_IDLE_SECONDS"])
+    if os.getenv("ALGO_AGENT_VAR_HISTORY_MAX_IDLE_SECONDS") else None
+)
+
+
+@dataclass
+class _HistoryEntry:
+    manifest_path: Optional[str]
+    snapshot: Optional[var_snapshot.WorkspaceSnapshot]
+    last_access: float = field(default_factory=time.monotonic)
+
+    @property
+    def resident_bytes(self) -> int:
+        return self.snapshot.resident_bytes if self.snapshot is not None else 0
+
+
+class SnapshotHistory:
+    def __init__(
+        self,
+        memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_BYTES,
+        max_idle_seconds: Optional[float] = DEFAULT_MAX_IDLE_SECONDS,
+    ):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.max_idle_seconds = max_idle_seconds
+        self._entries: list[_HistoryEntry] = []
+        self._lock = threading.RLock()
+        self.evictions = 0
+        self.reloads = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __bool__(self) -> bool:
+        return bool(self._entries)
+
+    def __getitem__(self, index: int) -> var_snapshot.WorkspaceSnapshot:
+        return self.get(index)
+
+    def append(self, snapshot: var_snapshot.WorkspaceSnapshot, manifest_path: Optional[str] = None) -> int:
+        """追加一条历史，返回其下标；manifest_path 为空表示尚未落盘，不会被淘汰"""
+        with self._lock:
+            self._entries.append(_HistoryEntry(manifest_path=manifest_path, snapshot=snapshot))
+            self._evict()
+            return len(self._entries) - 1
+
+    def mark_stored(self, index: int, manifest_path: str) -> None:
+        """后台落盘完成：记录清单路径，之后允许淘汰"""
+        with self._lock:
+            self._entries[index].manifest_path = manifest_path
+            self._evict()
+
+    def get(self, index: int) -> var_snapshot.WorkspaceSnapshot:
+        with self._lock:
+            entry = self._entries[index]
+            entry.last_access = time.monotonic()
+            snapshot = entry.snapshot
+            if snapshot is None:
+                global_logger.info(f"快照历史：从磁盘重新加载 {entry.manifest_path}")
+                snapshot = entry.snapshot = var_store.load_snapshot(entry.manifest_path)
+                self.reloads += 1
+                self._evict()
+            return snapshot
+
+    def latest(self) -> var_snapshot.WorkspaceSnapshot:
+        return self.get(-1)
+
+    def _evictable(self) -> list[_HistoryEntry]:
+        # 最新一条永远不淘汰，未落盘的无法重新加载，也不淘汰
+        return [
+            entry for entry in self._entries[:-1]
+            if entry.snapshot is not None and entry.manifest_path is not None
+        ]
+
+    def _drop(self, entry: _HistoryEntry) -> None:
+        entry.snapshot = None
+        self.evictions += 1
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        if self.max_idle_seconds is not None:
+            for entry in self._evictable():
+                if now - entry.last_access > self.max_idle_seconds:
+                    self._drop(entry)
+        resident = self.resident_bytes
+        for entry in sorted(self._evictable(), key=lambda e: e.last_access):
+            if resident <= self.memory_budget_bytes:
+                break
+            resident -= entry.resident_bytes
+            self._drop(entry)
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(e.resident_bytes for e in self._entries)
+
+    def metrics(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "resident_entries": sum(1 for e in self._entries if e.snapshot is not None),
+                "resident_bytes": self.resident_bytes,
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "evictions": self.evictions,
+                "reloads": self.reloads,
+            }
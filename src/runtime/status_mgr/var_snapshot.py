@@ -0,0 +1,373 @@
+"""
+工作区变量快照：每个变量只 pickle 一次，得到的字节同时用于
+1. 内存中的历史副本（需要时 pickle.loads 得到独立的新对象，等价于深拷贝）；
+2. 磁盘上的 .pkl 持久化（直接写字节，不再重复序列化）。
+
+NumPy / pandas 的大块数据使用 pickle protocol 5 带外（out-of-band）缓冲区单独保存：
+- 不再拷贝进 pickle 字节流；
+- 落盘后快照只保留文件路径，恢复时用 mmap 写时复制（ACCESS_COPY）映射，
+  多轮快照共享同一份页缓存，不再常驻内存。
+
+变量级变化检测（ChangeBase + take_delta）：执行后只为真正变化的变量生成新的快照，未变化的变量直接复用起始快照中的 VarSnapshot
+（不再拷贝缓冲区、不再落盘）。判断顺序：
+1. 身份：仍是执行前的同一个对象，且是不可变的原子类型（int / str / 元组等）；
+2. 内容哈希：序列化一遍，带外缓冲区（NumPy / pandas 的数据）直接对原内存做哈希而不拷贝，与起始快照的 blob_hash 比较，
+   只有哈希不同时才拷贝缓冲区。
+
+注意：该模块也会在进程池 worker 中被导入，只能依赖标准库。
+"""
+import contextlib
+import contextvars
+import hashlib
+import mmap
+import pickle
+import time
+import types
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Any, Iterator, Optional
+
+# 小于该大小的缓冲区仍然放在 pickle 字节流里（带内），避免产生大量小文件
+OOB_BUFFER_THRESHOLD = 64 * 1024
+# 不可变的原子类型：执行后仍是同一个对象即可认定未变化
+_IMMUTABLE_TYPES = (type(None), bool, int, float, complex, str, bytes, range)
+
+
+def _map_copy_on_write(path: str) -> mmap.mmap:
+    """只读打开文件并以写时复制方式映射：修改只影响当前进程的私有页，不会写回文件"""
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+
+@dataclass
+class VarSnapshot:
+    """单个变量的快照"""
+    name: str
+    blob: bytes
+    type_name: str
+    cost_seconds: float
+    # 带外缓冲区：落盘前保存在 buffers 中，落盘后改为 buffer_paths（mmap 映射）
+    buffers: list[bytes] = field(default_factory=list)
+    buffer_paths: list[str] = field(default_factory=list)
+    buffer_sizes: list[int] = field(default_factory=list)
+    # 已写入内容寻址存储：复用到之后的快照时不必再检查磁盘
+    stored: bool = False
+
+    @property
+    def nbytes(self) -> int:
+        """变量的总字节数（pickle 字节流 + 带外缓冲区）"""
+        return len(self.blob) + sum(self.buffer_sizes)
+
+    @property
+    def resident_nbytes(self) -> int:
+        """常驻内存的字节数，已映射到文件的缓冲区不计入"""
+        return len(self.blob) + sum(len(b) for b in self.buffers)
+
+    @cached_property
+    def blob_hash(self) -> str:
+        """内容哈希（覆盖 pickle 字节流和全部带外缓冲区），用于磁盘上的内容寻址存储"""
+        hasher = hashlib.sha256(self.blob)
+        for buffer in self.buffers:
+            hasher.update(buffer)
+        return hasher.hexdigest()
+
+    def attach_buffer_files(self, buffer_paths: list[str]) -> None:
+        """带外缓冲区已经落盘：释放内存中的副本，之后的恢复改为 mmap 映射文件"""
+        _ = self.blob_hash  # 释放 buffers 之前先确定哈希
+        self.buffer_paths = list(buffer_paths)
+        self.buffers = []
+
+    def restore(self) -> Any:
+        # 后台落盘（attach_buffer_files）可能同时进行：先取 buffers 再看 buffer_paths，两者至少有一个可用
+        in_memory = self.buffers
+        if self.buffer_paths:
+            # 每次恢复都单独映射，写时复制保证各次恢复出来的对象互不影响
+            buffers: list[Any] = [_map_copy_on_write(path) for path in self.buffer_paths]
+        else:
+            # bytes 只读，复制成 bytearray，恢复出的数组才可写
+            buffers = [bytearray(buffer) for buffer in in_memory]
+        return pickle.loads(self.blob, buffers=buffers)
+
+
+@dataclass
+class WorkspaceSnapshot:
+    """整个工作区的快照，vars 中只包含可序列化的变量，skipped 记录被过滤的变量及原因"""
+    vars: dict[str, VarSnapshot] = field(default_factory=dict)
+    skipped: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(v.nbytes for v in self.vars.values())
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(v.resident_nbytes for v in self.vars.values())
+
+    @property
+    def total_cost_seconds(self) -> float:
+        return sum(v.cost_seconds for v in self.vars.values())
+
+    def keys(self) -> list[str]:
+        return list(self.vars.keys())
+
+    def restore(self) -> dict[str, Any]:
+        """反序列化得到一份全新的 globals 字典，与快照之间互不影响"""
+        return {name: var.restore() for name, var in self.vars.items()}
+
+    def apply(self, delta: "SnapshotDelta") -> "WorkspaceSnapshot":
+        """在当前快照上应用一组变化，得到新的快照（共享未变化的 VarSnapshot，不重新序列化）"""
+        merged = {name: var for name, var in self.vars.items() if name not in delta.deleted}
+        merged.update(delta.changed)
+        skipped = {name: reason for name, reason in self.skipped.items() if name not in delta.changed}
+        skipped.update(delta.skipped)
+        return WorkspaceSnapshot(vars=merged, skipped=skipped)
+
+    def cost_report(self, top_n: int | None = None) -> list[dict[str, Any]]:
+        """按序列化耗时倒序返回每个变量的快照开销"""
+        report = [
+            {
+                "name": var.name,
+                "type": var.type_name,
+                "bytes": var.nbytes,
+                "oob_buffers": len(var.buffer_sizes),
+                "cost_ms": round(var.cost_seconds * 1000, 3),
+            }
+            for var in sorted(self.vars.values(), key=lambda v: v.cost_seconds, reverse=True)
+        ]
+        return report[:top_n] if top_n else report
+
+
+class LazyWorkspace(Mapping):
+    """快照的只读字典视图：变量在第一次访问时才反序列化（之后缓存），遍历名字不反序列化"""
+
+    def __init__(self, snapshot: WorkspaceSnapshot):
+        self._snapshot = snapshot
+        self._restored: dict[str, Any] = {}
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in self._restored:
+            self._restored[name] = self._snapshot.vars[name].restore()
+        return self._restored[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._snapshot.vars)
+
+    def __len__(self) -> int:
+        return len(self._snapshot.vars)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._snapshot.vars
+
+    @property
+    def restored_names(self) -> list[str]:
+        return list(self._restored)
+
+    def __repr__(self) -> str:
+        return f"LazyWorkspace({list(self._snapshot.vars)})"
+
+
+@dataclass
+class SnapshotDelta:
+    """两次快照之间的变化：新增或内容变化的变量、被删除的变量"""
+    changed: dict[str, VarSnapshot] = field(default_factory=dict)
+    deleted: frozenset[str] = frozenset()
+    skipped: dict[str, str] = field(default_factory=dict)
+    # take_delta 得到的变化还记录未变化的变量（diff_snapshots 不填）
+    unchanged: frozenset[str] = frozenset()
+
+    def names(self) -> set[str]:
+        return set(self.changed) | set(self.deleted)
+
+
+@dataclass
+class ChangeBase:
+    """
+    变化检测的基准：起始快照中每个变量的内容哈希，以及执行前的对象（按身份比较）。
+    进程模式的 worker 中只有 hashes，没有 snapshot，得到的变化回到主进程后再与 snapshot 合并。
+    """
+    hashes: dict[str, str]
+    objects: dict[str, Any] = field(default_factory=dict)
+    snapshot: Optional[WorkspaceSnapshot] = None
+    # 执行时使用的 globals 字典：只有对同一个字典取快照时才使用该基准
+    _globals: Optional[dict[str, Any]] = field(default=None, repr=False)
+
+    @classmethod
+    def of(cls, snapshot: WorkspaceSnapshot, _globals: Optional[dict[str, Any]] = None) -> "ChangeBase":
+        """_globals 为从 snapshot 恢复出的、即将用于执行的字典；需要在执行前调用，以记录执行前的对象"""
+        return cls(
+            hashes={name: var.blob_hash for name, var in snapshot.vars.items()},
+            objects=dict(_globals) if _globals is not None else {},
+            snapshot=snapshot,
+            _globals=_globals,
+        )
+
+    def tracks(self, _globals: Any) -> bool:
+        return self._globals is not None and _globals is self._globals
+
+    def compose(self, delta: SnapshotDelta) -> WorkspaceSnapshot:
+        """起始快照 + take_delta 的变化 = 执行后的完整快照"""
+        assert self.snapshot is not None
+        merged = {name: var for name, var in self.snapshot.vars.items() if name in delta.unchanged}
+        merged.update(delta.changed)
+        return WorkspaceSnapshot(vars=merged, skipped=dict(delta.skipped))
+
+
+# 当前执行的变化检测基准：由恢复工作区的一方（python_tool / batch_scheduler）设置，构建执行结果时读取
+current_base: contextvars.ContextVar[Optional[ChangeBase]] = contextvars.ContextVar("current_base", default=None)
+
+
+@contextlib.contextmanager
+def track_changes(snapshot: WorkspaceSnapshot, _globals: Optional[dict[str, Any]]) -> Iterator[ChangeBase]:
+    """在执行期间设置 current_base，_globals 为 snapshot.restore() 得到的字典（执行前调用）"""
+    base = ChangeBase.of(snapshot, _globals)
+    token = current_base.set(base)
+    try:
+        yield base
+    finally:
+        current_base.reset(token)
+
+
+def diff_snapshots(before: WorkspaceSnapshot, after: WorkspaceSnapshot) -> SnapshotDelta:
+    """按内容哈希比较两次快照，得到变量级的变化"""
+    changed = {
+        name: var
+        for name, var in after.vars.items()
+        if name not in before.vars or before.vars[name].blob_hash != var.blob_hash
+    }
+    return SnapshotDelta(
+        changed=changed,
+        deleted=frozenset(before.vars.keys() - after.vars.keys()),
+        skipped={name: reason for name, reason in after.skipped.items() if name not in before.skipped},
+    )
+
+
+def _dumps_with_oob_views(value: Any) -> tuple[bytes, list[memoryview]]:
+    """protocol 5 序列化，大缓冲区走带外；返回 (pickle 字节流, 带外缓冲区的内存视图)，视图引用原对象的内存，尚未拷贝"""
+    views: list[memoryview] = []
+
+    def buffer_callback(pickle_buffer: pickle.PickleBuffer) -> bool:
+        try:
+            raw = pickle_buffer.raw()
+        except BufferError:
+            # 非连续内存无法带外保存，返回 True 表示放回字节流中
+            return True
+        if raw.nbytes < OOB_BUFFER_THRESHOLD:
+            return True
+        views.append(raw)
+        return False
+
+    blob = pickle.dumps(value, protocol=5, buffer_callback=buffer_callback)
+    return blob, views
+
+
+def _dumps_with_oob_buffers(value: Any) -> tuple[bytes, list[bytes]]:
+    """protocol 5 序列化，大缓冲区走带外；返回 (pickle 字节流, 带外缓冲区列表)"""
+    blob, views = _dumps_with_oob_views(value)
+    # 拷贝一次，保证快照不随原对象后续的修改而变化
+    return blob, [bytes(view) for view in views]
+
+
+def _content_hash(blob: bytes, views: list[memoryview]) -> str:
+    """与 VarSnapshot.blob_hash 一致，但直接对原内存做哈希"""
+    hasher = hashlib.sha256(blob)
+    for view in views:
+        hasher.update(view)
+    return hasher.hexdigest()
+
+
+def _is_immutable(value: Any) -> bool:
+    if type(value) in _IMMUTABLE_TYPES:
+        return True
+    # 只看一层的小元组，元素也必须是原子类型
+    return type(value) is tuple and len(value) <= 64 and all(type(v) in _IMMUTABLE_TYPES for v in value)
+
+
+# 所有序列化相关异常
+_PICKLE_ERRORS = (pickle.PicklingError, TypeError, AttributeError, RecursionError, MemoryError)
+
+
+def _iter_candidates(original_globals: dict[str, Any], skipped: dict[str, str]) -> Iterator[tuple[str, Any]]:
+    """
+    过滤规则：
+    1. 排除键为 '__builtins__' 的项。
+    2. 排除值为模块类型的项（记入 skipped）。
+    """
+    for key, value in original_globals.items():
+        if key == '__builtins__':
+            continue
+        if isinstance(value, types.ModuleType):
+            skipped[key] = "module"
+            continue
+        yield key, value
+
+
+def take_snapshot(original_globals: dict[str, Any]) -> WorkspaceSnapshot:
+    """
+    过滤并序列化 globals 字典。
+    过滤规则：
+    1. 排除键为 '__builtins__' 的项。
+    2. 排除值为模块类型的项。
+    3. 排除不可 pickle 序列化的项。
+    """
+    snapshot = WorkspaceSnapshot()
+    for key, value in _iter_candidates(original_globals, snapshot.skipped):
+        start = time.perf_counter()
+        try:
+            # 字节直接保存，不再单独验证一次
+            blob, buffers = _dumps_with_oob_buffers(value)
+        except _PICKLE_ERRORS as e:
+            snapshot.skipped[key] = f"unpicklable: {type(e).__name__}"
+            continue
+        snapshot.vars[key] = VarSnapshot(
+            name=key,
+            blob=blob,
+            type_name=type(value).__name__,
+            cost_seconds=time.perf_counter() - start,
+            buffers=buffers,
+            buffer_sizes=[len(b) for b in buffers],
+        )
+    return snapshot
+
+
+def take_delta(original_globals: dict[str, Any], base: ChangeBase) -> SnapshotDelta:
+    """
+    与 take_snapshot 的过滤规则相同，但只为相对 base 新增或变化的变量生成 VarSnapshot；
+    deleted 为 base 中有、执行后不存在（或已无法序列化）的变量，skipped 为执行后全部被过滤的变量。
+    """
+    changed: dict[str, VarSnapshot] = {}
+    unchanged: set[str] = set()
+    skipped: dict[str, str] = {}
+    for key, value in _iter_candidates(original_globals, skipped):
+        base_hash = base.hashes.get(key)
+        if base_hash is not None and key in base.objects and value is base.objects[key] and _is_immutable(value):
+            unchanged.add(key)
+            continue
+        start = time.perf_counter()
+        try:
+            blob, views = _dumps_with_oob_views(value)
+        except _PICKLE_ERRORS as e:
+            skipped[key] = f"unpicklable: {type(e).__name__}"
+            continue
+        content_hash = _content_hash(blob, views)
+        if content_hash == base_hash:
+            unchanged.add(key)
+            continue
+        buffers = [bytes(view) for view in views]
+        var = VarSnapshot(
+            name=key,
+            blob=blob,
+            type_name=type(value).__name__,
+            cost_seconds=time.perf_counter() - start,
+            buffers=buffers,
+            buffer_sizes=[len(b) for b in buffers],
+        )
+        # 哈希已经算过，直接填入 cached_property
+        var.__dict__["blob_hash"] = content_hash
+        changed[key] = var
+    return SnapshotDelta(
+        changed=changed,
+        deleted=frozenset(base.hashes.keys() - unchanged - changed.keys()),
+        skipped=skipped,
+        unchanged=frozenset(unchanged),
+    )
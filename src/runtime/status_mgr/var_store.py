@@ -1,26 +1,117 @@
-import copy
+"""
+内容寻址的增量变量存储（位于 PY_RUNTIME_VAR_DIR 下）：
+    blobs/<hash[:2]>/<hash>.pkl       每个变量的 pickle 字节，按 sha256 内容寻址，相同内容只写一次
+    blobs/<hash[:2]>/<hash>.bufNNNN   该变量的 protocol 5 带外缓冲区（NumPy/pandas 数据），可直接 mmap
+    success_cnt_NNNN.json             每轮的清单（manifest），只记录 变量名 -> 哈希
+未变化的变量在后续轮次中只会在清单里多一行引用，不会重复写盘。
+"""
+import json
 import os
 import pickle
-from re import A
 from typing import Any, Dict, Optional, Union
+from src.runtime.status_mgr import var_snapshot
 from src.utils.log_decorator import global_logger, traceable
 from src.utils.path_util import dynamic_path
 
-def dump_globals(filter_out_globals, success_cnt) -> dict[str, Any]:
+MANIFEST_FORMAT = "var_manifest.v2"
+
+
+def _write_file_if_absent(path: str, data: bytes) -> bool:
+    """内容寻址文件已存在时直接跳过，返回是否发生了写入"""
+    if os.path.exists(path):
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 先写临时文件再原子替换，避免进程中断留下半截文件被当成完整内容
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+def _buffer_paths(blob_hash: str, buffer_count: int) -> list[str]:
+    return [
+        dynamic_path.RunVarBlobPath(blob_hash=blob_hash, buffer_index=i).path()
+        for i in range(buffer_count)
+    ]
+
+
+def _write_var_if_absent(var: var_snapshot.VarSnapshot) -> int:
+    """写入单个变量（字节流 + 带外缓冲区），返回实际写盘的字节数"""
+    if var.stored:
+        # 未变化的变量直接复用上一轮的 VarSnapshot，已经在存储中
+        return 0
+    bytes_written = 0
+    buffer_paths = _buffer_paths(var.blob_hash, len(var.buffer_sizes))
+    if not var.buffer_paths:
+        for path, buffer in zip(buffer_paths, var.buffers):
+            if _write_file_if_absent(path, buffer):
+                bytes_written += len(buffer)
+        # 缓冲区已落盘，内存中的快照改为 mmap 映射文件
+        var.attach_buffer_files(buffer_paths)
+    if _write_file_if_absent(dynamic_path.RunVarBlobPath(blob_hash=var.blob_hash).path(), var.blob):
+        bytes_written += len(var.blob)
+    var.stored = True
+    return bytes_written
+
+
+def dump_globals(out_snapshot: var_snapshot.WorkspaceSnapshot, success_cnt) -> dict[str, int]:
+    """只写入新出现的变量内容，再写本轮的清单；返回写盘统计"""
+    stats = {"vars": len(out_snapshot.vars), "written": 0, "reused": 0, "bytes_written": 0}
+    manifest_vars: dict[str, dict[str, Any]] = {}
+    for name, var in out_snapshot.vars.items():
+        bytes_written = _write_var_if_absent(var)
+        if bytes_written:
+            stats["written"] += 1
+            stats["bytes_written"] += bytes_written
+        else:
+            stats["reused"] += 1
+        manifest_vars[name] = {
+            "hash": var.blob_hash,
+            "type": var.type_name,
+            "bytes": var.nbytes,
+            "buffer_sizes": var.buffer_sizes,
+        }
+
     path = dynamic_path.RunVarPath(success_cnt=success_cnt).path()
-    with open(path, 'wb') as f:
-        pickle.dump(filter_out_globals, f, protocol=pickle.HIGHEST_PROTOCOL)
+    manifest = {"format": MANIFEST_FORMAT, "success_cnt": success_cnt, "vars": manifest_vars}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+    global_logger.info(f"变量存储 success_cnt={success_cnt}：{stats}")
+    return stats
+
+
+def load_snapshot(path: str) -> var_snapshot.WorkspaceSnapshot:
+    """
+    根据清单从内容寻址存储中重建某一轮的快照：
+    只读取 pickle 字节流，带外缓冲区只记录文件路径，恢复变量时才以写时复制方式 mmap。
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    snapshot = var_snapshot.WorkspaceSnapshot()
+    for name, meta in manifest["vars"].items():
+        with open(dynamic_path.RunVarBlobPath(blob_hash=meta["hash"]).path(), 'rb') as f:
+            blob = f.read()
+        buffer_sizes = meta.get("buffer_sizes", [])
+        var = var_snapshot.VarSnapshot(
+            name=name,
+            blob=blob,
+            type_name=meta["type"],
+            cost_seconds=0.0,
+            buffer_paths=_buffer_paths(meta["hash"], len(buffer_sizes)),
+            buffer_sizes=buffer_sizes,
+            stored=True,
+        )
+        # 哈希已记录在清单中，无需重新计算
+        var.__dict__["blob_hash"] = meta["hash"]
+        snapshot.vars[name] = var
+    return snapshot
+
 
 def load_globals(path: str) -> dict[str, Any]:
-    # # 获取所有的.pkl文件，按照文件名中的数字排序，加载最新的一个.pkl文件
-    # pkl_files = [f 
-    #              for f in os.listdir(globals_var_success_dir) 
-    #              if f.endswith('.pkl')]
-    # pkl_files.sort()
-    # if not pkl_files:
-    #     global_logger.warning(f"没有找到任何.pkl文件，无法加载globals变量。请确保至少有一个成功的globals变量被保存。")
-    #     return {}
-    # latest_file = pkl_files[-1]
-    # path = os.path.join(globals_var_success_dir, latest_file)
-    with open(path, 'rb') as f:
-        return pickle.load(f)
+    """根据任意一轮的清单重建该轮的工作区变量"""
+    # 兼容旧格式：直接 pickle 的 globals 字典
+    if path.endswith('.pkl'):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    return load_snapshot(path).restore()
@@ -2,14 +2,22 @@
 This module handles the workspace functionality for the runtime environment.
 
 """
-import copy
-from re import A
+import threading
 from typing import Any, Dict, Optional, Union
 
+from src.runtime.status_mgr import var_history
+from src.runtime.status_mgr import var_snapshot
 from src.runtime.status_mgr import var_store
+from src.utils import persist_writer
+from src.utils.log_decorator import global_logger
+from src.utils.path_util import dynamic_path
 
-arg_globals_list: list[dict] = []
-out_globals_list: list[dict] = []
+# 每次调用起始的工作区：记录起始的 success_cnt（0 表示全新的空工作区），不再为每次调用保存一份副本
+arg_globals_list: list[int] = []
+# 每次成功执行后的工作区快照：有内存预算，超出后淘汰到磁盘，需要时按清单重新加载
+out_globals_list: var_history.SnapshotHistory = var_history.SnapshotHistory()
+# 工具调用可能在不同线程中并发结束：分配 success_cnt、落盘、追加历史需要原子完成
+_append_lock = threading.Lock()
 
 
 def __create_workspace() -> dict[str, Any]:
@@ -42,62 +50,69 @@ def filter_and_deepcopy_globals(original_globals: dict[str, Any]) -> dict[str, A
     过滤规则：
     1. 排除键为 '__builtins__' 的项。
     2. 排除值为模块类型的项。
+    3. 排除不可 pickle 序列化的项。
+    每个变量只序列化一次，再反序列化得到独立副本（等价于深拷贝）。
     """
-    def _is_serializable(value) -> bool:
-        """
-        判断单个对象是否可被 pickle 序列化
-        :param value: 任意待判断的 Python 对象
-        :return: 可序列化返回 True，不可序列化返回 False
-        """
-        import pickle
-        try:
-            # 使用最高协议版本序列化（兼容性最好），仅验证不保存
-            pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
-            return True
-        except (
-            # 捕获所有序列化相关异常
-            pickle.PicklingError,
-            TypeError,
-            AttributeError,
-            RecursionError,
-            MemoryError
-        ):
-            return False    
-    filtered_dict = {}
-    for key, value in original_globals.items():
-        # 检查键是否为 '__builtins__'
-        if key == '__builtins__':
-            continue
-        # 检查值是否为模块类型
-        import sys
-        if isinstance(value, type(sys)):  # 使用 sys 模块的类型来判断其他模块
-            continue
-        if _is_serializable(value) is False:
-            continue
-        # 对符合条件的值进行深拷贝并添加到新字典
-        filtered_dict[key] = copy.deepcopy(value)
-    return filtered_dict
+    return var_snapshot.take_snapshot(original_globals).restore()
 
 
-def get_arg_globals() -> dict[str, Any]:
+def get_arg_snapshot(success_cnt: int) -> var_snapshot.WorkspaceSnapshot:
+    """获取第 success_cnt 次成功执行后的快照，0 表示全新的空工作区"""
+    if success_cnt == 0:
+        return var_snapshot.take_snapshot(initialize_workspace())
+    return out_globals_list.get(success_cnt - 1)
+
+
+def get_arg_globals_snapshot() -> var_snapshot.WorkspaceSnapshot:
+    """本次调用的起始工作区快照（同一轮并行调度的多个代码片段共用同一个起点）"""
     global arg_globals_list
     global out_globals_list
     if not arg_globals_list or not out_globals_list:
-        arg_globals = initialize_workspace()
-        filter_arg_globals = filter_and_deepcopy_globals(arg_globals)
-        arg_globals_list.append(filter_arg_globals)
+        success_cnt = 0
     else:
-        arg_globals = out_globals_list[-1]
-        filter_arg_globals = filter_and_deepcopy_globals(arg_globals)
-        arg_globals_list.append(filter_arg_globals)
-    return filter_arg_globals
+        # 从最近一次成功执行的快照开始，快照只保存字节，无需再次序列化
+        success_cnt = len(out_globals_list)
+    arg_globals_list.append(success_cnt)
+    return get_arg_snapshot(success_cnt)
 
 
-def append_out_globals(out_globals: dict[str, Any]):
+def get_arg_globals() -> dict[str, Any]:
+    return get_arg_globals_snapshot().restore()
+
+
+def history_metrics() -> dict[str, Any]:
+    """快照历史占用的内存、淘汰和重新加载次数"""
+    return out_globals_list.metrics()
+
+
+def append_out_globals(out_globals: Union[dict[str, Any], var_snapshot.WorkspaceSnapshot]):
     global out_globals_list
-    filter_out_globals = filter_and_deepcopy_globals(out_globals)
-    var_store.dump_globals(filter_out_globals, len(out_globals_list)+1)
-    out_globals_list.append(filter_out_globals)
+    if isinstance(out_globals, var_snapshot.WorkspaceSnapshot):
+        out_snapshot = out_globals
+    else:
+        out_snapshot = var_snapshot.take_snapshot(out_globals)
+    global_logger.info(
+        f"工作区快照：{len(out_snapshot.vars)} 个变量，{out_snapshot.total_bytes} 字节，"
+        f"耗时 {out_snapshot.total_cost_seconds * 1000:.3f} ms，"
+        f"跳过 {out_snapshot.skipped}，"
+        f"开销最大的变量：{out_snapshot.cost_report(top_n=5)}"
+    )
+    with _append_lock:
+        success_cnt = len(out_globals_list)+1
+        # 先加入历史（未落盘，不会被淘汰），落盘交给后台线程，完成后才允许淘汰
+        index = out_globals_list.append(out_snapshot)
+        persist_writer.submit(_dump_out_globals, out_globals_list, out_snapshot, success_cnt, index)
+    global_logger.info(f"快照历史：{history_metrics()}")
+
+
+def _dump_out_globals(
+    history: var_history.SnapshotHistory,
+    out_snapshot: var_snapshot.WorkspaceSnapshot,
+    success_cnt: int,
+    index: int,
+) -> None:
+    var_store.dump_globals(out_snapshot, success_cnt)
+    history.mark_stored(index, dynamic_path.RunVarPath(success_cnt=success_cnt).path())
 
 
 if __name__ == '__main__':
@@ -108,7 +123,8 @@ if __name__ == '__main__':
     workspace ['my_df'] = df
     print('# create workspace:\n',workspace)
     append_out_globals(workspace)
-    load_globals = var_store.load_globals()
+    persist_writer.flush()
+    load_globals = var_store.load_globals(dynamic_path.RunVarPath(success_cnt=1).path())
     print('# load_globals:\n',load_globals)
     print('# get_workspace_globals_dict(include_special_vars=False):\n',get_workspace_globals_dict(workspace, include_special_vars=False))
     print('# get_workspace_globals_keys(include_special_vars=False):\n',get_workspace_globals_keys(workspace, include_special_vars=False))
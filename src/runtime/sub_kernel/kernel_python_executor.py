@@ -0,0 +1,359 @@
+"""
+Jupyter 内核执行引擎：每个 agent 一个常驻的本地 IPython 内核，状态（模块、打开的句柄、不可序列化的求解器对象）留在内核中，
+不再在每次调用之间 pickle 整个工作区。
+
+- 输出：iopub 的 stream / execute_result / display_data 实时写入 StdoutStream；
+- 超时或取消：先 interrupt 内核（状态保留），内核无响应时再重启（状态丢失）；
+- 崩溃：内核进程退出时返回 ExecutionCrashed，下一次调用自动启动新内核；
+- 快照：只在需要时调用 snapshot_kernel()，ExecutionSuccess 中的 arg_chg_globals 为空；
+  python_tool 在一轮工具调用结束后（有执行成功时）生成一次快照，写入工作区历史和变量存储。
+"""
+import asyncio
+import atexit
+import contextvars
+import os
+import pickle
+import queue
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from jupyter_client.manager import KernelManager
+
+from src.runtime.ctx_mgr import stdout_stream
+from src.runtime.status_mgr import var_snapshot
+from src.runtime.sub_thread.subthread_schemas import (
+    ExecutionSuccess,
+    ExecutionFailure,
+    ExecutionTimeout,
+    ExecutionCrashed,
+    ExecutionResult,
+)
+from src.utils.log_decorator import global_logger, traceable
+from src.utils.path_util import static_path
+
+
+# 当前调用使用哪个内核：run_agent_generator 把 agent_name_id 绑定到工具调用的上下文中
+current_kernel_key: contextvars.ContextVar[str] = contextvars.ContextVar("algo_agent_kernel_key", default="default")
+
+KERNEL_STARTUP_TIMEOUT = float(os.getenv("ALGO_AGENT_KERNEL_STARTUP_TIMEOUT", "60"))
+# interrupt 之后等待内核回到 idle 的时间，超过则重启内核
+KERNEL_INTERRUPT_GRACE = float(os.getenv("ALGO_AGENT_KERNEL_INTERRUPT_GRACE", "5"))
+# 等待 iopub 消息的最长分段（秒），用于及时响应取消
+_POLL_INTERVAL = 0.1
+
+_ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+# IPython 自带的交互变量，不属于用户工作区
+_IPYTHON_NAMES = ("In", "Out", "exit", "quit", "get_ipython")
+
+
+def _strip_ansi(text: str) -> str:
+    return _ANSI_ESCAPE.sub("", text)
+
+
+class _AgentKernel:
+    """一个 agent 的常驻内核，同一时间只执行一段代码"""
+    def __init__(self, key: str, work_dir: str):
+        self.key = key
+        self.work_dir = work_dir
+        self.lock = threading.Lock()
+        env = os.environ.copy()
+        # 内核中需要导入 src.runtime.status_mgr.var_snapshot 来生成快照
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [static_path.PROJ.as_posix(), env.get("PYTHONPATH")]))
+        env.setdefault("MPLBACKEND", "Agg")
+        self.manager = KernelManager()
+        self.manager.start_kernel(cwd=work_dir, env=env)
+        self.client = self.manager.client()
+        self.client.start_channels()
+        self.client.wait_for_ready(timeout=KERNEL_STARTUP_TIMEOUT)
+        # 关闭输出缓存：显示过的结果不保存在 Out / _ / __ / ___ 中，不会在整个会话中一直被引用
+        self.run_silent("get_ipython().displayhook.cache_size = 0", timeout=KERNEL_STARTUP_TIMEOUT)
+        global_logger.info(f"内核 {key} 已启动，工作目录：{work_dir}")
+
+    def is_alive(self) -> bool:
+        return self.manager.is_alive()
+
+    def exit_code(self) -> Optional[int]:
+        process = getattr(self.manager.provisioner, "process", None)
+        return process.poll() if process is not None else None
+
+    def shutdown(self) -> None:
+        try:
+            self.client.stop_channels()
+            self.manager.shutdown_kernel(now=True)
+        except Exception as e:
+            global_logger.warning(f"关闭内核 {self.key} 失败：{e!r}")
+
+    def run_silent(self, code: str, timeout: float) -> Optional[dict[str, Any]]:
+        """执行内部代码（不进入历史、不产生输出），返回错误内容，成功时返回 None"""
+        reply = self.client.execute_interactive(code, silent=True, store_history=False, timeout=timeout)
+        content = reply["content"]
+        return content if content.get("status") == "error" else None
+
+    def wait_idle(self, msg_id: str, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                msg = self.client.get_iopub_msg(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if (
+                msg["parent_header"].get("msg_id") == msg_id
+                and msg["msg_type"] == "status"
+                and msg["content"]["execution_state"] == "idle"
+            ):
+                return True
+        return False
+
+
+class KernelPool:
+    """agent -> 常驻内核"""
+    def __init__(self):
+        self._kernels: dict[str, _AgentKernel] = {}
+        # 保护 _kernels 和 _key_locks，只做查表，不在持有时启动内核
+        self._lock = threading.Lock()
+        # 每个 agent 一把锁：启动 / 初始化内核（最长 KERNEL_STARTUP_TIMEOUT）只阻塞同一个 agent
+        self._key_locks: dict[str, threading.Lock] = {}
+
+    def _alive(self, key: str) -> Optional[_AgentKernel]:
+        with self._lock:
+            kernel = self._kernels.get(key)
+        return kernel if kernel is not None and kernel.is_alive() else None
+
+    def find(self, key: str) -> Optional[_AgentKernel]:
+        """已启动的内核（不启动新内核），没有时返回 None"""
+        with self._lock:
+            return self._kernels.get(key)
+
+    def get(self, key: str, work_dir: str, _globals: dict[str, Any] | None) -> _AgentKernel:
+        kernel = self._alive(key)
+        if kernel is not None:
+            return kernel
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # 等待期间可能已由同一 agent 的另一个调用启动
+            kernel = self._alive(key)
+            if kernel is not None:
+                return kernel
+            with self._lock:
+                dead = self._kernels.pop(key, None)
+            if dead is not None:
+                global_logger.warning(f"内核 {key} 已退出，重新启动")
+                dead.shutdown()
+            kernel = _AgentKernel(key, work_dir)
+            if _globals:
+                _seed_kernel(kernel, _globals)
+            with self._lock:
+                self._kernels[key] = kernel
+            return kernel
+
+    def restart(self, key: str) -> None:
+        with self._lock:
+            kernel = self._kernels.pop(key, None)
+        if kernel is not None:
+            kernel.shutdown()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            kernels, self._kernels = list(self._kernels.values()), {}
+        for kernel in kernels:
+            kernel.shutdown()
+
+
+def _transfer_path() -> str:
+    path = static_path.Dir.PY_RUNTIME_VAR_DIR / "kernel" / f"{uuid.uuid4().hex}.pkl"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path.absolute().as_posix()
+
+
+def _seed_kernel(kernel: _AgentKernel, _globals: dict[str, Any]) -> None:
+    """新内核：用传入的 globals 初始化工作区（只在内核启动时执行一次）"""
+    path = _transfer_path()
+    with open(path, "wb") as f:
+        pickle.dump(var_snapshot.take_snapshot(_globals), f, protocol=pickle.HIGHEST_PROTOCOL)
+    try:
+        error = kernel.run_silent(
+            f"import pickle as __p\nwith open({path!r}, 'rb') as __f:\n    globals().update(__p.load(__f).restore())\ndel __p, __f",
+            timeout=KERNEL_STARTUP_TIMEOUT,
+        )
+        if error:
+            global_logger.warning(f"内核 {kernel.key} 初始化工作区失败：{error.get('ename')}: {error.get('evalue')}")
+    finally:
+        os.remove(path)
+
+
+_default_pool: Optional[KernelPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool() -> KernelPool:
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = KernelPool()
+            atexit.register(_default_pool.shutdown)
+        return _default_pool
+
+
+def snapshot_kernel(kernel_key: Optional[str] = None, timeout: float = 600) -> var_snapshot.WorkspaceSnapshot:
+    """按需生成内核工作区的快照（与其他引擎的 globals_snapshot 格式一致），内核未启动时返回空快照"""
+    key = kernel_key or current_kernel_key.get()
+    kernel = get_default_pool().find(key)
+    if kernel is None:
+        return var_snapshot.WorkspaceSnapshot()
+    path = _transfer_path()
+    code = (
+        "import pickle as __p\n"
+        "from src.runtime.status_mgr import var_snapshot as __vs\n"
+        f"with open({path!r}, 'wb') as __f:\n"
+        f"    __p.dump(__vs.take_snapshot({{__k: __v for __k, __v in globals().items() "
+        f"if not __k.startswith('_') and __k not in {_IPYTHON_NAMES!r}}}), __f)\n"
+        "del __p, __vs, __f"
+    )
+    with kernel.lock:
+        error = kernel.run_silent(code, timeout=timeout)
+    try:
+        if error:
+            raise RuntimeError(f"内核 {key} 生成快照失败：{error.get('ename')}: {error.get('evalue')}")
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _execute(
+    kernel: _AgentKernel,
+    command: str,
+    timeout: Optional[float],
+    stdout_buffer: stdout_stream.StdoutStream,
+    cancel_event: Optional[threading.Event],
+) -> ExecutionResult:
+    start = time.monotonic()
+    deadline = start + timeout if timeout else None
+    # store_history=False：不进入 IPython 的历史（In / Out / _N）
+    msg_id = kernel.client.execute(command, store_history=False, allow_stdin=False)
+    error: Optional[dict[str, Any]] = None
+
+    while True:
+        remaining = _POLL_INTERVAL if deadline is None else min(_POLL_INTERVAL, max(0.0, deadline - time.monotonic()))
+        try:
+            msg = kernel.client.get_iopub_msg(timeout=remaining)
+        except queue.Empty:
+            cancelled = cancel_event is not None and cancel_event.is_set()
+            if not kernel.is_alive():
+                exit_code = kernel.exit_code()
+                global_logger.info(f"---------- 2.2 内核崩溃 (Crashed)，退出码：{exit_code}")
+                get_default_pool().restart(kernel.key)
+                return ExecutionCrashed(
+                    arg_command=command,
+                    arg_timeout=timeout,
+                    exec_timeout=time.monotonic() - start,
+                    ret_stdout=stdout_buffer.getvalue(),
+                    exit_code=exit_code,
+                )
+            if cancelled or (deadline is not None and time.monotonic() >= deadline):
+                reason = "取消" if cancelled else "超时"
+                global_logger.info(f"---------- 1. {reason}情况：interrupt 内核 {kernel.key}")
+                kernel.manager.interrupt_kernel()
+                if not kernel.wait_idle(msg_id, KERNEL_INTERRUPT_GRACE):
+                    global_logger.warning(f"内核 {kernel.key} interrupt 后无响应，重启内核（工作区状态丢失）")
+                    get_default_pool().restart(kernel.key)
+                return ExecutionTimeout(
+                    arg_command=command,
+                    arg_timeout=timeout,
+                    exec_timeout=time.monotonic() - start,
+                    ret_stdout=stdout_buffer.getvalue(),
+                )
+            continue
+
+        if msg["parent_header"].get("msg_id") != msg_id:
+            continue
+        msg_type, content = msg["msg_type"], msg["content"]
+        if msg_type == "stream":
+            stdout_buffer.write(content["text"])
+        elif msg_type in ("execute_result", "display_data"):
+            # 与 Notebook 单元格一致：最后一个表达式的值也作为输出
+            text = content.get("data", {}).get("text/plain")
+            if text:
+                stdout_buffer.write(text + "\n")
+        elif msg_type == "error":
+            error = content
+        elif msg_type == "status" and content["execution_state"] == "idle":
+            break
+
+    exec_time = time.monotonic() - start
+    if error is None:
+        global_logger.info("---------- 2.1.1 内核正常结束：构建 Success Result")
+        return ExecutionSuccess(
+            arg_command=command,
+            arg_timeout=timeout,
+            # 状态留在内核中，按需调用 snapshot_kernel() 生成快照
+            arg_chg_globals=var_snapshot.WorkspaceSnapshot(),
+            exec_timeout=exec_time,
+            ret_stdout=stdout_buffer.getvalue(),
+        )
+    global_logger.info("---------- 2.1.2 内核异常结束：构建 Failure Result")
+    ename, evalue = error.get("ename", ""), error.get("evalue", "")
+    return ExecutionFailure(
+        arg_command=command,
+        arg_timeout=timeout,
+        exec_timeout=exec_time,
+        ret_stdout=stdout_buffer.getvalue(),
+        exception_repr=f"{ename}({evalue!r})",
+        exception_type=ename,
+        exception_value=evalue,
+        exception_traceback=_strip_ansi("\n".join(error.get("traceback", []))),
+    )
+
+
+def _run(
+    command: str,
+    _globals: dict[str, Any] | None,
+    timeout: Optional[float],
+    stdout_buffer: Optional[stdout_stream.StdoutStream],
+    work_dir: Optional[str],
+    cancel_event: Optional[threading.Event],
+) -> ExecutionResult:
+    target_dir_fullpath = work_dir or static_path.Dir.PY_OUTPUT_DIR.resolve().as_posix()
+    stdout_buffer = stdout_buffer if stdout_buffer is not None else stdout_stream.StdoutStream()
+    kernel = get_default_pool().get(current_kernel_key.get(), target_dir_fullpath, _globals)
+    with kernel.lock:
+        return _execute(kernel, command, timeout, stdout_buffer, cancel_event)
+
+
+@traceable
+def run_structured_in_kernel(
+    command: str,
+    _globals: dict[str, Any] | None = None,
+    _locals: Optional[Dict] = None,
+    timeout: Optional[float] = None,
+    stdout_buffer: Optional[stdout_stream.StdoutStream] = None,
+    work_dir: Optional[str] = None,
+) -> ExecutionResult:
+    """
+    与 run_structured_in_thread 参数和返回值一致，代码在当前 agent 的常驻内核中执行。
+    _globals 只在内核首次启动时用于初始化工作区，之后状态由内核保存。
+    """
+    return _run(command, _globals, timeout, stdout_buffer, work_dir, None)
+
+
+@traceable
+async def run_structured_in_kernel_async(
+    command: str,
+    _globals: dict[str, Any] | None = None,
+    _locals: Optional[Dict] = None,
+    timeout: Optional[float] = None,
+    stdout_buffer: Optional[stdout_stream.StdoutStream] = None,
+    work_dir: Optional[str] = None,
+) -> ExecutionResult:
+    """run_structured_in_kernel 的异步版本：被取消时 interrupt 内核"""
+    cancel_event = threading.Event()
+    try:
+        return await asyncio.to_thread(_run, command, _globals, timeout, stdout_buffer, work_dir, cancel_event)
+    except asyncio.CancelledError:
+        cancel_event.set()
+        raise
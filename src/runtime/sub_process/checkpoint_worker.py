@@ -0,0 +1,118 @@
+"""
+fork checkpoint 模式的 holder 端：常驻进程把工作区（globals）留在内存中，每次执行前 fork 一个子进程：
+- holder 自己保持执行前的工作区不变；fork 是写时复制，不拷贝、不序列化任何变量；
+- 子进程在自己的副本中执行代码，输出和结果通过主进程新建的执行管道直接回传；
+- 主进程决定子进程的去留：成功则 commit，子进程成为新的 holder（原 holder 保留为回滚点）；
+  失败、超时则丢弃子进程，原 holder 就是回滚后的状态（O(1) 回滚）。
+
+holder 不启动任何线程（fork 多线程进程不安全），已结束的子进程在每次收到消息前用 WNOHANG 回收。
+
+注意：同 subprocess_worker，只能依赖标准库；依赖 os.fork 和 SCM_RIGHTS 传递文件描述符，只支持 Linux / macOS。
+
+消息协议（均为 tuple）：
+    主进程 -> holder（控制管道）: ("exec", command, work_dir, limits_dict)，随后用 send_handle 传入执行管道
+                                 ("seed", globals_bytes)
+                                 ("snapshot",)
+                                 ("reap", child_pid)
+                                 ("stop",)
+    holder -> 主进程（控制管道）: ("ready", import_metrics_dict)
+                                 ("forked", child_pid)
+                                 ("snapshot", WorkspaceSnapshot)
+                                 ("child_exit", child_pid, exit_code)
+    子进程 -> 主进程（执行管道）: ("stdout", text) / ("result", payload_dict)
+    主进程 -> 子进程（执行管道）: ("commit",) / ("discard",)
+"""
+import os
+import pickle
+import threading
+from multiprocessing import reduction
+from multiprocessing.connection import Connection
+from typing import Any, Optional
+
+from src.runtime.ctx_mgr import resource_usage
+from src.runtime.status_mgr import var_snapshot
+from src.runtime.sub_process import subprocess_worker
+
+
+def _reap_finished(exit_codes: dict[int, int]) -> None:
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        exit_codes[pid] = os.waitstatus_to_exitcode(status)
+
+
+def _reap(pid: int, exit_codes: dict[int, int]) -> Optional[int]:
+    if pid not in exit_codes:
+        try:
+            _, status = os.waitpid(pid, 0)
+            exit_codes[pid] = os.waitstatus_to_exitcode(status)
+        except ChildProcessError:
+            return None
+    return exit_codes.pop(pid)
+
+
+def _child_main(exec_conn: Connection, command: str, work_dir: Optional[str], limits_dict: Optional[dict], _globals: dict[str, Any]) -> None:
+    """fork 出的子进程：执行、回传结果，等待主进程决定 commit（成为新的 holder）或 discard（退出）"""
+    code = 0
+    try:
+        send_lock = threading.Lock()
+        limits = resource_usage.ResourceLimits(**(limits_dict or {}))
+        payload = subprocess_worker.exec_in_globals(
+            exec_conn, send_lock, command, _globals, work_dir, limits, with_snapshot=False,
+        )
+        with send_lock:
+            exec_conn.send(("result", payload))
+        decision = exec_conn.recv()
+        if decision[0] == "commit":
+            _holder_loop(exec_conn, _globals)
+    except (EOFError, OSError):
+        pass
+    except BaseException:
+        code = 1
+    finally:
+        # 绝不返回到父 holder 的循环中
+        os._exit(code)
+
+
+def _holder_loop(ctrl: Connection, _globals: dict[str, Any]) -> None:
+    exit_codes: dict[int, int] = {}
+    while True:
+        _reap_finished(exit_codes)
+        try:
+            message = ctrl.recv()
+        except (EOFError, OSError):
+            return
+        kind = message[0]
+        if kind == "stop":
+            return
+        if kind == "seed":
+            _globals.update(pickle.loads(message[1]))
+        elif kind == "snapshot":
+            ctrl.send(("snapshot", var_snapshot.take_snapshot(_globals)))
+        elif kind == "reap":
+            ctrl.send(("child_exit", message[1], _reap(message[1], exit_codes)))
+        elif kind == "exec":
+            _, command, work_dir, limits_dict = message
+            exec_conn = Connection(reduction.recv_handle(ctrl))
+            pid = os.fork()
+            if pid == 0:
+                # 子进程只使用执行管道，holder 的控制管道留给 holder
+                ctrl.close()
+                _child_main(exec_conn, command, work_dir, limits_dict, _globals)
+            exec_conn.close()
+            ctrl.send(("forked", pid))
+
+
+def checkpoint_main(ctrl: Connection, warm_modules: Optional[list[tuple[str, Optional[str]]]] = None) -> None:
+    """根 holder 进程入口：预热模块、发送 ready，然后进入 holder 循环"""
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    preloaded, import_metrics = subprocess_worker._preload_modules(warm_modules or [])
+    _globals: dict[str, Any] = {"__name__": "__main__"}
+    # 状态常驻，别名只需注入一次
+    _globals.update(preloaded)
+    ctrl.send(("ready", import_metrics))
+    _holder_loop(ctrl, _globals)
@@ -0,0 +1,350 @@
+"""
+fork checkpoint 执行引擎：每个 agent 一条 checkpoint 链，工作区常驻在 holder 进程的内存中（见 checkpoint_worker）。
+
+- 每次执行 fork 一个子进程，执行前的工作区由 holder 原样保留，不再 pickle / 深拷贝整个工作区；
+- 成功：子进程 commit 成为新的 holder，旧 holder 作为检查点保留（最多 ALGO_AGENT_CHECKPOINT_DEPTH 个）；
+- 失败 / 超时 / 取消 / 超出资源限制：丢弃子进程，工作区自动回滚到执行前，与工作区大小无关；
+- 之前的 holder 作为检查点保留：当前 holder 意外退出时退回上一个检查点；
+- 快照只在需要时调用 snapshot_checkpoint() 生成：python_tool 在一轮工具调用结束后（有执行成功时）生成一次，
+  写入工作区历史和变量存储（见 engine_router.snapshot_resident）。
+
+只支持提供 os.fork 的平台（Linux / macOS）。
+"""
+import asyncio
+import atexit
+import os
+import pickle
+import signal
+import threading
+import time
+from multiprocessing import reduction
+from multiprocessing.connection import Connection
+from typing import Any, Dict, Optional
+
+from src.runtime.ctx_mgr import resource_usage
+from src.runtime.ctx_mgr import stdout_stream
+from src.runtime.status_mgr import var_snapshot
+from src.runtime.sub_kernel.kernel_python_executor import current_kernel_key
+from src.runtime.sub_process import checkpoint_worker
+from src.runtime.sub_process import subprocess_worker
+from src.runtime.sub_process.subprocess_python_executor import _CANCEL_POLL_INTERVAL, _get_mp_context
+from src.runtime.sub_thread.subthread_schemas import (
+    ExecutionSuccess,
+    ExecutionFailure,
+    ExecutionTimeout,
+    ExecutionCrashed,
+    ExecutionLimitExceeded,
+    ExecutionResult,
+)
+from src.utils.log_decorator import global_logger, traceable
+from src.utils.path_util import static_path
+
+
+# 每个 agent 保留的 holder 数量（当前工作区 + holder 意外退出时退回的检查点）
+CHECKPOINT_DEPTH = int(os.getenv("ALGO_AGENT_CHECKPOINT_DEPTH", "3"))
+
+
+def is_supported() -> bool:
+    return hasattr(os, "fork") and reduction.HAVE_SEND_HANDLE
+
+
+class _Holder:
+    """一个 holder 进程：根 holder 由 multiprocessing 启动，之后的 holder 都是 commit 的子进程"""
+    def __init__(self, ctrl: Connection, pid: int, process=None):
+        self.ctrl = ctrl
+        self.pid = pid
+        self.process = process
+
+    def reap(self, child_pid: int) -> Optional[int]:
+        """等待并回收子进程，返回退出码（信号导致的退出码为负数）"""
+        self.ctrl.send(("reap", child_pid))
+        _, _, exit_code = self.ctrl.recv()
+        return exit_code
+
+    def stop(self) -> None:
+        try:
+            self.ctrl.send(("stop",))
+        except (BrokenPipeError, OSError):
+            pass
+        if self.process is not None:
+            self.process.join(timeout=1)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        self.ctrl.close()
+
+
+class CheckpointSession:
+    """一个 agent 的 checkpoint 链：holders[-1] 是当前工作区，之前的是检查点；同一时间只执行一段代码"""
+    def __init__(
+        self,
+        key: str,
+        warm_modules: Optional[str] = None,
+        limits: Optional[resource_usage.ResourceLimits] = None,
+        depth: int = CHECKPOINT_DEPTH,
+    ):
+        if not is_supported():
+            raise RuntimeError("fork checkpoint 执行引擎需要 os.fork（Linux / macOS）")
+        self.key = key
+        self.depth = max(1, depth)
+        self.limits = limits if limits is not None else resource_usage.ResourceLimits.from_env()
+        self.lock = threading.Lock()
+        self.warm_modules = subprocess_worker.parse_warm_modules(warm_modules)
+        self._ctx = _get_mp_context(self.warm_modules)
+        self.holders: list[_Holder] = []
+        self._start_root()
+
+    def _start_root(self) -> None:
+        conn, child_conn = self._ctx.Pipe(duplex=True)
+        process = self._ctx.Process(target=checkpoint_worker.checkpoint_main, args=(child_conn, self.warm_modules), daemon=True)
+        process.start()
+        child_conn.close()
+        _, self.import_metrics = conn.recv()
+        self.holders = [_Holder(conn, process.pid, process)]
+        self._seeded = False
+        global_logger.info(f"checkpoint 链 {self.key} 已启动，根 holder：{process.pid}")
+
+    def _drop_dead_holder(self) -> None:
+        """当前 holder 意外退出：退回上一个检查点，没有检查点时重新启动（工作区丢失）"""
+        dead = self.holders.pop()
+        global_logger.warning(f"checkpoint 链 {self.key} 的 holder {dead.pid} 已退出，退回上一个检查点")
+        dead.stop()
+        if not self.holders:
+            self._start_root()
+
+    def _commit(self, holder: _Holder) -> None:
+        self.holders.append(holder)
+        while len(self.holders) > self.depth:
+            self.holders.pop(0).stop()
+
+    def run(
+        self,
+        command: str,
+        _globals: dict[str, Any] | None = None,
+        timeout: Optional[float] = None,
+        work_dir: Optional[str] = None,
+        stdout_buffer: Optional[stdout_stream.StdoutStream] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> ExecutionResult:
+        stdout_buffer = stdout_buffer if stdout_buffer is not None else stdout_stream.StdoutStream()
+        with self.lock:
+            holder = self.holders[-1]
+            main_end, child_end = self._ctx.Pipe(duplex=True)
+            start = time.monotonic()
+            try:
+                if _globals and not self._seeded:
+                    # 新的 checkpoint 链：用传入的 globals 初始化工作区（只执行一次）
+                    holder.ctrl.send(("seed", pickle.dumps(_globals, protocol=pickle.HIGHEST_PROTOCOL)))
+                self._seeded = True
+                holder.ctrl.send(("exec", command, work_dir, self.limits.to_dict()))
+                reduction.send_handle(holder.ctrl, child_end.fileno(), holder.pid)
+                _, child_pid = holder.ctrl.recv()
+            except (EOFError, OSError):
+                main_end.close()
+                self._drop_dead_holder()
+                return ExecutionCrashed(
+                    arg_command=command,
+                    arg_timeout=timeout,
+                    exec_timeout=time.monotonic() - start,
+                    ret_stdout=stdout_buffer.getvalue(),
+                    exit_code=None,
+                )
+            finally:
+                child_end.close()
+            deadline = start + timeout if timeout else None
+
+            while True:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                if cancel_event is not None:
+                    remaining = _CANCEL_POLL_INTERVAL if remaining is None else min(remaining, _CANCEL_POLL_INTERVAL)
+                try:
+                    has_msg = main_end.poll(remaining)
+                except (EOFError, OSError):
+                    has_msg = True
+                cancelled = cancel_event is not None and cancel_event.is_set()
+                if not has_msg and not cancelled and (deadline is None or time.monotonic() < deadline):
+                    continue
+                if not has_msg or cancelled:
+                    reason = "取消" if cancelled else "超时"
+                    global_logger.info(f"---------- 1. {reason}情况：SIGKILL 子进程 {child_pid}，工作区回滚到执行前")
+                    os.kill(child_pid, signal.SIGKILL)
+                    main_end.close()
+                    holder.reap(child_pid)
+                    return ExecutionTimeout(
+                        arg_command=command,
+                        arg_timeout=timeout,
+                        exec_timeout=time.monotonic() - start,
+                        ret_stdout=stdout_buffer.getvalue(),
+                    )
+                try:
+                    kind, payload = main_end.recv()
+                except (EOFError, OSError):
+                    main_end.close()
+                    exit_code = holder.reap(child_pid)
+                    global_logger.info(f"---------- 2.2 子进程崩溃 (Crashed)，退出码：{exit_code}，工作区回滚到执行前")
+                    return ExecutionCrashed(
+                        arg_command=command,
+                        arg_timeout=timeout,
+                        exec_timeout=time.monotonic() - start,
+                        ret_stdout=stdout_buffer.getvalue(),
+                        exit_code=exit_code,
+                    )
+                if kind == "stdout":
+                    stdout_buffer.write(payload)
+                    continue
+                if kind == "result":
+                    break
+
+            if payload["status"] == "success":
+                global_logger.info(f"---------- 2.1.1 子进程正常结束：commit，{child_pid} 成为新的 holder")
+                main_end.send(("commit",))
+                self._commit(_Holder(main_end, child_pid))
+                return ExecutionSuccess(
+                    arg_command=command,
+                    arg_timeout=timeout,
+                    # 状态留在 holder 中，按需调用 snapshot_checkpoint() 生成快照
+                    arg_chg_globals=payload["globals_snapshot"],
+                    exec_timeout=payload["exec_time"],
+                    ret_stdout=stdout_buffer.getvalue(),
+                    resource_usage=payload["resource_usage"],
+                )
+            # 失败：丢弃子进程，holder 中仍是执行前的工作区
+            main_end.send(("discard",))
+            main_end.close()
+            holder.reap(child_pid)
+        if payload["status"] == "limit_exceeded":
+            global_logger.info(f"---------- 2.1.3 子进程超出资源限制：{payload['limit_kind']}，工作区回滚到执行前")
+            return ExecutionLimitExceeded(
+                arg_command=command,
+                arg_timeout=timeout,
+                exec_timeout=payload["exec_time"],
+                ret_stdout=stdout_buffer.getvalue(),
+                resource_usage=payload["resource_usage"],
+                limit_kind=payload["limit_kind"],
+                limit_value=payload["limit_value"],
+                detail=payload["detail"],
+            )
+        global_logger.info("---------- 2.1.2 子进程异常结束：工作区回滚到执行前")
+        return ExecutionFailure(
+            arg_command=command,
+            arg_timeout=timeout,
+            exec_timeout=payload["exec_time"],
+            ret_stdout=stdout_buffer.getvalue(),
+            resource_usage=payload["resource_usage"],
+            exception_repr=payload["exception_repr"],
+            exception_type=payload["exception_type"],
+            exception_value=payload["exception_value"],
+            exception_traceback=payload["exception_traceback"],
+        )
+
+    def snapshot(self) -> var_snapshot.WorkspaceSnapshot:
+        with self.lock:
+            holder = self.holders[-1]
+            holder.ctrl.send(("snapshot",))
+            _, snapshot = holder.ctrl.recv()
+            return snapshot
+
+    def shutdown(self) -> None:
+        with self.lock:
+            holders, self.holders = self.holders, []
+        for holder in reversed(holders):
+            holder.stop()
+
+
+class CheckpointPool:
+    """agent -> checkpoint 链（与内核引擎共用 current_kernel_key 区分 agent）"""
+    def __init__(self):
+        self._sessions: dict[str, CheckpointSession] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> CheckpointSession:
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = CheckpointSession(key)
+                self._sessions[key] = session
+            return session
+
+    def find(self, key: str) -> Optional[CheckpointSession]:
+        with self._lock:
+            return self._sessions.get(key)
+
+    def restart(self, key: str) -> None:
+        with self._lock:
+            session = self._sessions.pop(key, None)
+        if session is not None:
+            session.shutdown()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            session.shutdown()
+
+
+_default_pool: Optional[CheckpointPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool() -> CheckpointPool:
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = CheckpointPool()
+            atexit.register(_default_pool.shutdown)
+        return _default_pool
+
+
+def snapshot_checkpoint(key: Optional[str] = None) -> var_snapshot.WorkspaceSnapshot:
+    """按需生成当前工作区的快照（与其他引擎的 globals_snapshot 格式一致），链未启动时返回空快照"""
+    session = get_default_pool().find(key or current_kernel_key.get())
+    return session.snapshot() if session is not None else var_snapshot.WorkspaceSnapshot()
+
+
+@traceable
+def run_structured_in_fork(
+    command: str,
+    _globals: dict[str, Any] | None = None,
+    _locals: Optional[Dict] = None,
+    timeout: Optional[float] = None,
+    stdout_buffer: Optional[stdout_stream.StdoutStream] = None,
+    work_dir: Optional[str] = None,
+) -> ExecutionResult:
+    """与 run_structured_in_thread 参数和返回值一致；_globals 只在 checkpoint 链启动后的第一次执行时用于初始化工作区"""
+    target_dir_fullpath = work_dir or static_path.Dir.PY_OUTPUT_DIR.resolve().as_posix()
+    return get_default_pool().get(current_kernel_key.get()).run(
+        command=command,
+        _globals=_globals,
+        timeout=timeout,
+        work_dir=target_dir_fullpath,
+        stdout_buffer=stdout_buffer,
+    )
+
+
+@traceable
+async def run_structured_in_fork_async(
+    command: str,
+    _globals: dict[str, Any] | None = None,
+    _locals: Optional[Dict] = None,
+    timeout: Optional[float] = None,
+    stdout_buffer: Optional[stdout_stream.StdoutStream] = None,
+    work_dir: Optional[str] = None,
+) -> ExecutionResult:
+    """run_structured_in_fork 的异步版本：被取消时 SIGKILL 正在执行的子进程，工作区回滚到执行前"""
+    target_dir_fullpath = work_dir or static_path.Dir.PY_OUTPUT_DIR.resolve().as_posix()
+    key = current_kernel_key.get()
+    cancel_event = threading.Event()
+    try:
+        # 第一次调用时启动 holder 进程，也放在线程中进行
+        return await asyncio.to_thread(
+            lambda **kwargs: get_default_pool().get(key).run(**kwargs),
+            command=command,
+            _globals=_globals,
+            timeout=timeout,
+            work_dir=target_dir_fullpath,
+            stdout_buffer=stdout_buffer,
+            cancel_event=cancel_event,
+        )
+    except asyncio.CancelledError:
+        cancel_event.set()
+        raise
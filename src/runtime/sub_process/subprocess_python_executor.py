@@ -0,0 +1,380 @@
+import asyncio
+import atexit
+import multiprocessing
+import os
+import pickle
+import queue
+import signal
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from src.runtime.sub_thread.subthread_schemas import (
+    ExecutionSuccess,
+    ExecutionFailure,
+    ExecutionTimeout,
+    ExecutionCrashed,
+    ExecutionLimitExceeded,
+    ExecutionResult,
+)
+from src.runtime.sub_process import subprocess_worker
+from src.runtime.ctx_mgr import resource_usage
+from src.runtime.ctx_mgr import stdout_stream
+from src.runtime.status_mgr import var_snapshot
+from src.utils.log_decorator import global_logger, traceable
+from src.utils.path_util import static_path
+
+
+# 支持取消时，等待 worker 消息的最长分段（秒）
+_CANCEL_POLL_INTERVAL = 0.1
+
+
+def _get_mp_context(warm_modules: list[tuple[str, Optional[str]]]) -> multiprocessing.context.BaseContext:
+    """Linux/macOS 使用 forkserver（干净且启动快），Windows 只能使用 spawn"""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        # forkserver 预先导入 worker 模块和预热模块，之后 fork 出来的 worker 无需重复导入（导入失败的模块会被忽略）
+        ctx.set_forkserver_preload([subprocess_worker.__name__] + [name for name, _ in warm_modules])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+class _PoolWorker:
+    """一个常驻的 worker 子进程及其通信管道"""
+    def __init__(self, ctx: multiprocessing.context.BaseContext, warm_modules: list[tuple[str, Optional[str]]]):
+        self.conn, child_conn = ctx.Pipe(duplex=True)
+        self.process = ctx.Process(
+            target=subprocess_worker.worker_main,
+            args=(child_conn, warm_modules),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.import_metrics: dict[str, Any] = {}
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        if self.ready:
+            return True
+        if self.conn.poll(timeout):
+            try:
+                kind, payload = self.conn.recv()
+                self.ready = kind == "ready"
+                if self.ready:
+                    self.import_metrics = payload
+            except (EOFError, OSError):
+                self.ready = False
+        return self.ready
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self) -> Optional[int]:
+        """SIGKILL 强制结束子进程，返回退出码"""
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+        return self.process.exitcode
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(("stop",))
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class ProcessWorkerPool:
+    """
+    预热的进程池：每个 worker 是常驻子进程，可以被强制 kill。
+    - 超时：SIGKILL 对应 worker，并补充一个新的 worker。
+    - 崩溃：worker 异常退出时返回真实的退出码（信号导致的退出码为负数，如 SIGSEGV = -11）。
+    - 并发：不同线程/智能体同时调用时各自占用一个 worker，运行在不同的 CPU 核上。
+    - 预热：worker 启动时预先导入 warm_modules（默认读取 ALGO_AGENT_WARM_MODULES），导入耗时见 import_metrics()。
+    - 资源限制：每次执行在 worker 中设置内存 / CPU 时间 / 文件大小限制（默认读取 ALGO_AGENT_LIMIT_*），超出时返回 ExecutionLimitExceeded。
+    """
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        warm_modules: Optional[str] = None,
+        limits: Optional[resource_usage.ResourceLimits] = None,
+    ):
+        self.size = size or max(1, min(4, os.cpu_count() or 1))
+        self.warm_modules = subprocess_worker.parse_warm_modules(warm_modules)
+        self.limits = limits if limits is not None else resource_usage.ResourceLimits.from_env()
+        self._ctx = _get_mp_context(self.warm_modules)
+        self._idle: "queue.Queue[_PoolWorker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+        self._import_metrics: dict[int, dict[str, Any]] = {}
+
+    def _new_worker(self) -> _PoolWorker:
+        return _PoolWorker(self._ctx, self.warm_modules)
+
+    def _record_ready(self, worker: _PoolWorker) -> None:
+        if worker.ready and worker.process.pid not in self._import_metrics:
+            self._import_metrics[worker.process.pid] = worker.import_metrics
+            global_logger.info(
+                f"worker {worker.process.pid} 预热完成，导入耗时 {worker.import_metrics.get('total_import_seconds', 0):.3f}s，"
+                f"继承自 forkserver：{worker.import_metrics.get('inherited')}，"
+                f"导入失败：{worker.import_metrics.get('import_errors')}"
+            )
+
+    def import_metrics(self) -> dict[int, dict[str, Any]]:
+        """每个存活 worker 的预热模块导入耗时：pid -> {import_seconds, total_import_seconds, inherited, import_errors}"""
+        return dict(self._import_metrics)
+
+    def start(self) -> "ProcessWorkerPool":
+        with self._lock:
+            if self._started:
+                return self
+            global_logger.info(f"启动 Python 进程池，worker 数量：{self.size}")
+            workers = [self._new_worker() for _ in range(self.size)]
+            for worker in workers:
+                worker.wait_ready()
+                self._record_ready(worker)
+                self._idle.put(worker)
+            self._started = True
+        return self
+
+    def _acquire(self) -> _PoolWorker:
+        if not self._started:
+            self.start()
+        worker = self._idle.get()
+        if not worker.is_alive():
+            global_logger.warning(f"worker {worker.process.pid} 已退出，重新创建")
+            self._import_metrics.pop(worker.process.pid, None)
+            worker.kill()
+            worker = self._new_worker()
+        return worker
+
+    def _release(self, worker: _PoolWorker) -> None:
+        if self._closed:
+            worker.stop()
+            return
+        self._idle.put(worker)
+
+    def _replace(self, worker: _PoolWorker) -> Optional[int]:
+        """丢弃一个 worker（kill 后回收），并补充一个新的 worker 到池中"""
+        self._import_metrics.pop(worker.process.pid, None)
+        exit_code = worker.kill()
+        if not self._closed:
+            self._idle.put(self._new_worker())
+        return exit_code
+
+    def run(
+        self,
+        command: str,
+        _globals: dict[str, Any] | None = None,
+        timeout: Optional[float] = None,
+        work_dir: Optional[str] = None,
+        stdout_buffer: Optional[stdout_stream.StdoutStream] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> ExecutionResult:
+        """cancel_event 被设置时与超时一样 SIGKILL worker（用于异步调用方被取消的情况）"""
+        worker = self._acquire()
+        worker.wait_ready()
+        self._record_ready(worker)
+        stdout_buffer = stdout_buffer if stdout_buffer is not None else stdout_stream.StdoutStream()
+        globals_bytes = pickle.dumps(_globals or {}, protocol=pickle.HIGHEST_PROTOCOL)
+        # 有变化检测基准时只把各变量的内容哈希发给 worker，worker 只回传变化的变量
+        base = var_snapshot.current_base.get()
+        base_hashes = base.hashes if base is not None and base.snapshot is not None and base.tracks(_globals) else None
+        start = time.monotonic()
+        deadline = start + timeout if timeout else None
+        try:
+            worker.conn.send(("exec", command, globals_bytes, work_dir, self.limits.to_dict(), base_hashes))
+        except (EOFError, OSError):
+            # worker 在取出之后、发送之前退出（BrokenPipeError 等）
+            exit_code = self._replace(worker)
+            global_logger.info(f"---------- 2.2 子进程在发送代码时已退出 (Crashed)，退出码：{exit_code}")
+            return ExecutionCrashed(
+                arg_command=command,
+                arg_timeout=timeout,
+                exec_timeout=time.monotonic() - start,
+                ret_stdout=stdout_buffer.getvalue(),
+                exit_code=exit_code,
+            )
+
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if cancel_event is not None:
+                # 分段等待，及时响应取消
+                remaining = _CANCEL_POLL_INTERVAL if remaining is None else min(remaining, _CANCEL_POLL_INTERVAL)
+            try:
+                has_msg = worker.conn.poll(remaining)
+            except (EOFError, OSError):
+                has_msg = True
+            cancelled = cancel_event is not None and cancel_event.is_set()
+            if not has_msg and not cancelled and (deadline is None or time.monotonic() < deadline):
+                continue
+            if not has_msg or cancelled:
+                reason = "取消" if cancelled else "超时"
+                global_logger.info(f"---------- 1. {reason}情况：SIGKILL worker {worker.process.pid}")
+                self._replace(worker)
+                return ExecutionTimeout(
+                    arg_command=command,
+                    arg_timeout=timeout,
+                    exec_timeout=time.monotonic() - start,
+                    ret_stdout=stdout_buffer.getvalue(),
+                )
+            try:
+                kind, payload = worker.conn.recv()
+            except (EOFError, OSError):
+                exit_code = self._replace(worker)
+                if exit_code == -signal.SIGXCPU and self.limits.cpu_seconds is not None:
+                    # CPU 时间超限且没能在 Python 层处理 SIGXCPU（如长时间停留在 C 扩展中）
+                    global_logger.info(f"---------- 2.3 子进程超出 CPU 时间限制，退出码：{exit_code}")
+                    return ExecutionLimitExceeded(
+                        arg_command=command,
+                        arg_timeout=timeout,
+                        exec_timeout=time.monotonic() - start,
+                        ret_stdout=stdout_buffer.getvalue(),
+                        limit_kind="cpu",
+                        limit_value=self.limits.cpu_seconds,
+                        detail="SIGXCPU",
+                    )
+                global_logger.info(f"---------- 2.2 子进程崩溃 (Crashed)，退出码：{exit_code}")
+                return ExecutionCrashed(
+                    arg_command=command,
+                    arg_timeout=timeout,
+                    exec_timeout=time.monotonic() - start,
+                    ret_stdout=stdout_buffer.getvalue(),
+                    exit_code=exit_code,
+                )
+            if kind == "stdout":
+                stdout_buffer.write(payload)
+                continue
+            if kind == "result":
+                break
+
+        self._release(worker)
+        if payload["status"] == "success":
+            global_logger.info("---------- 2.1.1 子进程正常结束：构建 Success Result")
+            return ExecutionSuccess(
+                arg_command=command,
+                arg_timeout=timeout,
+                arg_chg_globals=payload["globals_snapshot"],
+                exec_timeout=payload["exec_time"],
+                ret_stdout=stdout_buffer.getvalue(),
+                resource_usage=payload["resource_usage"],
+            )
+        if payload["status"] == "limit_exceeded":
+            global_logger.info(f"---------- 2.1.3 子进程超出资源限制：{payload['limit_kind']}")
+            return ExecutionLimitExceeded(
+                arg_command=command,
+                arg_timeout=timeout,
+                exec_timeout=payload["exec_time"],
+                ret_stdout=stdout_buffer.getvalue(),
+                resource_usage=payload["resource_usage"],
+                limit_kind=payload["limit_kind"],
+                limit_value=payload["limit_value"],
+                detail=payload["detail"],
+            )
+        global_logger.info("---------- 2.1.2 子进程异常结束：构建 Failure Result")
+        return ExecutionFailure(
+            arg_command=command,
+            arg_timeout=timeout,
+            exec_timeout=payload["exec_time"],
+            ret_stdout=stdout_buffer.getvalue(),
+            resource_usage=payload["resource_usage"],
+            exception_repr=payload["exception_repr"],
+            exception_type=payload["exception_type"],
+            exception_value=payload["exception_value"],
+            exception_traceback=payload["exception_traceback"],
+        )
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+            while True:
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                worker.stop()
+            self._import_metrics.clear()
+            self._started = False
+
+
+_default_pool: Optional[ProcessWorkerPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool() -> ProcessWorkerPool:
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ProcessWorkerPool()
+            atexit.register(_default_pool.shutdown)
+        return _default_pool
+
+
+@traceable
+def run_structured_in_process(
+    command: str,
+    _globals: dict[str, Any] | None = None,
+    _locals: Optional[Dict] = None,
+    timeout: Optional[float] = None,
+    stdout_buffer: Optional[stdout_stream.StdoutStream] = None,
+    work_dir: Optional[str] = None,
+) -> ExecutionResult:
+    """与 run_structured_in_thread 参数和返回值一致，代码在进程池的 worker 中执行（每个 worker 有独立的工作目录）"""
+    target_dir_fullpath = work_dir or static_path.Dir.PY_OUTPUT_DIR.resolve().as_posix()
+    return get_default_pool().run(
+        command=command,
+        _globals=_globals,
+        timeout=timeout,
+        work_dir=target_dir_fullpath,
+        stdout_buffer=stdout_buffer,
+    )
+
+
+@traceable
+async def run_structured_in_process_async(
+    command: str,
+    _globals: dict[str, Any] | None = None,
+    _locals: Optional[Dict] = None,
+    timeout: Optional[float] = None,
+    stdout_buffer: Optional[stdout_stream.StdoutStream] = None,
+    work_dir: Optional[str] = None,
+) -> ExecutionResult:
+    """run_structured_in_process 的异步版本：等待放到线程池中，被取消时 SIGKILL 正在执行的 worker"""
+    target_dir_fullpath = work_dir or static_path.Dir.PY_OUTPUT_DIR.resolve().as_posix()
+    cancel_event = threading.Event()
+    try:
+        return await asyncio.to_thread(
+            get_default_pool().run,
+            command=command,
+            _globals=_globals,
+            timeout=timeout,
+            work_dir=target_dir_fullpath,
+            stdout_buffer=stdout_buffer,
+            cancel_event=cancel_event,
+        )
+    except asyncio.CancelledError:
+        cancel_event.set()
+        raise
+
+
+if __name__ == "__main__":
+    print("\n>>> TEST: SUCCESS")
+    res = run_structured_in_process("import os; print('Hello World'); x=10", {}, timeout=5)
+    print(f"类型: {type(res)}")
+    print(f"LLM View:\n{res.ret_tool2llm}")
+
+    print("\n>>> TEST: TIMEOUT")
+    res = run_structured_in_process("import time; print('Sleep...'); time.sleep(2)", {}, timeout=1)
+    print(f"类型: {type(res)}")
+    print(f"LLM View:\n{res.ret_tool2llm}")
+
+    print("\n>>> TEST: CRASHED")
+    res = run_structured_in_process("import os; os.abort()", {}, timeout=5)
+    print(f"类型: {type(res)}")
+    print(f"LLM View:\n{res.ret_tool2llm}")
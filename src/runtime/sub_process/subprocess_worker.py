@@ -0,0 +1,209 @@
+"""
+进程池 worker 端：常驻子进程，循环接收主进程下发的代码并执行。
+
+注意：该模块会在子进程中被导入，不能导入 src.utils.log_decorator 等带有副作用的模块
+（会在子进程中重新生成时间标签和日志文件夹），所有结果都通过 Pipe 以普通 dict 的形式回传。
+
+预热：worker 启动时预先导入一组常用模块（ALGO_AGENT_WARM_MODULES，格式如 "numpy as np,pandas as pd,scipy"），
+forkserver 模式下这些模块已在 forkserver 中导入，fork 出的 worker 直接继承，不再重复导入。
+带别名的模块在每次执行前注入到 globals（已存在的同名变量不覆盖），代码中再次 import 也只是查一下 sys.modules。
+
+消息协议（均为 tuple）：
+    主进程 -> 子进程: ("exec", command, globals_bytes, work_dir, limits_dict, base_hashes)
+                      ("stop",)
+    子进程 -> 主进程: ("ready", import_metrics_dict)
+                      ("stdout", text)
+                      ("result", payload_dict)
+base_hashes 为起始工作区中各变量的内容哈希（可为 None）：提供时成功结果的 globals_snapshot 是只包含变化的 SnapshotDelta。
+"""
+import importlib
+import os
+import pickle
+import sys
+import threading
+import time
+from multiprocessing import reduction
+from types import ModuleType
+from typing import Any, Optional
+
+from src.runtime.ctx_mgr import resource_usage
+from src.runtime.status_mgr import code_cache
+from src.runtime.status_mgr import source_code
+from src.runtime.status_mgr import var_snapshot
+
+WARM_MODULES_ENV = "ALGO_AGENT_WARM_MODULES"
+DEFAULT_WARM_MODULES = "numpy as np,pandas as pd,scipy,matplotlib.pyplot as plt,networkx as nx"
+
+
+def parse_warm_modules(spec: Optional[str] = None) -> list[tuple[str, Optional[str]]]:
+    """解析 "numpy as np,scipy" 为 [("numpy", "np"), ("scipy", None)]，spec 为空时读取环境变量"""
+    if spec is None:
+        spec = os.getenv(WARM_MODULES_ENV, DEFAULT_WARM_MODULES)
+    modules: list[tuple[str, Optional[str]]] = []
+    for item in spec.split(","):
+        parts = item.split()
+        if not parts:
+            continue
+        if len(parts) == 3 and parts[1] == "as":
+            modules.append((parts[0], parts[2]))
+        else:
+            modules.append((parts[0], None))
+    return modules
+
+
+def _preload_modules(warm_modules: list[tuple[str, Optional[str]]]) -> tuple[dict[str, ModuleType], dict[str, Any]]:
+    """导入预热模块，返回 (别名 -> 模块, 导入耗时统计)；导入失败的模块只记录错误，不影响 worker 启动"""
+    preloaded: dict[str, ModuleType] = {}
+    import_seconds: dict[str, float] = {}
+    inherited: list[str] = []
+    import_errors: dict[str, str] = {}
+    for name, alias in warm_modules:
+        if name in sys.modules:
+            inherited.append(name)
+        start = time.perf_counter()
+        try:
+            module = importlib.import_module(name)
+        except Exception as e:
+            import_errors[name] = repr(e)
+            continue
+        import_seconds[name] = time.perf_counter() - start
+        if alias:
+            preloaded[alias] = module
+    if "matplotlib" in sys.modules:
+        # forkserver 中导入 pyplot 时还没有设置后端，这里统一切到无 GUI 后端
+        sys.modules["matplotlib"].use("Agg")
+    metrics = {
+        "pid": os.getpid(),
+        "import_seconds": import_seconds,
+        "total_import_seconds": sum(import_seconds.values()),
+        "inherited": inherited,
+        "import_errors": import_errors,
+    }
+    return preloaded, metrics
+
+
+class _PipeWriter:
+    """把 print 输出实时发送回主进程，主进程在超时/崩溃时也能拿到已经输出的内容"""
+    def __init__(self, conn, lock: threading.Lock):
+        self.conn = conn
+        self.lock = lock
+        # 写入管道的累计字节数（不计入执行的写入量）
+        self.bytes_sent = 0
+
+    def write(self, msg: str):
+        if msg:
+            data = reduction.ForkingPickler.dumps(("stdout", msg))
+            with self.lock:
+                self.conn.send_bytes(data)
+                # 与 conn.send 相同的编码，Connection 另写 4 字节的长度前缀
+                self.bytes_sent += len(data) + 4
+
+    def flush(self):
+        pass
+
+
+def exec_in_globals(
+    conn,
+    send_lock: threading.Lock,
+    command: str,
+    _globals: dict[str, Any],
+    work_dir: str | None,
+    limits: resource_usage.ResourceLimits,
+    with_snapshot: bool = True,
+    change_base: Optional[var_snapshot.ChangeBase] = None,
+) -> dict[str, Any]:
+    """
+    在给定的 globals 中执行代码，print 输出实时发回主进程；with_snapshot=False 时成功结果不带快照（状态常驻的 checkpoint 模式）。
+    提供 change_base 时只序列化相对起始工作区变化的变量。
+    """
+    if work_dir:
+        os.chdir(work_dir)
+    writer = _PipeWriter(conn, send_lock)
+    original_stdout, original_stderr = sys.stdout, sys.stderr
+    usage: dict[str, Any] = {}
+    start = time.perf_counter()
+    try:
+        sys.stdout = sys.stderr = writer
+        with resource_usage.ResourceRecorder(usage, per_thread=False, excluded_bytes=lambda: writer.bytes_sent):
+            with resource_usage.ApplyLimits(limits):
+                exec(code_cache.compile_cached(command), _globals, _globals)
+        exec_time = time.perf_counter() - start
+        sys.stdout, sys.stderr = original_stdout, original_stderr
+        # 在子进程中完成过滤与序列化，主进程直接复用快照字节
+        if not with_snapshot:
+            snapshot: Any = var_snapshot.WorkspaceSnapshot()
+        elif change_base is not None:
+            snapshot = var_snapshot.take_delta(_globals, change_base)
+        else:
+            snapshot = var_snapshot.take_snapshot(_globals)
+        return {
+            "status": "success",
+            "exec_time": exec_time,
+            "resource_usage": usage,
+            "globals_snapshot": snapshot,
+        }
+    except Exception as e:
+        exec_time = time.perf_counter() - start
+        sys.stdout, sys.stderr = original_stdout, original_stderr
+        limit_error = resource_usage.classify_limit_error(e, limits)
+        if limit_error is not None:
+            return {
+                "status": "limit_exceeded",
+                "exec_time": exec_time,
+                "resource_usage": usage,
+                "limit_kind": limit_error.kind,
+                "limit_value": limit_error.limit,
+                "detail": limit_error.detail,
+            }
+        return {
+            "status": "failure",
+            "exec_time": exec_time,
+            "resource_usage": usage,
+            "exception_repr": repr(e),
+            "exception_type": type(e).__name__,
+            "exception_value": str(e),
+            "exception_traceback": source_code.filter_exec_traceback(),
+        }
+    finally:
+        sys.stdout, sys.stderr = original_stdout, original_stderr
+
+
+def _exec_one(
+    conn,
+    send_lock: threading.Lock,
+    command: str,
+    globals_bytes: bytes,
+    work_dir: str | None,
+    preloaded: dict[str, ModuleType],
+    limits: resource_usage.ResourceLimits,
+    base_hashes: Optional[dict[str, str]] = None,
+) -> dict[str, Any]:
+    _globals: dict[str, Any] = pickle.loads(globals_bytes) if globals_bytes else {}
+    # 执行前的对象，执行后仍是同一个不可变对象的变量不必再序列化
+    change_base = var_snapshot.ChangeBase(hashes=base_hashes, objects=dict(_globals)) if base_hashes is not None else None
+    for alias, module in preloaded.items():
+        # 模块不会进入快照（var_snapshot 会跳过模块），每次执行前重新注入
+        _globals.setdefault(alias, module)
+    return exec_in_globals(conn, send_lock, command, _globals, work_dir, limits, change_base=change_base)
+
+
+def worker_main(conn, warm_modules: Optional[list[tuple[str, Optional[str]]]] = None) -> None:
+    """子进程入口：预热完成后发送 ready（附带导入耗时统计），然后循环处理任务，直到收到 stop 或管道关闭"""
+    # 子进程中没有 GUI，先强制无 GUI 后端，避免 matplotlib 弹窗或卡死
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    preloaded, import_metrics = _preload_modules(warm_modules or [])
+    send_lock = threading.Lock()
+    with send_lock:
+        conn.send(("ready", import_metrics))
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message[0] == "stop":
+            break
+        _, command, globals_bytes, work_dir, limits_dict, base_hashes = message
+        limits = resource_usage.ResourceLimits(**(limits_dict or {}))
+        payload = _exec_one(conn, send_lock, command, globals_bytes, work_dir, preloaded, limits, base_hashes)
+        with send_lock:
+            conn.send(("result", payload))
@@ -1,3 +1,5 @@
+import asyncio
+import contextvars
 import inspect
 import os
 import threading
@@ -16,7 +18,11 @@ from src.runtime.sub_thread.subthread_schemas import (
     ExecutionResultFromSubThread, # 这是个 Union 类型别名
 )
 from src.runtime.ctx_mgr import cwd
+from src.runtime.ctx_mgr import resource_usage
+from src.runtime.ctx_mgr import stdout_stream
 from src.runtime.ctx_mgr import timer_recorder
+from src.runtime.status_mgr import source_code
+from src.runtime.status_mgr import code_cache
 from src.runtime.before_thread import plt_back_chinese
 from src.utils.log_decorator import global_logger, traceable
 from src.utils.path_util import path_enum
@@ -29,115 +35,68 @@ def _worker_with_buffer(
     _locals: Optional[Dict],
     timeout: Optional[float],
     exec_time_container: list[float],
-    stdout_buffer: list[str],
+    stdout_buffer: stdout_stream.StdoutStream,
     result_container: list[ExecutionResultFromSubThread],
 ) -> None:
     """
     在线程中执行命令。
     根据执行情况（成功/异常），向 result_container 中添加具体的 ExecutionResult 子类实例。
+    print 输出实时写入 stdout_buffer（StdoutStream），执行过程中即可被异步消费。
     """
-
-    class _BufferWriter:
-        def __init__(self, buffer: list[str]):
-            self.buffer = buffer
-
-        def write(self, msg: str):
-            if msg:
-                self.buffer.append(msg)
-
-        def flush(self):
-            pass
-
     res: ExecutionResultFromSubThread
+    # 线程模式只统计资源占用（CPU 时间按执行线程统计），不设置限制
+    usage: dict[str, Any] = {}
     try:
-        with cwd.Change_STDOUT_STDERR(_BufferWriter(stdout_buffer)):
-            with timer_recorder.TimerRecorder(exec_time_container):
-                exec(command, _globals, _locals)
+        with cwd.Change_STDOUT_STDERR(stdout_buffer):
+            with resource_usage.ResourceRecorder(usage, per_thread=True):
+                with timer_recorder.TimerRecorder(exec_time_container):
+                    # 同一段代码只编译一次（按源码哈希缓存）
+                    exec(code_cache.compile_cached(command), _globals, _locals)
         
         global_logger.info("---------- 2.1.1 子线程正常结束：构建 Success Result")
         
         # 实例化成功对象
-        # 注意：这里会触发 schemas.py 中的 field_validate_globals 进行深拷贝
+        # 注意：这里会触发 schemas.py 中的 model_validate_globals 生成变量快照（每个变量只序列化一次）
         res = ExecutionSuccess(
             arg_command=command,
             arg_timeout=timeout,
             arg_chg_globals=_globals or {},
             exec_timeout=exec_time_container[0] if exec_time_container else -1,
-            ret_stdout="".join(stdout_buffer),
+            ret_stdout=stdout_buffer.getvalue(),
+            resource_usage=usage or None,
         )
         
     except Exception as e:
         global_logger.info("---------- 2.1.2 子线程异常结束：构建 Failure Result")
         
-        def _filter_exec_traceback():
-            exc_str = traceback.format_exc()
-            # 按行拆分栈信息，过滤出 <string> 相关的行（exec 内部代码）
-            lines = exc_str.splitlines()
-            exec_lines = []
-            # # 标记是否进入 exec 内部栈段（处理连续的栈行）
-            # in_exec_block = False
-            
-            for line in lines:
-                # 核心特征：包含 "<string>"（exec 执行字符串代码的标记）
-                if "Traceback" in line:
-                    exec_lines.append(line)
-                elif "<string>" in line:
-                    # in_exec_block = True
-                    exec_lines.append(line)
-                # 保留 exec 栈段的后续行（如出错代码行、异常描述）
-                # elif in_exec_block:
-                elif exec_lines and "<string>" in exec_lines[-1]:
-                    # 终止条件：遇到新的栈帧（以 "File " 开头但不含 <string>）
-                    if line.startswith("File ") and "<string>" not in line:
-                        # in_exec_block = False
-                        continue
-                    exec_lines.append(line)
-            # 重新拼接过滤后的字符串
-            return "\n".join(exec_lines)
-
         # 实例化失败对象
         res = ExecutionFailure(
             arg_command=command,
             arg_timeout=timeout,
             exec_timeout=exec_time_container[0] if exec_time_container else -1,
-            ret_stdout="".join(stdout_buffer),
+            ret_stdout=stdout_buffer.getvalue(),
+            resource_usage=usage or None,
             exception_repr=repr(e),
             exception_type=type(e).__name__,
             exception_value=str(e),
-            exception_traceback=_filter_exec_traceback()
+            exception_traceback=source_code.filter_exec_traceback()
         )
     finally:
         # 将结果放入容器传回主线程
-        # 注意：此时 res.ret_stdout 还是空的，因为 buffer 可能还没写完或需要在主线程合并
         result_container.append(res)
 
-@traceable
-def run_structured_in_thread(
+def _build_final_result(
     command: str,
-    _globals: dict[str, Any] | None = None,
-    _locals: Optional[Dict] = None,
-    timeout: Optional[float] = None,
+    timeout: Optional[float],
+    is_alive: bool,
+    exec_time_container: list[float],
+    stdout_buffer: stdout_stream.StdoutStream,
+    result_container: list[ExecutionResultFromSubThread],
 ) -> ExecutionResult:
-    _locals = _globals
-    exec_time_container: list[float] = []
-    stdout_buffer: list[str] = []
-    result_container: list[ExecutionResult] = []
-
-    t = threading.Thread(
-        target=_worker_with_buffer,
-        args=(command, _globals, _locals, timeout, exec_time_container, stdout_buffer, result_container),
-    )
-    
-    target_dir_fullpath = static_path.Dir.PY_OUTPUT_DIR.resolve().as_posix()
-    
-    # 切换目录执行
-    with cwd.ChangeDirectory(target_dir_fullpath):
-        t.start()
-        t.join(timeout)
-    
+    """同步/异步两种等待方式共用：根据子线程状态构建最终结果"""
     final_res: ExecutionResult
 
-    if t.is_alive():
+    if is_alive:
         global_logger.info("---------- 1. 超时情况：主线程构建 Timeout Result")
         # 线程超时，只能在主线程构建结果
         final_res = ExecutionTimeout(
@@ -147,7 +106,7 @@ def run_structured_in_thread(
                 timeout if timeout else 0, 
                 exec_time_container[0] if exec_time_container else -1.0
             ),
-            ret_stdout="".join(stdout_buffer),
+            ret_stdout=stdout_buffer.getvalue(),
         )
         # 注意：Python 线程无法强制 Kill，这里只是逻辑上的超时处理
     else:
@@ -162,7 +121,7 @@ def run_structured_in_thread(
                 arg_command=command,
                 arg_timeout=timeout,
                 exec_timeout=exec_time_container[0] if exec_time_container else -1,
-                ret_stdout="".join(stdout_buffer),
+                ret_stdout=stdout_buffer.getvalue(),
                 exit_code=-1, # Thread 没有 exitcode，这里用 -1 标记未知错误
             )
 
@@ -171,6 +130,94 @@ def run_structured_in_thread(
     
     return final_res
 
+@traceable
+def run_structured_in_thread(
+    command: str,
+    _globals: dict[str, Any] | None = None,
+    _locals: Optional[Dict] = None,
+    timeout: Optional[float] = None,
+    stdout_buffer: Optional[stdout_stream.StdoutStream] = None,
+    work_dir: Optional[str] = None,
+) -> ExecutionResult:
+    _locals = _globals
+    exec_time_container: list[float] = []
+    # 调用方可以传入自己的 StdoutStream 来实时读取输出，否则只在结束后通过 ret_stdout 返回
+    stdout_buffer = stdout_buffer if stdout_buffer is not None else stdout_stream.StdoutStream()
+    result_container: list[ExecutionResultFromSubThread] = []
+
+    # 子线程在调用方上下文的副本中运行（与 asyncio.to_thread 一致），构建结果时能读到变化检测基准等上下文变量
+    t = threading.Thread(
+        target=contextvars.copy_context().run,
+        args=(_worker_with_buffer, command, _globals, _locals, timeout, exec_time_container, stdout_buffer, result_container),
+    )
+    
+    target_dir_fullpath = work_dir or static_path.Dir.PY_OUTPUT_DIR.resolve().as_posix()
+    
+    # 切换目录执行（同一目录的并发执行共享切换，见 cwd.ChangeDirectory）
+    with cwd.ChangeDirectory(target_dir_fullpath):
+        t.start()
+        t.join(timeout)
+    
+    return _build_final_result(command, timeout, t.is_alive(), exec_time_container, stdout_buffer, result_container)
+
+@traceable
+async def run_structured_in_thread_async(
+    command: str,
+    _globals: dict[str, Any] | None = None,
+    _locals: Optional[Dict] = None,
+    timeout: Optional[float] = None,
+    stdout_buffer: Optional[stdout_stream.StdoutStream] = None,
+    work_dir: Optional[str] = None,
+) -> ExecutionResult:
+    """
+    run_structured_in_thread 的异步版本：不在事件循环线程上 join，子线程结束时通过 call_soon_threadsafe 唤醒。
+    变量快照在子线程中构建（ExecutionSuccess 的校验器），同样不占用事件循环。
+    被取消时立即抛出 CancelledError，与超时一样，子线程无法被强制结束，只是不再等待它。
+    """
+    _locals = _globals
+    exec_time_container: list[float] = []
+    stdout_buffer = stdout_buffer if stdout_buffer is not None else stdout_stream.StdoutStream()
+    result_container: list[ExecutionResultFromSubThread] = []
+
+    loop = asyncio.get_running_loop()
+    finished: asyncio.Future[None] = loop.create_future()
+
+    def _mark_finished() -> None:
+        if not finished.done():
+            finished.set_result(None)
+
+    def _target() -> None:
+        try:
+            _worker_with_buffer(command, _globals, _locals, timeout, exec_time_container, stdout_buffer, result_container)
+        finally:
+            try:
+                loop.call_soon_threadsafe(_mark_finished)
+            except RuntimeError:
+                # 事件循环已关闭（调用方已取消并退出），结果无人等待
+                pass
+
+    t = threading.Thread(target=contextvars.copy_context().run, args=(_target,), daemon=True)
+
+    target_dir_fullpath = work_dir or static_path.Dir.PY_OUTPUT_DIR.resolve().as_posix()
+    change_dir = cwd.ChangeDirectory(target_dir_fullpath)
+    # 目标目录不同的执行需要排队，排队等待放到线程池中，不阻塞事件循环
+    entering = asyncio.ensure_future(asyncio.to_thread(change_dir.__enter__))
+    try:
+        await asyncio.shield(entering)
+    except asyncio.CancelledError:
+        # 排队期间被取消：等真正进入目录后立即退出，保证引用计数不泄漏
+        entering.add_done_callback(
+            lambda f: change_dir.__exit__(None, None, None) if not f.cancelled() and f.exception() is None else None
+        )
+        raise
+    try:
+        t.start()
+        await asyncio.wait({finished}, timeout=timeout)
+    finally:
+        change_dir.__exit__(None, None, None)
+
+    return _build_final_result(command, timeout, not finished.done(), exec_time_container, stdout_buffer, result_container)
+
 if __name__ == "__main__":
     # --- 测试 Success ---
     print("\n>>> TEST: SUCCESS")
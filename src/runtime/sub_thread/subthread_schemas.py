@@ -2,9 +2,12 @@ import abc
 from enum import Enum, unique
 from token import OP
 from typing import Any, Dict, Optional, Literal, Union, Annotated
-from pydantic import BaseModel, ConfigDict, Field, field_validator, computed_field
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, field_validator, model_validator, computed_field
+from src.runtime.status_mgr import code_cache
+from src.runtime.status_mgr import output_budget
 from src.runtime.status_mgr import source_code
-from src.runtime.status_mgr import var_ws
+from src.runtime.status_mgr import var_snapshot
+from src.runtime.ctx_mgr import resource_usage
 
 @unique
 class ExecutionStatus(str, Enum):
@@ -12,6 +15,53 @@ class ExecutionStatus(str, Enum):
     FAILURE = "failure"
     TIMEOUT = "timeout"
     CRASHED = "crashed"
+    LIMIT_EXCEEDED = "limit_exceeded"
+
+
+class ResourceUsage(BaseModel):
+    """单次执行的资源占用，拿不到的项为 None（见 resource_usage 模块）"""
+    cpu_user_seconds: Optional[float] = Field(None, description="CPU 用户态时间（秒）")
+    cpu_sys_seconds: Optional[float] = Field(None, description="CPU 内核态时间（秒）")
+    peak_rss_bytes: Optional[int] = Field(None, description="峰值常驻内存（字节），仅进程模式")
+    bytes_written: Optional[int] = Field(None, description="执行中写出的字节数（不含 print 输出），仅进程模式")
+
+
+class VarChanges(BaseModel):
+    """本次执行相对起始工作区的变量级变化（见 var_snapshot.take_delta）"""
+    added: list[str] = Field(default_factory=list, description="新增的变量")
+    modified: list[str] = Field(default_factory=list, description="内容变化的变量")
+    deleted: list[str] = Field(default_factory=list, description="被删除（或已无法保存）的变量")
+    unpersisted: list[str] = Field(default_factory=list, description="无法序列化、不会保留到下一次调用的变量")
+    unchanged_count: int = Field(0, description="未变化的变量数")
+
+    @classmethod
+    def from_delta(cls, base: var_snapshot.ChangeBase, delta: var_snapshot.SnapshotDelta) -> "VarChanges":
+        return cls(
+            added=sorted(name for name in delta.changed if name not in base.hashes),
+            modified=sorted(name for name in delta.changed if name in base.hashes),
+            deleted=sorted(delta.deleted),
+            unpersisted=sorted(name for name, reason in delta.skipped.items() if reason != "module"),
+            unchanged_count=len(delta.unchanged),
+        )
+
+    def describe(self) -> str:
+        parts = [
+            f"{label} {', '.join(names)}"
+            for label, names in (("新增", self.added), ("修改", self.modified), ("删除", self.deleted), ("无法保存", self.unpersisted))
+            if names
+        ]
+        return "；".join(parts) if parts else "无变化"
+
+
+class OutputTruncation(BaseModel):
+    """终端输出超出预算时的截断统计（见 output_budget 模块）"""
+    total_chars: int = Field(..., description="完整输出的字符数")
+    total_lines: int = Field(..., description="完整输出的行数")
+    shown_chars: int = Field(..., description="给模型的字符数（不含省略提示）")
+    omitted_chars: int = Field(..., description="省略的字符数")
+    omitted_lines: int = Field(..., description="省略的行数")
+    spill_path: Optional[str] = Field(None, description="完整输出保存的文件路径")
+    variable_summary: list[str] = Field(default_factory=list, description="本次写入的变量的结构概览")
 
 # --- 基类：定义所有情况共有的字段 ---
 class BaseExecutionResult(BaseModel):
@@ -26,8 +76,39 @@ class BaseExecutionResult(BaseModel):
     # 定义 exit_status 为抽象属性，强制子类实现（通过 Literal）
     exit_status: ExecutionStatus = Field(..., description="执行结果状态")
 
+    resource_usage: Optional[ResourceUsage] = Field(None, description="CPU、内存、写文件的资源占用")
+
+    output_truncation: Optional[OutputTruncation] = Field(None, description="给模型的输出被截断时的统计")
+    # 给模型看的终端输出（超出预算时为截断后的文本）
+    _llm_stdout: Optional[str] = PrivateAttr(None)
+
     # model_config = ConfigDict(arbitrary_types_allowed=True)
 
+    def model_post_init(self, __context: Any) -> None:
+        """结果构建完成后检查输出预算：超出时截断并把完整输出写入文件（每个结果只做一次）"""
+        if self.output_truncation is not None:
+            return
+        truncated = output_budget.truncate(self.ret_stdout)
+        if truncated is None:
+            return
+        self._llm_stdout = truncated.text
+        self.output_truncation = OutputTruncation(
+            total_chars=truncated.total_chars,
+            total_lines=truncated.total_lines,
+            shown_chars=truncated.shown_chars,
+            omitted_chars=truncated.omitted_chars,
+            omitted_lines=truncated.omitted_lines,
+            spill_path=truncated.spill_path,
+            variable_summary=self._variable_summary(),
+        )
+
+    def _variable_summary(self) -> list[str]:
+        return []
+
+    @property
+    def llm_stdout(self) -> str:
+        return self._llm_stdout if self._llm_stdout is not None else self.ret_stdout
+
     @computed_field
     def ret_tool2llm(self) -> str:
         """
@@ -46,22 +127,76 @@ class BaseExecutionResult(BaseModel):
 class ExecutionSuccess(BaseExecutionResult):
     exit_status: Literal[ExecutionStatus.SUCCESS] = ExecutionStatus.SUCCESS
     
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     # 只有成功时才需要处理 globals
-    arg_chg_globals: Dict[str, Any] = Field(..., description="执行后的全局变量")
+    # left_to_right：先按类型匹配 LazyWorkspace，避免按 dict 校验时遍历并反序列化全部变量
+    arg_chg_globals: Union[var_snapshot.LazyWorkspace, Dict[str, Any]] = Field(
+        ..., description="执行后的全局变量；来自已序列化的快照时为按需反序列化的只读视图", union_mode="left_to_right",
+    )
+    globals_snapshot: var_snapshot.WorkspaceSnapshot = Field(
+        default_factory=var_snapshot.WorkspaceSnapshot,
+        description="执行后全局变量的快照（每个变量只序列化一次），供 var_ws 复用",
+        exclude=True,
+        repr=False,
+    )
+    var_changes: Optional[VarChanges] = Field(None, description="相对起始工作区的变量变化，没有变化检测基准时为 None")
 
-    @field_validator('arg_chg_globals', mode='before')
+    @model_validator(mode='before')
     @classmethod
-    def field_validate_globals(cls, value: Any) -> Dict[str, Any]:
-        if value is None:
-            return {}
-        # 这里保留你的深拷贝逻辑
-        return var_ws.filter_and_deepcopy_globals(value)
+    def model_validate_globals(cls, data: Any) -> Any:
+        """
+        只做一次序列化：
+        - 传入 dict：过滤并生成快照，arg_chg_globals 保留过滤后的原对象（执行已结束，不再需要深拷贝）；
+        - 传入 WorkspaceSnapshot（如进程池 worker 已经序列化好）：直接复用快照，arg_chg_globals 为按需反序列化的视图；
+        - 传入 SnapshotDelta（进程池 worker 只回传了变化）：与当前的变化检测基准合并得到快照，arg_chg_globals 同上。
+        主进程只反序列化被访问的变量（如变量概览只访问本次写入的变量），带外缓冲区不会被整体拷贝。
+        有变化检测基准（var_snapshot.current_base）时只序列化变化的变量，并记录 var_changes。
+        """
+        if not isinstance(data, dict):
+            return data
+        value = data.get('arg_chg_globals')
+        base = var_snapshot.current_base.get()
+        var_changes = None
+        if isinstance(value, var_snapshot.SnapshotDelta):
+            snapshot = base.compose(value)
+            filtered_globals = var_snapshot.LazyWorkspace(snapshot)
+            var_changes = VarChanges.from_delta(base, value)
+        elif isinstance(value, var_snapshot.WorkspaceSnapshot):
+            snapshot = value
+            filtered_globals = var_snapshot.LazyWorkspace(snapshot)
+        elif base is not None and base.snapshot is not None and base.tracks(value):
+            delta = var_snapshot.take_delta(value, base)
+            snapshot = base.compose(delta)
+            filtered_globals = {name: value[name] for name in snapshot.vars}
+            var_changes = VarChanges.from_delta(base, delta)
+        else:
+            value = value or {}
+            snapshot = var_snapshot.take_snapshot(value)
+            filtered_globals = {name: value[name] for name in snapshot.vars}
+        return {**data, 'arg_chg_globals': filtered_globals, 'globals_snapshot': snapshot, 'var_changes': var_changes}
+
+    def _variable_summary(self) -> list[str]:
+        # 只概览本次代码写入的变量
+        return output_budget.summarize_variables(self.arg_chg_globals, code_cache.analyze(self.arg_command).writes)
 
     def _generate_llm_response(self) -> str:
+        changes = f"### 工作区变量变化：{self.var_changes.describe()}\n" if self.var_changes is not None else ""
+        if self.output_truncation is None:
+            return (
+                "## 代码执行成功，输出结果完整，任务完成\n"
+                f"{changes}"
+                "### 终端输出：\n"
+                f"{self.ret_stdout}"
+            )
+        summary = "\n".join(self.output_truncation.variable_summary) or "（无）"
         return (
-            "## 代码执行成功，输出结果完整，任务完成\n"
+            "## 代码执行成功，输出过长已截断（只保留开头和结尾），避免打印大对象的全部内容\n"
+            f"{changes}"
             "### 终端输出：\n"
-            f"{self.ret_stdout}"
+            f"{self.llm_stdout}\n"
+            "### 本次写入的变量概览：\n"
+            f"{summary}\n"
         )
 
 # --- 2. 失败状态（代码报错） ---
@@ -80,7 +215,7 @@ class ExecutionFailure(BaseExecutionResult):
         return (
             "## 代码执行失败，代码抛出异常，根据报错信息进行调试\n"
             "### 终端输出：\n"
-            f"{self.ret_stdout}\n"
+            f"{self.llm_stdout}\n"
             "### 原始代码：\n"
             f"{source_code.add_line_numbers(self.arg_command)}\n"
             "### 报错信息：\n"
@@ -97,7 +232,7 @@ class ExecutionTimeout(BaseExecutionResult):
         return (
             "## 代码执行超时，强制退出执行，调整超时时间后重试\n"
             "### 终端输出：\n"
-            f"{self.ret_stdout}\n"
+            f"{self.llm_stdout}\n"
             f"### 超出限制的时间：{self.arg_timeout} 秒\n"
         )
 
@@ -111,12 +246,29 @@ class ExecutionCrashed(BaseExecutionResult):
         return (
             "## 代码执行崩溃，进程异常退出，根据报错信息进行调试\n"
             "### 终端输出：\n"
-            f"{self.ret_stdout}\n"
+            f"{self.llm_stdout}\n"
             f"### 退出状态码：{self.exit_code}\n"
         )
 
+# --- 5. 超出资源限制（内存 / CPU 时间 / 文件大小，仅进程模式） ---
+class ExecutionLimitExceeded(BaseExecutionResult):
+    exit_status: Literal[ExecutionStatus.LIMIT_EXCEEDED] = ExecutionStatus.LIMIT_EXCEEDED
+
+    limit_kind: str = Field(..., description="超出的限制：memory / cpu / file_size")
+    limit_value: Optional[float] = Field(None, description="限制值（MB 或秒）")
+    detail: str = Field("", description="触发限制的异常或信号")
+
+    def _generate_llm_response(self) -> str:
+        label, unit = resource_usage.LIMIT_LABELS.get(self.limit_kind, (self.limit_kind, ""))
+        return (
+            "## 代码执行超出资源限制，已被终止，减少内存占用、计算量或输出文件大小后重试\n"
+            "### 终端输出：\n"
+            f"{self.llm_stdout}\n"
+            f"### 超出的限制：{label} {self.limit_value} {unit}\n"
+        )
+
 # --- 定义联合类型 ---
 # 使用 Annotated 和 Field(discriminator=...) 可以让 Pydantic 在解析 JSON 时自动选择正确的类
 # 但在 Python 代码中直接实例化具体类即可
 ExecutionResultFromSubThread = Union[ExecutionSuccess, ExecutionFailure]
-ExecutionResult = Union[ExecutionResultFromSubThread, ExecutionTimeout, ExecutionCrashed]
\ No newline at end of file
+ExecutionResult = Union[ExecutionResultFromSubThread, ExecutionTimeout, ExecutionCrashed, ExecutionLimitExceeded]
\ No newline at end of file
@@ -65,3 +65,42 @@ async def msg_role_view(msg:dict):
             name=role_model.RoleNameEnum.UNKNOWN,
             avatar=role_model.AVATARS[role_model.RoleNameEnum.UNKNOWN]
             ).write(msg)
+
+
+async def tool_progress_view(placeholder, tool_stdout_partial: dict[str, str]):
+    """工具执行过程中的实时输出，placeholder 为 st.empty()，每次调用覆盖上一次的内容"""
+    with placeholder.container():
+        with st.chat_message(
+            name=role_model.RoleNameEnum.TOOL,
+            avatar=role_model.AVATARS[role_model.RoleNameEnum.TOOL]
+            ):
+            for purpose, stdout_tail in tool_stdout_partial.items():
+                st.write("执行中："+purpose)
+                st.code(stdout_tail or "（暂无输出）")
+
+
+
+async def assistant_stream_view(placeholder, assistant_partial: dict):
+    """模型流式生成中的 assistant 消息，placeholder 为 st.empty()，每次调用覆盖上一次的内容；工具参数可能还不完整，原样显示"""
+    with placeholder.container():
+        with st.chat_message(
+            name=role_model.RoleNameEnum.ASSISTANT,
+            avatar=role_model.AVATARS[role_model.RoleNameEnum.ASSISTANT]
+            ):
+            if assistant_partial.get("reasoning_content"):
+                st.chat_message(
+                    role_model.RoleNameEnum.REASONING_CONTENT,
+                    avatar=role_model.AVATARS[role_model.RoleNameEnum.REASONING_CONTENT]
+                    ).write(assistant_partial["reasoning_content"])
+            if assistant_partial.get("content"):
+                st.chat_message(
+                    name=role_model.RoleNameEnum.ASSISTANT_CONTENT,
+                    avatar=role_model.AVATARS[role_model.RoleNameEnum.ASSISTANT_CONTENT]
+                    ).write(assistant_partial["content"])
+            for tool_call in assistant_partial.get("tool_calls") or []:
+                with st.chat_message(
+                    name=role_model.RoleNameEnum.TOOL_CALL,
+                    avatar=role_model.AVATARS[role_model.RoleNameEnum.TOOL_CALL]
+                    ):
+                    st.write("生成工具调用："+tool_call["function"]["name"])
+                    st.code(tool_call["function"]["arguments"])
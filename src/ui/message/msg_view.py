@@ -53,7 +53,27 @@ async def msg_view():
 
         role_view.msg_role_view(msg_mem_obj.messages[-1])
         # with st.chat_message("assistant"):  
+        progress_placeholder = None
+        stream_placeholder = None
         async for ret_msg_mem_obj in msg_gen.gen_msg(st.session_state.msg_mem_obj):  
+            if ret_msg_mem_obj.assistant_partial:
+                # 模型流式生成中：在同一个占位符里原地刷新已生成的部分
+                if stream_placeholder is None:
+                    stream_placeholder = st.empty()
+                await role_view.assistant_stream_view(stream_placeholder, ret_msg_mem_obj.assistant_partial)
+                continue
+            if stream_placeholder is not None:
+                stream_placeholder.empty()
+                stream_placeholder = None
+            if ret_msg_mem_obj.tool_stdout_partial:
+                # 工具执行中：在同一个占位符里原地刷新实时输出
+                if progress_placeholder is None:
+                    progress_placeholder = st.empty()
+                await role_view.tool_progress_view(progress_placeholder, ret_msg_mem_obj.tool_stdout_partial)
+                continue
+            if progress_placeholder is not None:
+                progress_placeholder.empty()
+                progress_placeholder = None
             ret_msg_list = ret_msg_mem_obj.messages
             ret_msg = ret_msg_list[-1]
             await role_view.msg_role_view(ret_msg)
@@ -1,6 +1,8 @@
 import logging
 import os
 
+from src.utils import persist_writer
+
 # ------------------------------
 # 全局logger配置（不变）
 # ------------------------------
@@ -48,6 +50,7 @@ def setup_logger(
             encoding="utf-8"
         )
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        # 写文件交给后台线程，见 persist_writer
+        logger.addHandler(persist_writer.background_handler(file_handler))
 
     return logger
\ No newline at end of file
@@ -13,11 +13,31 @@ class MsgMemPath(BaseModel):
             path = static_path.Dir.MSG_DIR / f"nameid.{self.agent_name_id}..msg_head_len_{self.message_len:04d}.json"
         return path.absolute().as_posix()
 
+class MsgJournalPath(BaseModel):
+    """对话记录的追加日志（每条消息一行），与 MsgMemPath 的快照一起恢复完整的对话"""
+    agent_name_id: str
+    def path(self) -> str:
+        path = static_path.Dir.MSG_DIR / f"nameid.{self.agent_name_id}..msg_journal.jsonl"
+        return path.absolute().as_posix()
+
 class RunVarPath(BaseModel):
+    """每轮成功执行后的变量清单（manifest），只记录 变量名 -> 内容哈希"""
     success_cnt: Optional[int] = None
     def path(self) -> str:
         if self.success_cnt is None:
-            path = static_path.Dir.PY_RUNTIME_VAR_DIR / f"all.pkl"
+            path = static_path.Dir.PY_RUNTIME_VAR_DIR / f"all.json"
+        else:
+            path = static_path.Dir.PY_RUNTIME_VAR_DIR / f"success_cnt_{self.success_cnt:04d}.json"
+        return path.absolute().as_posix()
+
+class RunVarBlobPath(BaseModel):
+    """按内容哈希寻址的单个变量 pickle 字节；buffer_index 不为空时表示该变量的第 N 个带外缓冲区"""
+    blob_hash: str
+    buffer_index: Optional[int] = None
+    def path(self) -> str:
+        if self.buffer_index is None:
+            name = f"{self.blob_hash}.pkl"
         else:
-            path = static_path.Dir.PY_RUNTIME_VAR_DIR / f"success_cnt_{self.success_cnt:04d}.pkl"
+            name = f"{self.blob_hash}.buf{self.buffer_index:04d}"
+        path = static_path.Dir.PY_RUNTIME_VAR_DIR / "blobs" / self.blob_hash[:2] / name
         return path.absolute().as_posix()
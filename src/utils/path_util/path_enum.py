@@ -12,6 +12,7 @@ class LogPathEnum(enum.StrEnum):
 class WstPathEnum(enum.StrEnum):
     UPLOAD_DIR_NAME = "./upload_files/"
     SCHEMA_DIR_NAME = "./agent_schema/"
+    LLM_CACHE_DIR_NAME = "./llm_cache/"
     
 class AgentPathEnum(enum.StrEnum):
     MESSAGE_DIR_NAME = "./chat_messages/"
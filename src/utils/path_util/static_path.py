@@ -44,6 +44,8 @@ class Dir:
 
     UPLOAD_DIR: Path = PROJ / path_enum.ProjPathEnum.WST_DIR_NAME / TIME / path_enum.WstPathEnum.UPLOAD_DIR_NAME
     SCHEMA_DIR: Path = PROJ / path_enum.ProjPathEnum.WST_DIR_NAME / TIME / path_enum.WstPathEnum.SCHEMA_DIR_NAME
+    # 不按启动时间区分：重新运行同一会话时命中之前录制的模型响应
+    LLM_CACHE_DIR: Path = PROJ / path_enum.ProjPathEnum.WST_DIR_NAME / path_enum.WstPathEnum.LLM_CACHE_DIR_NAME
     @staticmethod
     def create_all_files():
         # 遍历类的所有属性，筛选出以"PATH"结尾的静态路径变量
@@ -0,0 +1,150 @@
+"""
+后台持久化：对话记录的追加写入、变量存储（var_store.dump_globals）和日志文件写入交给一个后台线程，
+工具结果和下一次模型请求之间不再等待磁盘。
+
+- 任务按提交顺序执行（单线程 FIFO），同一份文件的多次写入保持顺序；
+- 后台线程每次取出队列中已有的全部任务（最多 ALGO_AGENT_PERSIST_BATCH 个）连续执行，
+  调用方可以把同一文件的写入合并到一个任务里（见 msg_journal）；
+- 队列有上限 ALGO_AGENT_PERSIST_QUEUE_MAX（默认 256）：写满时 submit 阻塞等待（背压），内存不会无限增长；
+- flush() 等待此前提交的全部任务完成：summon_agent_generator 结束或被取消时、进程退出时（atexit）调用；
+- ALGO_AGENT_PERSIST_ASYNC=0 时不使用后台线程，submit 直接执行。
+
+日志也经过这里写文件，所以本模块只用标准库 logging，出错时直接输出到 stderr。
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Callable, Optional
+
+ASYNC_ENABLED = os.getenv("ALGO_AGENT_PERSIST_ASYNC", "1") != "0"
+QUEUE_MAX = int(os.getenv("ALGO_AGENT_PERSIST_QUEUE_MAX", "256"))
+BATCH_MAX = int(os.getenv("ALGO_AGENT_PERSIST_BATCH", "64"))
+
+Task = tuple[Callable[..., Any], tuple[Any, ...]]
+
+
+class PersistWriter:
+    def __init__(self, queue_max: int = QUEUE_MAX, batch_max: int = BATCH_MAX):
+        self.batch_max = batch_max
+        self._queue: "queue.Queue[Task]" = queue.Queue(maxsize=queue_max)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.batches = 0
+        self.errors = 0
+        self.backpressure_waits = 0
+        self.backpressure_seconds = 0.0
+
+    def _ensure_started(self) -> None:
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="persist-writer", daemon=True)
+                self._thread.start()
+
+    def _on_writer_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> None:
+        """提交一个写入任务；队列已满时阻塞到有空位"""
+        if self._on_writer_thread():
+            # 任务执行中再提交（如写日志）：直接执行，避免等待自己而死锁
+            self._execute(fn, args)
+            return
+        self._ensure_started()
+        self.submitted += 1
+        try:
+            self._queue.put_nowait((fn, args))
+        except queue.Full:
+            start = time.monotonic()
+            self._queue.put((fn, args))
+            self.backpressure_waits += 1
+            self.backpressure_seconds += time.monotonic() - start
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待此前提交的全部任务完成，超时返回 False"""
+        if self._thread is None or self._on_writer_thread():
+            return True
+        done = threading.Event()
+        self.submit(done.set)
+        return done.wait(timeout)
+
+    def _execute(self, fn: Callable[..., Any], args: tuple[Any, ...]) -> None:
+        try:
+            fn(*args)
+        except Exception:
+            self.errors += 1
+            print(f"后台持久化任务 {getattr(fn, '__qualname__', fn)} 失败：\n{traceback.format_exc()}", file=sys.stderr)
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_max:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for fn, args in batch:
+                self._execute(fn, args)
+                self.completed += 1
+            self.batches += 1
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "pending": self._queue.qsize(),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "batches": self.batches,
+            "errors": self.errors,
+            "backpressure_waits": self.backpressure_waits,
+            "backpressure_seconds": round(self.backpressure_seconds, 3),
+        }
+
+
+_writer = PersistWriter()
+
+
+def submit(fn: Callable[..., Any], *args: Any) -> None:
+    if not ASYNC_ENABLED:
+        fn(*args)
+        return
+    _writer.submit(fn, *args)
+
+
+def flush(timeout: Optional[float] = None) -> bool:
+    return _writer.flush(timeout)
+
+
+def metrics() -> dict[str, Any]:
+    return _writer.metrics()
+
+
+def _reset_after_fork() -> None:
+    # fork 出的子进程中后台线程不存在，队列的锁也可能处于持有状态，重新创建
+    global _writer
+    _writer = PersistWriter(_writer._queue.maxsize, _writer.batch_max)
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+atexit.register(flush)
+
+
+class BackgroundHandler(logging.handlers.QueueHandler):
+    """日志记录在调用线程格式化（合并 args、异常栈），写文件交给后台线程"""
+
+    def __init__(self, target: logging.Handler):
+        super().__init__(queue=None)
+        self.target = target
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        submit(self.target.handle, record)
+
+
+def background_handler(target: logging.Handler) -> logging.Handler:
+    return BackgroundHandler(target) if ASYNC_ENABLED else target
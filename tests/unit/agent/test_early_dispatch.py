@@ -0,0 +1,90 @@
+import asyncio
+import contextvars
+import json
+import time
+
+from src.agent.action import action_early_dispatch
+from src.agent.action import action_type
+from src.agent.tool.sandbox.python_tool import ExecutePythonCodeTool
+from src.runtime.engine import engine_enum
+from src.runtime.status_mgr import var_history
+from src.runtime.status_mgr import var_ws
+from src.utils.path_util import static_path
+
+
+def _args(code):
+    return json.dumps({"tool_call_purpose": "test", "python_code_snippet": code})
+
+
+def test_python_calls_start_early_and_merge_in_call_order(monkeypatch, tmp_path):
+    monkeypatch.setattr(static_path.Dir, "PY_RUNTIME_VAR_DIR", tmp_path)
+    monkeypatch.setattr(var_ws, "arg_globals_list", [])
+    monkeypatch.setattr(var_ws, "out_globals_list", var_history.SnapshotHistory())
+    name = ExecutePythonCodeTool.tool_name()
+    calls = [
+        ("call_0", _args("import time\nstarted = time.time()\nx = 1")),
+        ("call_1", _args("y = x + 1\nprint('y =', y)")),
+        ("call_2", "{not json"),
+    ]
+
+    async def main():
+        dispatcher = action_early_dispatch.EarlyToolDispatcher(contextvars.copy_context())
+        dispatcher.dispatch("call_0", name, calls[0][1])
+        # 模型还在生成后面的调用
+        await asyncio.sleep(0.3)
+        message_done = time.time()
+        descriptors = [
+            action_type.CallDescriptor(kind=action_type.CallKind.TOOL, name=name, arguments=arguments, tool_call_id=call_id)
+            for call_id, arguments in calls
+        ]
+        return message_done, await dispatcher.gather(descriptors)
+
+    message_done, results = asyncio.run(main())
+    assert "y = 2" in results[1]
+    assert "工具函数调用失败" in results[2]
+    workspace = var_ws.get_arg_globals()
+    assert (workspace["x"], workspace["y"]) == (1, 2)
+    # 第一个调用在消息结束前就已开始执行
+    assert workspace["started"] < message_done
+
+
+def test_stale_early_python_calls_are_discarded(monkeypatch, tmp_path):
+    monkeypatch.setattr(static_path.Dir, "PY_RUNTIME_VAR_DIR", tmp_path)
+    name = ExecutePythonCodeTool.tool_name()
+    final = [("call_0", _args("x = 10")), ("call_1", _args("y = x + 1"))]
+    # 参数在提前执行后发生变化 / 提前执行的调用不在最终消息中
+    for early_id, early_code in [("call_0", "x = 1\nstale = True"), ("call_9", "stale = True")]:
+        monkeypatch.setattr(var_ws, "arg_globals_list", [])
+        monkeypatch.setattr(var_ws, "out_globals_list", var_history.SnapshotHistory())
+
+        async def main():
+            dispatcher = action_early_dispatch.EarlyToolDispatcher(contextvars.copy_context())
+            dispatcher.dispatch(early_id, name, _args(early_code))
+            await asyncio.sleep(0.2)
+            descriptors = [
+                action_type.CallDescriptor(kind=action_type.CallKind.TOOL, name=name, arguments=arguments, tool_call_id=call_id)
+                for call_id, arguments in final
+            ]
+            return await dispatcher.gather(descriptors)
+
+        asyncio.run(main())
+        workspace = var_ws.get_arg_globals()
+        assert "stale" not in workspace
+        assert (workspace["x"], workspace["y"]) == (10, 11)
+        assert len(var_ws.out_globals_list) == 2
+
+
+def test_python_calls_wait_for_the_message_on_resident_engines(monkeypatch):
+    monkeypatch.setattr(engine_enum, "default_executor_engine", engine_enum.ExecutorEngine.KERNEL)
+    name = ExecutePythonCodeTool.tool_name()
+
+    async def main():
+        dispatcher = action_early_dispatch.EarlyToolDispatcher(contextvars.copy_context())
+        dispatcher.dispatch("call_0", name, _args("x = 1"))
+        started = dict(dispatcher._started)
+        dispatcher.cancel()
+        return started, dispatcher._python_batch
+
+    started, batch = asyncio.run(main())
+    assert started == {}
+    assert batch is None
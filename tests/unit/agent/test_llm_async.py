@@ -0,0 +1,167 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.agent import llm
+from src.agent.llm_client import async_pool
+from src.agent.llm_client import stream_assembler
+from src.agent.msg import msg_mem
+
+DELAY = 0.4
+
+
+def _chunk(delta, finish_reason=None):
+    return {
+        "id": "c", "object": "chat.completion.chunk", "created": 0, "model": "m",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+STREAM_CHUNKS = [
+    _chunk({"role": "assistant", "reasoning_content": "想一想"}),
+    _chunk({"content": "先算"}),
+    _chunk({"content": "一下"}),
+    _chunk({"tool_calls": [{"index": 0, "id": "call_0", "type": "function",
+                            "function": {"name": "execute_python_code", "arguments": '{"python_code_'}}]}),
+    _chunk({"tool_calls": [{"index": 0, "function": {"arguments": 'snippet": "x = 1"}'}}]}),
+    _chunk({"tool_calls": [{"index": 1, "id": "call_1", "type": "function",
+                            "function": {"name": "other", "arguments": "{}"}}]}),
+    _chunk({}, "tool_calls"),
+]
+STREAM_USAGE = {"prompt_tokens": 123, "completion_tokens": 45, "total_tokens": 168}
+
+
+class _SlowCompletionHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if request.get("stream"):
+            self._stream(request.get("stream_options") or {})
+            return
+        time.sleep(DELAY)
+        body = json.dumps({
+            "id": "c", "object": "chat.completion", "created": 0, "model": "m",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "ok"}}],
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, stream_options):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        chunks = list(STREAM_CHUNKS)
+        if stream_options.get("include_usage"):
+            chunks.append({**_chunk({}), "choices": [], "usage": STREAM_USAGE})
+        for chunk in chunks:
+            time.sleep(0.05)
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SlowCompletionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+
+
+def test_client_is_shared_per_event_loop(base_url):
+    async def get_pair():
+        return async_pool.get_async_client("k", base_url), async_pool.get_async_client("k", base_url)
+
+    first, second = asyncio.run(get_pair())
+    assert first is second
+    other, _ = asyncio.run(get_pair())
+    assert other is not first
+
+
+def test_concurrent_agents_have_completions_in_flight(base_url, monkeypatch):
+    monkeypatch.setattr(llm.chat_llm, "async_client", lambda: async_pool.get_async_client("k", base_url))
+
+    async def main():
+        mems = [msg_mem.init_messages_with_system_prompt(f"agent_{i}", "sys", "hi") for i in range(6)]
+        start = time.monotonic()
+        replies = await asyncio.gather(*(llm.run_llm_once_async(mem, None) for mem in mems))
+        elapsed = time.monotonic() - start
+        await async_pool.aclose_all()
+        return mems, replies, elapsed
+
+    mems, replies, elapsed = asyncio.run(main())
+    assert [reply.content for reply in replies] == ["ok"] * 6
+    assert all(mem.messages[-1]["content"] == "ok" for mem in mems)
+    # 6 个请求同时在途，而不是依次等待
+    assert elapsed < DELAY * 3
+
+
+def test_stream_assembler_builds_message_from_chunks():
+    from openai.types.chat import ChatCompletionChunk
+    assembler = stream_assembler.StreamAssembler()
+    outputs = [assembler.add_chunk(ChatCompletionChunk.model_validate(chunk)) for chunk in STREAM_CHUNKS]
+    assert outputs == [True] * 6 + [False]
+    message = assembler.to_message()
+    assert message.content == "先算一下"
+    assert message.model_dump()["reasoning_content"] == "想一想"
+    assert [(c.id, c.function.name, c.function.arguments) for c in message.tool_calls] == [
+        ("call_0", "execute_python_code", '{"python_code_snippet": "x = 1"}'),
+        ("call_1", "other", "{}"),
+    ]
+    assert assembler.finish_reason == "tool_calls"
+
+
+def test_ready_tool_calls_are_taken_in_call_order():
+    from openai.types.chat import ChatCompletionChunk
+    assembler = stream_assembler.StreamAssembler()
+    for chunk in STREAM_CHUNKS[:4]:
+        assembler.add_chunk(ChatCompletionChunk.model_validate(chunk))
+    assert assembler.take_ready_tool_calls() == []
+    assembler.add_chunk(ChatCompletionChunk.model_validate(STREAM_CHUNKS[4]))
+    assert [parts.id for parts in assembler.take_ready_tool_calls()] == ["call_0"]
+    assert assembler.take_ready_tool_calls() == []
+
+    # 前一个调用的参数还不完整时，后面的调用即使完整也不返回
+    assembler = stream_assembler.StreamAssembler()
+    for chunk in STREAM_CHUNKS[:4] + STREAM_CHUNKS[5:6]:
+        assembler.add_chunk(ChatCompletionChunk.model_validate(chunk))
+    assert assembler.take_ready_tool_calls() == []
+
+
+def test_llm_stream_yields_partials_then_appends_message(base_url, monkeypatch):
+    monkeypatch.setattr(llm.chat_llm, "async_client", lambda: async_pool.get_async_client("k", base_url))
+    monkeypatch.setattr(llm, "STREAM_YIELD_INTERVAL", 0.0)
+
+    async def main():
+        mem = msg_mem.init_messages_with_system_prompt("stream_agent", "sys", "hi")
+        stream = llm.LLMStream(mem, None, stream=True, on_tool_call_ready=lambda *call: ready.append(call))
+        partials = [dict(m.assistant_partial) async for m in stream]
+        await async_pool.aclose_all()
+        return mem, stream, partials
+
+    ready = []
+    mem, stream, partials = asyncio.run(main())
+    assert ready == [
+        ("call_0", "execute_python_code", '{"python_code_snippet": "x = 1"}'),
+        ("call_1", "other", "{}"),
+    ]
+    assert len(partials) >= 3
+    assert partials[0]["reasoning_content"] == "想一想"
+    assert any(p["content"] == "先算" for p in partials)
+    assert mem.assistant_partial is None
+    assert stream.message.tool_calls[0].function.name == "execute_python_code"
+    assert mem.messages[-1]["content"] == "先算一下" and mem.finish_reason == "tool_calls"
+    assert 0 < stream.ttft_seconds < 0.3
+    # 用量取自服务端返回的最后一个片段，而不是本地估计
+    turn = mem.usage_ledger[-1]
+    assert (turn.prompt_tokens, turn.completion_tokens, turn.estimated) == (123, 45, False)
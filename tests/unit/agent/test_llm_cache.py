@@ -0,0 +1,86 @@
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+from openai.types.chat.chat_completion import ChatCompletion
+
+from src.agent import llm
+from src.agent.llm_client import response_cache
+from src.agent.msg import msg_mem
+from src.runtime.status_mgr import output_budget
+from src.utils.path_util import static_path
+
+
+def _completion(content):
+    return ChatCompletion.model_validate({
+        "id": "c", "object": "chat.completion", "created": 0, "model": "m",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+    })
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    cache = response_cache.ResponseCache(tmp_path)
+    monkeypatch.setattr(response_cache, "_cache", cache)
+    return cache
+
+
+def test_request_key_ignores_none_fields_and_key_order():
+    a = {"model": "m", "messages": [{"role": "assistant", "content": "x", "audio": None}], "tools": None}
+    b = {"messages": [{"content": "x", "role": "assistant"}], "model": "m"}
+    assert response_cache.request_key(a) == response_cache.request_key(b)
+    assert response_cache.request_key(a) != response_cache.request_key({**b, "temperature": 0.2})
+    # max_tokens 随剩余预算变化（缓存命中不计入已用量），不参与键
+    assert response_cache.request_key(a) == response_cache.request_key({**b, "max_tokens": 50})
+
+
+def test_request_key_is_stable_across_runs_with_spilled_output(monkeypatch, tmp_path):
+    def key_in_run(run_dir):
+        monkeypatch.setattr(static_path.Dir, "PY_OUTPUT_DIR", tmp_path / run_dir)
+        truncated = output_budget.truncate("x" * 100, budget=10)
+        message = {"role": "tool", "tool_call_id": "call_0", "content": truncated.text}
+        return truncated.spill_path, response_cache.request_key({"model": "m", "messages": [message]})
+
+    first_path, first_key = key_in_run("0001_run")
+    second_path, second_key = key_in_run("0002_run")
+    assert first_path != second_path
+    assert os.path.basename(first_path) == os.path.basename(second_path)
+    assert first_key == second_key
+
+
+def test_record_then_strict_replay_through_llm(cache, monkeypatch):
+    calls = []
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        create=lambda **params: calls.append(params) or _completion("ok"),
+    )))
+    monkeypatch.setattr(llm.chat_llm, "client", fake_client)
+
+    monkeypatch.setattr(response_cache, "MODE", response_cache.CacheMode.RECORD)
+    for _ in range(2):
+        mem = msg_mem.init_messages_with_system_prompt("cache_agent", "sys", "hi")
+        assert llm.run_llm_once(mem, None).content == "ok"
+    assert len(calls) == 1
+    assert cache.metrics()["hits"] == 1 and cache.metrics()["writes"] == 1
+
+    monkeypatch.setattr(response_cache, "MODE", response_cache.CacheMode.REPLAY)
+    mem = msg_mem.init_messages_with_system_prompt("cache_agent", "sys", "hi")
+    assert llm.run_llm_once(mem, None).content == "ok"
+    mem = msg_mem.init_messages_with_system_prompt("cache_agent", "sys", "没有录制过")
+    with pytest.raises(response_cache.CacheMissError):
+        llm.run_llm_once(mem, None)
+    assert len(calls) == 1
+
+
+def test_eviction_keeps_store_under_budget_and_drops_least_recent(cache):
+    size = len(_completion("x" * 1000).model_dump_json())
+    cache.max_bytes = size * 3
+    keys = [f"{i:02d}" + "0" * 62 for i in range(5)]
+    for i, key in enumerate(keys):
+        cache.put(key, _completion("x" * 1000))
+        # mtime 的精度有限，显式拉开间隔
+        os.utime(cache._path(key), (time.time() - 100 + i, time.time() - 100 + i))
+    metrics = cache.metrics()
+    assert metrics["bytes"] <= cache.max_bytes and metrics["evictions"] >= 2
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[-1]) is not None
@@ -0,0 +1,52 @@
+import json
+
+from openai.types.chat import ChatCompletionMessage
+
+from src.agent.msg import msg_compact
+from src.agent.msg import msg_ctr
+from src.agent.msg import msg_mem
+from src.agent.msg import msg_tokens
+
+
+def _add_round(mem, i, failed=False):
+    call_id = f"call_{i}"
+    arguments = json.dumps({"tool_call_purpose": f"第 {i} 步", "python_code_snippet": f"x{i} = {i}\n" + "# 注释\n" * 50})
+    mem.add_message(ChatCompletionMessage.model_validate({
+        "role": "assistant", "content": f"第 {i} 步", "reasoning_content": "思考" * 200,
+        "tool_calls": [{"id": call_id, "type": "function",
+                        "function": {"name": "execute_python_code", "arguments": arguments}}],
+    }), "tool_calls")
+    header = "## 代码执行失败，代码抛出异常，根据报错信息进行调试\n" if failed else "## 代码执行成功，输出结果完整，任务完成\n"
+    mem.add_message({"role": "tool", "tool_call_id": call_id, "content": header + f"输出 {i}\n" * 400})
+
+
+def test_compaction_respects_budget_and_keeps_prefix_stable():
+    mem = msg_mem.init_messages_with_system_prompt(
+        "compact_agent", "sys", "任务", msg_ctr.MessageControlConfig(context_token_budget=9000),
+    )
+    for i in range(8):
+        _add_round(mem, i, failed=(i == 1))
+    full = [dict(m) for m in mem.messages]
+
+    view = msg_compact.request_messages(mem)
+    assert sum(msg_tokens.estimate_message_tokens(m) for m in view) <= 9000
+    # 完整历史不变，system / 任务和最近的消息原样发送
+    assert mem.messages == full
+    assert view[:2] == full[:2] and view[-msg_compact.KEEP_RECENT:] == full[-msg_compact.KEEP_RECENT:]
+    assert view[3]["content"].startswith(msg_compact.ELIDED_MARK)
+    assert "reasoning_content" not in view[2]
+    failed_code = json.loads(view[4]["tool_calls"][0]["function"]["arguments"])["python_code_snippet"]
+    assert "执行失败" in failed_code and "x1" not in failed_code
+
+    # 下一轮：预算内时边界不动，已压缩的前缀逐字节相同
+    boundary = mem.compact_boundary
+    _add_round(mem, 8)
+    next_view = msg_compact.request_messages(mem)
+    assert mem.compact_boundary >= boundary
+    assert json.dumps(next_view[:boundary], ensure_ascii=False) == json.dumps(view[:boundary], ensure_ascii=False)
+
+
+def test_no_budget_sends_history_unchanged():
+    mem = msg_mem.init_messages_with_system_prompt("compact_agent", "sys", "任务", msg_ctr.MessageControlConfig())
+    _add_round(mem, 0)
+    assert msg_compact.request_messages(mem) is mem.messages
@@ -0,0 +1,76 @@
+import json
+
+from openai.types.chat.chat_completion import ChatCompletionMessage
+from openai.types.completion_usage import CompletionUsage
+
+from src.agent.msg import msg_mem
+from src.agent.msg import msg_journal
+from src.agent.msg import msg_tokens
+from src.utils import persist_writer
+from src.utils.path_util import static_path
+
+
+def _assistant(i):
+    return ChatCompletionMessage.model_validate({"role": "assistant", "content": f"第 {i} 轮", "reasoning_content": "想一想"})
+
+
+def _add_turn(mem, i):
+    mem.usage_ledger.append(msg_tokens.TurnUsage(turn=len(mem.messages), prompt_tokens=10, completion_tokens=i))
+    mem.usage = CompletionUsage(prompt_tokens=10 * i, completion_tokens=i, total_tokens=11 * i)
+    mem.add_message(_assistant(i), "tool_calls")
+    mem.add_message({"role": "tool", "tool_call_id": f"call_{i}", "content": f"输出 {i}"})
+
+
+def test_messages_are_appended_and_restored_from_snapshot_plus_tail(monkeypatch, tmp_path):
+    monkeypatch.setattr(static_path.Dir, "MSG_DIR", tmp_path)
+    monkeypatch.setattr(msg_journal, "SNAPSHOT_EVERY", 4)
+    mem = msg_mem.init_messages_with_system_prompt("journal_agent", "sys", "hi")
+    for i in range(1, 4):
+        _add_turn(mem, i)
+    journal = mem._journal
+    assert persist_writer.flush(timeout=5)
+
+    # 第一条消息写快照，之后追加；第 4 条追加后重写快照并清空日志，剩下 1 条在日志中
+    lines = journal.journal_path.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["seq"] for line in lines] == [8]
+    snapshot = json.loads(journal.snapshot_path.read_text(encoding="utf-8"))
+    assert len(snapshot["messages"]) == 7
+    assert snapshot["messages"][2]["reasoning_content"] == "想一想"
+
+    # 写入中途崩溃：最后一行不完整
+    with open(journal.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"seq": 9, "mess')
+
+    restored = msg_journal.load_memory(mem.agent_name_id)
+    assert restored.agent_name_id == mem.agent_name_id
+    assert restored.messages == json.loads(json.dumps(mem.messages, default=lambda o: o.model_dump()))
+    assert restored.usage == mem.usage
+    assert restored.usage_ledger == mem.usage_ledger
+    assert restored.finish_reason == "tool_calls"
+
+    # 恢复后继续写入同一份记录
+    with open(journal.journal_path, "w", encoding="utf-8") as f:
+        f.writelines(line + "\n" for line in lines)
+    restored = msg_journal.load_memory(mem.agent_name_id)
+    _add_turn(restored, 4)
+    again = msg_journal.load_memory(mem.agent_name_id)
+    assert len(again.messages) == 10
+    assert [turn.completion_tokens for turn in again.usage_ledger] == [1, 2, 3, 4]
+
+
+def test_records_already_in_snapshot_are_skipped(monkeypatch, tmp_path):
+    monkeypatch.setattr(static_path.Dir, "MSG_DIR", tmp_path)
+    mem = msg_mem.init_messages_with_system_prompt("journal_skip_agent", "sys", "hi")
+    _add_turn(mem, 1)
+    _add_turn(mem, 2)
+    journal = mem._journal
+    assert persist_writer.flush(timeout=5)
+    lines = journal.journal_path.read_text(encoding="utf-8")
+    # 快照已重写、日志还没清空时崩溃
+    journal.write_snapshot(mem)
+    assert persist_writer.flush(timeout=5)
+    journal.journal_path.write_text(lines, encoding="utf-8")
+
+    restored = msg_journal.load_memory(mem.agent_name_id)
+    assert len(restored.messages) == len(mem.messages) == 6
+    assert len(restored.usage_ledger) == 2
@@ -0,0 +1,87 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from openai.types.chat.chat_completion import ChatCompletion
+
+from src.agent import llm
+from src.agent.llm_client import response_cache
+from src.agent.msg import msg_ctr
+from src.agent.msg import msg_mem
+from src.agent.msg import msg_tokens
+
+
+def _completion(content, usage=None):
+    return ChatCompletion.model_validate({
+        "id": "c", "object": "chat.completion", "created": 0, "model": "m", "usage": usage,
+        "choices": [{"index": 0, "finish_reason": "tool_calls", "message": {"role": "assistant", "content": content}}],
+    })
+
+
+def test_estimate_counts_cjk_per_char_and_latin_per_four_chars():
+    assert msg_tokens.estimate_text_tokens("你好，世界") == 5
+    assert msg_tokens.estimate_text_tokens("abcdefgh") == 2
+    assert msg_tokens.estimate_message_tokens({"role": "user", "content": "abcd"}) == 5
+
+
+def test_usage_is_accumulated_per_turn_and_budget_enforced_before_sending(monkeypatch, tmp_path):
+    monkeypatch.setattr(msg_tokens, "USAGE_METRICS_FILE", tmp_path / "token_usage.json")
+    sent = []
+    usages = [{"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120}, None]
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        create=lambda **params: sent.append(params) or _completion("好的" * 10, usages[len(sent) - 1]),
+    )))
+    monkeypatch.setattr(llm.chat_llm, "client", fake_client)
+    config = msg_ctr.MessageControlConfig(max_tokens_per_turn=50, max_tokens_all_turn=200)
+    mem = msg_mem.init_messages_with_system_prompt("token_agent", "sys", "hi", config)
+
+    llm.run_llm_once(mem, None)
+    # 第二次：服务商没有返回 usage，由本地估计
+    llm.run_llm_once(mem, None)
+    # 第二次的上限是总预算扣除已用量和 prompt 的估计
+    assert sent[0]["max_tokens"] == 50
+    assert sent[1]["max_tokens"] == 200 - 120 - msg_tokens.estimate_messages_tokens(mem.messages[:3])
+    assert [turn.turn for turn in mem.usage_ledger] == [2, 3]
+    first, second = mem.usage_ledger
+    assert (first.prompt_tokens, first.completion_tokens, first.estimated) == (100, 20, False)
+    assert second.estimated and second.completion_tokens == msg_tokens.estimate_message_tokens(mem.messages[-1])
+    assert mem.usage.total_tokens == first.total_tokens + second.total_tokens
+
+    metrics = json.loads((tmp_path / "token_usage.json").read_text(encoding="utf-8"))[mem.agent_name_id]
+    assert metrics["requests"] == 2 and metrics["estimated_requests"] == 1
+    assert metrics["total_tokens"] == mem.usage.total_tokens
+
+    # 剩余预算不够本次 prompt：不发送请求
+    mem.usage_ledger.clear()
+    mem.usage = mem.usage.model_copy(update={"total_tokens": 195})
+    with pytest.raises(msg_tokens.TokenBudgetExceeded):
+        llm.run_llm_once(mem, None)
+    assert len(sent) == 2
+
+
+def test_cached_responses_are_not_counted_as_spent(monkeypatch, tmp_path):
+    monkeypatch.setattr(msg_tokens, "USAGE_METRICS_FILE", tmp_path / "token_usage.json")
+    monkeypatch.setattr(msg_tokens, "PRICE_PROMPT", 1.0)
+    monkeypatch.setattr(response_cache, "_cache", response_cache.ResponseCache(tmp_path / "cache"))
+    monkeypatch.setattr(response_cache, "MODE", response_cache.CacheMode.RECORD)
+    sent = []
+    usage = {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120}
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        create=lambda **params: sent.append(params) or _completion("好的", usage),
+    )))
+    monkeypatch.setattr(llm.chat_llm, "client", fake_client)
+    config = msg_ctr.MessageControlConfig(max_tokens_all_turn=1000)
+
+    recorded = msg_mem.init_messages_with_system_prompt("cache_token_agent", "sys", "hi", config)
+    llm.run_llm_once(recorded, None)
+    # 同样的请求再来一次：命中缓存，记入账本但不计入已用量和费用
+    mem = msg_mem.init_messages_with_system_prompt("cache_token_agent", "sys", "hi", config)
+    llm.run_llm_once(mem, None)
+    assert len(sent) == 1
+    turn = mem.usage_ledger[-1]
+    assert turn.cached and (turn.prompt_tokens, turn.completion_tokens, turn.cost) == (100, 20, 0.0)
+    assert mem.usage is None
+    assert msg_tokens.preflight(mem, mem.messages) == 1000 - msg_tokens.estimate_messages_tokens(mem.messages)
+
+    metrics = json.loads((tmp_path / "token_usage.json").read_text(encoding="utf-8"))[mem.agent_name_id]
+    assert metrics["cached_requests"] == 1 and metrics["requests"] == 0 and metrics["cost"] == 0
@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+import pytest
+
+from src.runtime.engine import engine_enum
+from src.runtime.engine import engine_router
+from src.runtime.sub_process import subprocess_python_executor
+from src.runtime.sub_thread.subthread_schemas import (
+    ExecutionSuccess,
+    ExecutionTimeout,
+)
+
+
+def test_thread_engine_does_not_block_event_loop():
+    async def ticker(ticks: list[float]):
+        for _ in range(10):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.05)
+
+    async def main():
+        ticks: list[float] = []
+        code = "import time\ntime.sleep(1)\nx = 1"
+        start = time.monotonic()
+        results = await asyncio.gather(
+            engine_router.run_structured_async(code, {}, timeout=5, engine=engine_enum.ExecutorEngine.THREAD),
+            engine_router.run_structured_async(code, {}, timeout=5, engine=engine_enum.ExecutorEngine.THREAD),
+            ticker(ticks),
+        )
+        return results, ticks, time.monotonic() - start
+
+    (res_a, res_b, _), ticks, elapsed = asyncio.run(main())
+    assert isinstance(res_a, ExecutionSuccess) and res_a.arg_chg_globals["x"] == 1
+    # 线程模式共享进程的 I/O 计数，不统计写入量
+    assert res_a.resource_usage.bytes_written is None
+    assert isinstance(res_b, ExecutionSuccess)
+    # 两个执行重叠（依次执行需要 2 秒）；阈值留出余量，不受偶发的 GC 停顿影响
+    assert elapsed < 1.6
+    # 事件循环在执行期间照常调度：阻塞时会出现约 1 秒的间隔
+    assert len(ticks) == 10
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.5
+
+
+def test_thread_engine_timeout():
+    res = asyncio.run(engine_router.run_structured_async(
+        "import time\ntime.sleep(1)", {}, timeout=0.2, engine=engine_enum.ExecutorEngine.THREAD,
+    ))
+    assert isinstance(res, ExecutionTimeout)
+
+
+def test_process_engine_cancel_kills_worker():
+    pool = subprocess_python_executor.get_default_pool()
+
+    async def main():
+        task = asyncio.create_task(engine_router.run_structured_async(
+            "import os, time\nprint(os.getpid(), flush=True)\ntime.sleep(30)", {}, timeout=60,
+            engine=engine_enum.ExecutorEngine.PROCESS,
+        ))
+        await asyncio.sleep(1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    # 被取消的 worker 已被替换，池中的 worker 仍然可用
+    deadline = time.monotonic() + 5
+    res = pool.run("y = 2", {}, timeout=10)
+    assert time.monotonic() < deadline
+    assert isinstance(res, ExecutionSuccess) and res.arg_chg_globals["y"] == 2
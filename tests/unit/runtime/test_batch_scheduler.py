@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+from src.runtime.engine import batch_scheduler
+from src.runtime.engine import engine_enum
+from src.runtime.engine import engine_router
+from src.runtime.status_mgr import var_snapshot
+from src.runtime.sub_thread.subthread_schemas import ExecutionFailure, ExecutionSuccess
+
+
+def _run(commands, base_globals=None):
+    base = var_snapshot.take_snapshot(base_globals or {})
+
+    async def run_one(index, execution_context, start):
+        with var_snapshot.track_changes(start, execution_context):
+            return await engine_router.run_structured_async(
+                commands[index], execution_context, timeout=10, engine=engine_enum.ExecutorEngine.THREAD,
+            )
+
+    async def main():
+        start = time.monotonic()
+        items = await batch_scheduler.run_batch_async(commands, base, run_one)
+        return items, time.monotonic() - start
+
+    return asyncio.run(main())
+
+
+def test_plan_dependencies_uses_read_write_sets():
+    deps = batch_scheduler.plan_dependencies([
+        "a = 1",
+        "b = 2",
+        "c = a + 1",
+        "print(b)\nd = [c]",
+        "e = eval('a')",
+    ])
+    assert deps == [frozenset(), frozenset(), frozenset({0}), frozenset({1, 2}), frozenset({0, 1, 2, 3})]
+
+
+def test_method_calls_and_call_arguments_count_as_writes():
+    cases = [
+        ["model.fit(X, y)", "print(model.predict(X))"],
+        ["G.add_edge(1, 2)", "n = G.number_of_edges()"],
+        ["solver.Solve()", "v = solver.Value(x)"],
+        ["fill(buffer)", "total = sum(buffer)"],
+        ["[last := v for v in values]", "print(last)"],
+    ]
+    for commands in cases:
+        assert batch_scheduler.plan_dependencies(commands) == [frozenset(), frozenset({0})], commands
+
+
+def test_del_depends_on_the_snippet_that_binds_the_name():
+    assert batch_scheduler.plan_dependencies(["x = 1", "del x"]) == [frozenset(), frozenset({0})]
+    items, _ = _run(["x = 1", "del x"])
+    assert all(isinstance(item.result, ExecutionSuccess) for item in items)
+    assert "x" not in items[-1].merged_snapshot.restore()
+
+
+def test_method_calls_on_modules_are_not_writes():
+    # 预先注入的别名和本段代码中 import 的模块
+    assert batch_scheduler.plan_dependencies(["a = np.ones(3)", "b = np.zeros(3)"]) == [frozenset(), frozenset()]
+    assert batch_scheduler.plan_dependencies([
+        "import numpy\na = numpy.ones(3)",
+        "import numpy\nb = numpy.zeros(3)\nprint(a)",
+    ]) == [frozenset(), frozenset({0})]
+    # 作为参数传入模块函数的变量仍算作可能的写入
+    assert batch_scheduler.plan_dependencies(["np.random.shuffle(xs)", "print(xs)"]) == [frozenset(), frozenset({0})]
+
+
+def test_independent_numpy_snippets_run_in_parallel():
+    sleep = "import time\nimport numpy as np\ntime.sleep(1)\n"
+    items, elapsed = _run([sleep + "a = np.ones(3)", sleep + "b = np.zeros(3)"])
+    assert elapsed < 1.6
+    assert all(isinstance(item.result, ExecutionSuccess) for item in items)
+    merged = items[-1].merged_snapshot.restore()
+    assert merged["a"].sum() == 3 and merged["b"].sum() == 0
+
+
+def test_walrus_in_comprehension_binds_in_enclosing_scope():
+    from src.runtime.status_mgr import code_cache
+    analysis = code_cache.analyze("found = [y for x in xs if (y := f(x))]\nprint(y)")
+    assert "y" in analysis.writes and "y" not in analysis.reads
+
+
+def test_independent_snippets_run_in_parallel_and_merge_in_call_order():
+    sleep = "import time\ntime.sleep(1)\n"
+    items, elapsed = _run([
+        sleep + "x = base + 1\nshared = 'first'",
+        sleep + "y = base + 2\nshared = 'second'",
+        "z = x + y",
+    ], {"base": 10})
+    # 前两个并行（依次执行需要 2 秒），第三个等待两者；阈值留出余量，不受偶发的 GC 停顿影响
+    assert elapsed < 1.6
+    assert all(isinstance(item.result, ExecutionSuccess) for item in items)
+    assert items[2].result.arg_chg_globals["z"] == 23
+    merged = items[-1].merged_snapshot.restore()
+    assert (merged["x"], merged["y"], merged["z"], merged["base"]) == (11, 12, 23, 10)
+    # 同名变量按调用顺序合并，后者覆盖前者
+    assert merged["shared"] == "second"
+    assert "y" not in items[0].merged_snapshot.vars
+
+
+def test_failed_snippet_contributes_no_changes():
+    items, _ = _run(["x = 1\n1/0", "y = 2", "print(x)"], {"x": 0})
+    assert isinstance(items[0].result, ExecutionFailure) and items[0].merged_snapshot is None
+    assert items[2].result.ret_stdout == "0\n"
+    assert items[-1].merged_snapshot.restore() == {"x": 0, "y": 2}
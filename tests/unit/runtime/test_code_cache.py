@@ -0,0 +1,45 @@
+from src.runtime.engine import engine_enum
+from src.runtime.engine import engine_router
+from src.runtime.status_mgr import code_cache
+from src.runtime.sub_thread.subthread_schemas import ExecutionFailure, ExecutionSuccess
+
+
+def test_analysis_reads_writes_imports():
+    code = (
+        "import numpy as np\n"
+        "x = 1\n"
+        "y = x + z\n"
+        "def f(a):\n"
+        "    return a + w\n"
+        "df['c'] = [i for i in items]\n"
+        "print(len(y))\n"
+    )
+    analysis = code_cache.analyze(code)
+    assert not analysis.has_syntax_error
+    # x 在读取之前已赋值，不算外部依赖；内置名字和推导式变量也不算
+    assert analysis.reads == {"z", "w", "df", "items"}
+    assert analysis.writes == {"np", "x", "y", "f", "df"}
+    assert analysis.imports == ("numpy",)
+
+
+def test_compiled_code_is_cached():
+    code = "cache_probe = 40 + 2"
+    before = code_cache.cache_info()
+    first = code_cache.compile_cached(code)
+    second = code_cache.compile_cached(code)
+    after = code_cache.cache_info()
+    assert first is second
+    assert after["hits"] - before["hits"] >= 1
+    res = engine_router.run_structured(code, {}, timeout=10, engine=engine_enum.ExecutorEngine.THREAD)
+    assert isinstance(res, ExecutionSuccess) and res.arg_chg_globals["cache_probe"] == 42
+
+
+def test_syntax_error_fails_before_execution():
+    res = engine_router.run_structured("print('never')\nx = = 1", {}, timeout=10, engine=engine_enum.ExecutorEngine.THREAD)
+    assert isinstance(res, ExecutionFailure)
+    assert res.exception_type == "SyntaxError"
+    assert res.exec_timeout == 0.0
+    assert res.ret_stdout == ""
+    assert 'File "<string>", line 2' in res.exception_traceback
+    # 内核引擎支持 IPython 语法，不做预检查
+    assert engine_router.precheck("%timeit x", engine=engine_enum.ExecutorEngine.KERNEL) is None
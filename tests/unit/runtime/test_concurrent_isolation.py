@@ -0,0 +1,60 @@
+import asyncio
+import os
+
+from src.runtime.ctx_mgr import cwd
+from src.runtime.sub_thread.subthread_python_executor import run_structured_in_thread
+from src.runtime.sub_thread.subthread_schemas import ExecutionSuccess
+from src.utils.path_util import static_path
+
+
+def test_concurrent_executions_keep_their_own_stdout_and_cwd():
+    code = (
+        "import os, time\n"
+        "for i in range(5):\n"
+        "    print(name, i, os.getcwd())\n"
+        "    time.sleep(0.05)\n"
+    )
+    original_dir = os.getcwd()
+
+    async def main():
+        return await asyncio.gather(
+            asyncio.to_thread(run_structured_in_thread, code, {"name": "A"}, None, 10),
+            asyncio.to_thread(run_structured_in_thread, code, {"name": "B"}, None, 10),
+        )
+
+    res_a, res_b = asyncio.run(main())
+    target_dir = static_path.Dir.PY_OUTPUT_DIR.resolve().as_posix()
+    for res, name, other in ((res_a, "A", "B"), (res_b, "B", "A")):
+        assert isinstance(res, ExecutionSuccess)
+        lines = res.ret_stdout.splitlines()
+        assert len(lines) == 5
+        assert all(line.startswith(f"{name} ") for line in lines)
+        assert all(line.endswith(target_dir) for line in lines)
+    assert os.getcwd() == original_dir
+
+
+def test_change_stdout_only_affects_current_context(capsys):
+    class _Buffer(list):
+        def write(self, msg):
+            self.append(msg)
+
+        def flush(self):
+            pass
+
+    buffer = _Buffer()
+
+    async def inside():
+        with cwd.Change_STDOUT_STDERR(buffer):
+            await asyncio.sleep(0.05)
+            print("inside")
+
+    async def outside():
+        await asyncio.sleep(0.01)
+        print("outside")
+
+    async def main():
+        await asyncio.gather(inside(), outside())
+
+    asyncio.run(main())
+    assert "".join(buffer) == "inside\n"
+    assert "outside" in capsys.readouterr().out
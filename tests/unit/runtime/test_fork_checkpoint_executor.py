@@ -0,0 +1,75 @@
+import pytest
+
+from src.runtime.sub_process import fork_checkpoint_executor
+from src.runtime.sub_process.fork_checkpoint_executor import CheckpointSession
+from src.runtime.sub_thread.subthread_schemas import (
+    ExecutionSuccess,
+    ExecutionFailure,
+    ExecutionTimeout,
+    ExecutionCrashed,
+)
+
+pytestmark = pytest.mark.skipif(not fork_checkpoint_executor.is_supported(), reason="需要 os.fork")
+
+
+@pytest.fixture(scope="module")
+def session():
+    session = CheckpointSession("test-fork", warm_modules="", depth=3)
+    yield session
+    session.shutdown()
+
+
+def test_state_stays_resident_including_unpicklable_objects(session):
+    res = session.run("import threading\nlock = threading.Lock()\nx = seed + 1", {"seed": 40}, timeout=10)
+    assert isinstance(res, ExecutionSuccess)
+    res = session.run("x += 1\nprint(x, lock.locked())", timeout=10)
+    assert isinstance(res, ExecutionSuccess)
+    assert res.ret_stdout == "42 False\n"
+
+
+def test_failure_timeout_and_crash_roll_back(session):
+    res = session.run("x = -1\ndata = [0] * 10**6\n1/0", timeout=10)
+    assert isinstance(res, ExecutionFailure) and res.exception_type == "ZeroDivisionError"
+    res = session.run("x = -2\nwhile True: pass", timeout=1)
+    assert isinstance(res, ExecutionTimeout)
+    res = session.run("import os\nx = -3\nos._exit(7)", timeout=10)
+    assert isinstance(res, ExecutionCrashed) and res.exit_code == 7
+    res = session.run("print(x, 'data' in globals())", timeout=10)
+    assert res.ret_stdout == "42 False\n"
+
+
+def test_snapshot_on_demand(session):
+    assert isinstance(session.run("x = 100", timeout=10), ExecutionSuccess)
+    snapshot = session.snapshot()
+    assert snapshot.restore()["x"] == 100
+    assert snapshot.skipped["lock"].startswith("unpicklable")
+    assert len(session.holders) <= session.depth
+    assert isinstance(session.run("y = 1", timeout=10), ExecutionSuccess)
+
+
+def test_tool_batch_persists_the_fork_workspace(monkeypatch):
+    import asyncio
+    from src.agent.tool.sandbox import python_tool
+    from src.runtime.engine import engine_enum
+    from src.runtime.status_mgr import var_ws
+    from src.runtime.sub_kernel.kernel_python_executor import current_kernel_key
+
+    monkeypatch.setattr(engine_enum, "default_executor_engine", engine_enum.ExecutorEngine.FORK)
+    snapshots = []
+    monkeypatch.setattr(var_ws, "append_out_globals", snapshots.append)
+    tools = [
+        python_tool.ExecutePythonCodeTool(tool_call_purpose="t", python_code_snippet=code, timeout=10)
+        for code in ("a = 1", "b = a + 1")
+    ]
+
+    async def main():
+        current_kernel_key.set("test-fork-tool")
+        try:
+            return await python_tool.ExecutePythonCodeTool.run_batch(tools)
+        finally:
+            fork_checkpoint_executor.get_default_pool().restart("test-fork-tool")
+
+    asyncio.run(main())
+    assert len(snapshots) == 1
+    restored = snapshots[0].restore()
+    assert (restored["a"], restored["b"]) == (1, 2)
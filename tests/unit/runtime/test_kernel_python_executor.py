@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from src.runtime.sub_kernel import kernel_python_executor
+from src.runtime.sub_kernel.kernel_python_executor import run_structured_in_kernel
+from src.runtime.sub_thread.subthread_schemas import (
+    ExecutionSuccess,
+    ExecutionFailure,
+    ExecutionTimeout,
+)
+
+
+@pytest.fixture(scope="module")
+def kernel_key():
+    token = kernel_python_executor.current_kernel_key.set("test-kernel")
+    yield "test-kernel"
+    kernel_python_executor.get_default_pool().restart("test-kernel")
+    kernel_python_executor.current_kernel_key.reset(token)
+
+
+def test_state_stays_resident_including_unpicklable_objects(kernel_key):
+    res = run_structured_in_kernel("import threading\nlock = threading.Lock()\nx = 41\nprint('x =', x)", {"seed": 1}, timeout=60)
+    assert isinstance(res, ExecutionSuccess)
+    assert res.ret_stdout == "x = 41\n"
+
+    res = run_structured_in_kernel("x += seed\nprint(x, lock.locked(), threading.__name__)\nx", timeout=30)
+    assert isinstance(res, ExecutionSuccess)
+    # 最后一个表达式的值与 Notebook 一样作为输出
+    assert res.ret_stdout == "42 False threading\n42\n"
+
+
+def test_failure_maps_to_execution_failure(kernel_key):
+    res = run_structured_in_kernel("print('start')\n1/0", timeout=30)
+    assert isinstance(res, ExecutionFailure)
+    assert res.exception_type == "ZeroDivisionError"
+    assert res.ret_stdout == "start\n"
+    assert "\x1b[" not in res.exception_traceback
+
+
+def test_timeout_interrupts_and_keeps_state(kernel_key):
+    res = run_structured_in_kernel("import time\ny = 'kept'\ntime.sleep(30)", timeout=1)
+    assert isinstance(res, ExecutionTimeout)
+    res = run_structured_in_kernel("print(y)", timeout=30)
+    assert isinstance(res, ExecutionSuccess)
+    assert res.ret_stdout == "kept\n"
+
+
+def test_snapshot_on_demand(kernel_key):
+    snapshot = kernel_python_executor.snapshot_kernel()
+    assert snapshot.restore()["x"] == 42
+    assert "In" not in snapshot.vars
+    assert snapshot.skipped["lock"].startswith("unpicklable")
+
+
+def test_displayed_results_are_not_cached_in_out(kernel_key):
+    res = run_structured_in_kernel("big = list(range(10))\nbig", timeout=30)
+    assert isinstance(res, ExecutionSuccess)
+    res = run_structured_in_kernel("print(len(Out), _ is big, '_1' in globals())", timeout=30)
+    assert res.ret_stdout == "0 False False\n"
+
+
+def test_slow_kernel_start_does_not_block_other_agents(monkeypatch):
+    import threading
+    import time
+
+    class SlowKernel:
+        def __init__(self, key, work_dir):
+            self.key = key
+            time.sleep(0.5)
+
+        def is_alive(self):
+            return True
+
+    monkeypatch.setattr(kernel_python_executor, "_AgentKernel", SlowKernel)
+    pool = kernel_python_executor.KernelPool()
+    running = pool.get("running", ".", None)
+    start = time.monotonic()
+    threads = [threading.Thread(target=pool.get, args=(key, ".", None)) for key in ("a", "b", "a")]
+    for thread in threads:
+        thread.start()
+    # 其他 agent 启动内核期间，已启动的内核查找不等待
+    assert pool.get("running", ".", None) is running
+    assert time.monotonic() - start < 0.2
+    for thread in threads:
+        thread.join()
+    # 不同 agent 的启动并行，同一 agent 只启动一次
+    assert time.monotonic() - start < 0.9
+    assert pool._kernels["a"] is pool.get("a", ".", None)
+
+
+def test_tool_batch_persists_the_kernel_workspace_once_per_turn(kernel_key, monkeypatch):
+    from src.agent.tool.sandbox import python_tool
+    from src.runtime.engine import engine_enum
+    from src.runtime.status_mgr import var_ws
+
+    monkeypatch.setattr(engine_enum, "default_executor_engine", engine_enum.ExecutorEngine.KERNEL)
+    snapshots = []
+    monkeypatch.setattr(var_ws, "append_out_globals", snapshots.append)
+
+    def tool(code):
+        return python_tool.ExecutePythonCodeTool(tool_call_purpose="t", python_code_snippet=code, timeout=30)
+
+    async def main(*codes):
+        return await python_tool.ExecutePythonCodeTool.run_batch([tool(code) for code in codes])
+
+    outputs = asyncio.run(main("persisted = 1", "persisted += 1"))
+    assert len(outputs) == 2
+    assert len(snapshots) == 1 and snapshots[0].restore()["persisted"] == 2
+    # 全部失败：工作区没有变化，不生成快照
+    asyncio.run(main("1/0"))
+    assert len(snapshots) == 1
@@ -0,0 +1,42 @@
+import os
+
+from src.runtime.status_mgr import output_budget
+from src.runtime.sub_thread.subthread_python_executor import run_structured_in_thread
+from src.runtime.sub_thread.subthread_schemas import ExecutionFailure, ExecutionSuccess
+
+
+def test_truncate_keeps_head_and_tail_on_line_boundaries():
+    text = "".join(f"line {i}\n" for i in range(1000))
+    truncated = output_budget.truncate(text, budget=200, head_ratio=0.5)
+    assert truncated.text.startswith("line 0\n")
+    assert truncated.text.endswith("line 999\n")
+    assert truncated.shown_chars <= 200
+    assert truncated.shown_chars + truncated.omitted_chars == len(text)
+    assert truncated.total_lines == 1000
+    with open(truncated.spill_path, encoding="utf-8") as f:
+        assert f.read() == text
+    assert output_budget.truncate("short", budget=200) is None
+
+
+def test_large_output_is_truncated_with_variable_summary(monkeypatch):
+    monkeypatch.setattr(output_budget, "OUTPUT_BUDGET_CHARS", 500)
+    code = (
+        "import pandas as pd\n"
+        "df = pd.DataFrame({'a': range(5000), 'b': ['x'] * 5000})\n"
+        "print(df.to_string())\n"
+    )
+    res = run_structured_in_thread(code, {}, timeout=30)
+    assert isinstance(res, ExecutionSuccess)
+    stats = res.output_truncation
+    assert stats.total_chars == len(res.ret_stdout) > 500
+    assert os.path.exists(stats.spill_path)
+    assert len(stats.variable_summary) == 1
+    assert stats.variable_summary[0].startswith("df: DataFrame shape=(5000, 2) columns=[a: int64, b: ")
+    llm_text = res.ret_tool2llm
+    assert "输出过长已截断" in llm_text and stats.spill_path in llm_text
+    assert len(llm_text) < 1500
+
+    res = run_structured_in_thread("print('y' * 2000)\n1/0", {}, timeout=30)
+    assert isinstance(res, ExecutionFailure)
+    assert res.output_truncation.omitted_chars > 0
+    assert "ZeroDivisionError" in res.ret_tool2llm
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+import time
+
+from src.utils import persist_writer
+
+
+def test_tasks_run_in_order_in_batches_with_backpressure():
+    writer = persist_writer.PersistWriter(queue_max=2, batch_max=8)
+    gate = threading.Event()
+    done = []
+    writer.submit(gate.wait)
+    # 后台线程被第一个任务卡住：队列写满后 submit 阻塞
+    submitter = threading.Thread(target=lambda: [writer.submit(done.append, i) for i in range(5)])
+    submitter.start()
+    time.sleep(0.2)
+    assert submitter.is_alive() and done == []
+
+    gate.set()
+    submitter.join(timeout=5)
+    assert writer.flush(timeout=5)
+    assert done == [0, 1, 2, 3, 4]
+    metrics = writer.metrics()
+    assert metrics["backpressure_waits"] > 0
+    assert metrics["completed"] == metrics["submitted"] == 7
+    assert metrics["batches"] < metrics["completed"]
+
+
+def test_failed_task_does_not_stop_the_writer():
+    writer = persist_writer.PersistWriter()
+    done = []
+    writer.submit(lambda: 1 / 0)
+    writer.submit(done.append, "ok")
+    assert writer.flush(timeout=5)
+    assert done == ["ok"] and writer.metrics()["errors"] == 1
+
+
+def test_summon_flushes_pending_writes_when_cancelled(monkeypatch):
+    from src.agent_swarm import summon
+
+    written = []
+
+    async def fake_agent(message_mem, tool_class_list, mcp_tool_name_list):
+        persist_writer.submit(lambda: time.sleep(0.3) or written.append(message_mem))
+        yield message_mem
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(summon.deep_research_api, "run_agent_generator", fake_agent)
+
+    async def main():
+        async def consume():
+            async for _ in summon.summon_agent_generator("mem"):
+                pass
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+    assert written == ["mem"]
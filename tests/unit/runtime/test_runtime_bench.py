@@ -0,0 +1,33 @@
+from src.runtime.bench import runtime_bench
+from src.runtime.engine.engine_enum import ExecutorEngine
+from src.utils.path_util import static_path
+
+
+def test_percentile_nearest_rank():
+    samples = [float(i) for i in range(1, 101)]
+    assert runtime_bench.percentile(samples, 50) == 50
+    assert runtime_bench.percentile(samples, 99) == 99
+    assert runtime_bench.percentile([3.0], 90) == 3.0
+    assert runtime_bench.percentile([], 50) == 0.0
+
+
+def test_run_benchmark_smoke_and_baseline_gate(monkeypatch, tmp_path):
+    # 变量存储是内容寻址的，写到临时目录，不影响其他测试对写盘统计的断言
+    monkeypatch.setattr(static_path.Dir, "PY_RUNTIME_VAR_DIR", tmp_path)
+    scenarios = [s for s in runtime_bench.default_scenarios(scale=0.01) if s.name in ("trivial", "many_small", "crash")]
+    report = runtime_bench.run_benchmark([ExecutorEngine.THREAD], scenarios, repeat=3, warmup=0)
+
+    # crash 场景不在线程引擎上运行
+    assert set(report["results"]) == {"thread/trivial", "thread/many_small"}
+    row = report["results"]["thread/many_small"]
+    assert row["statuses"] == {"success": 3}
+    assert set(row["latency"]) == {"snapshot", "restore", "exec", "persist", "total"}
+    assert row["latency"]["total"]["p50_ms"] <= row["latency"]["total"]["p99_ms"]
+    assert row["bytes_persisted"] > 0
+    assert row["snapshot_bytes"] > 0
+
+    assert runtime_bench.compare_with_baseline(report, report, 0.25) == []
+    slower = {"results": {name: {**row, "latency": {"total": {"p50_ms": row["latency"]["total"]["p50_ms"] * 2 + 1}}}
+                          for name, row in report["results"].items()}}
+    assert len(runtime_bench.compare_with_baseline(slower, report, 0.25)) == 2
+    assert "thread/trivial" in runtime_bench.format_report(report)
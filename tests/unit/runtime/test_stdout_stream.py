@@ -0,0 +1,53 @@
+import asyncio
+
+from src.runtime.ctx_mgr import stdout_stream
+from src.runtime.sub_thread.subthread_python_executor import run_structured_in_thread
+from src.runtime.sub_thread.subthread_schemas import ExecutionSuccess
+
+
+def test_ring_buffer_is_bounded_but_full_output_is_kept():
+    stream = stdout_stream.StdoutStream(ring_max_chunks=3)
+    for i in range(10):
+        stream.write(f"{i}\n")
+    assert stream.tail() == "7\n8\n9\n"
+    assert stream.getvalue() == "".join(f"{i}\n" for i in range(10))
+
+
+def test_async_reader_sees_output_before_execution_ends():
+    async def main():
+        stream = stdout_stream.StdoutStream()
+        code = "import time\nprint('first')\ntime.sleep(0.5)\nprint('second')"
+        task = asyncio.create_task(asyncio.to_thread(run_structured_in_thread, code, {}, None, 5, stream))
+        chunks = []
+        async for chunk in stream:
+            chunks.append(chunk)
+            if "first" in "".join(chunks):
+                assert not task.done()
+                break
+        res = await task
+        stream.close()
+        return res
+
+    res = asyncio.run(main())
+    assert isinstance(res, ExecutionSuccess)
+    assert res.ret_stdout == "first\nsecond\n"
+
+
+def test_hub_tracks_open_streams_in_task_context():
+    async def tool():
+        with stdout_stream.open_stream("purpose") as stream:
+            stream.write("working")
+            await asyncio.sleep(0.1)
+
+    async def main():
+        hub = stdout_stream.StdoutStreamHub()
+        task = asyncio.create_task(tool(), context=stdout_stream.context_with_hub(hub))
+        tails = []
+        while await hub.wait_update(task):
+            tails.append(hub.tails())
+        await task
+        return tails, hub.tails()
+
+    tails, final = asyncio.run(main())
+    assert tails and tails[0] == {"purpose": "working"}
+    assert final == {}
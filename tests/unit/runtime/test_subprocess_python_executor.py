@@ -0,0 +1,153 @@
+import time
+import pytest
+
+from src.runtime.sub_process.subprocess_python_executor import ProcessWorkerPool
+from src.runtime.sub_thread.subthread_schemas import (
+    ExecutionSuccess,
+    ExecutionFailure,
+    ExecutionTimeout,
+    ExecutionCrashed,
+    ExecutionLimitExceeded,
+)
+from src.runtime.ctx_mgr.resource_usage import ResourceLimits
+from src.runtime.status_mgr import var_snapshot
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = ProcessWorkerPool(size=2).start()
+    yield pool
+    pool.shutdown()
+
+
+def test_success_returns_globals(pool):
+    res = pool.run("x = a + 1\nprint('x =', x)", {"a": 41}, timeout=10)
+    assert isinstance(res, ExecutionSuccess)
+    assert res.arg_chg_globals["x"] == 42
+    assert "x = 42" in res.ret_stdout
+
+
+def test_tracked_run_only_returns_changed_vars(pool):
+    base = var_snapshot.take_snapshot({"a": 41, "big": list(range(100000))})
+    _globals = base.restore()
+    with var_snapshot.track_changes(base, _globals):
+        res = pool.run("x = a + 1", _globals, timeout=10)
+    assert isinstance(res, ExecutionSuccess)
+    assert res.var_changes.added == ["x"] and res.var_changes.unchanged_count == 2
+    # worker 只回传了 x，big 复用起始快照
+    assert res.globals_snapshot.vars["big"] is base.vars["big"]
+    # 主进程不整体反序列化工作区，只在访问时反序列化单个变量
+    assert isinstance(res.arg_chg_globals, var_snapshot.LazyWorkspace)
+    assert res.ret_tool2llm and res.arg_chg_globals.restored_names == []
+    assert res.arg_chg_globals["x"] == 42
+    assert res.arg_chg_globals.restored_names == ["x"]
+
+
+def test_failure_keeps_exec_traceback(pool):
+    res = pool.run("print('start')\n1/0", {}, timeout=10)
+    assert isinstance(res, ExecutionFailure)
+    assert res.exception_type == "ZeroDivisionError"
+    assert "<string>" in res.exception_traceback
+    assert "start" in res.ret_stdout
+
+
+def test_timeout_kills_worker(pool):
+    res = pool.run("print('sleep...')\nwhile True: pass", {}, timeout=1)
+    assert isinstance(res, ExecutionTimeout)
+    assert "sleep..." in res.ret_stdout
+    # 被 kill 的 worker 已被替换，池仍然可用
+    res = pool.run("y = 1", {}, timeout=10)
+    assert isinstance(res, ExecutionSuccess)
+
+
+def test_crash_reports_exit_code(pool):
+    res = pool.run("import os\nos._exit(3)", {}, timeout=10)
+    assert isinstance(res, ExecutionCrashed)
+    assert res.exit_code == 3
+
+
+def test_worker_dead_before_send_reports_crash(monkeypatch):
+    pool = ProcessWorkerPool(size=1).start()
+    try:
+        worker = pool._idle.get()
+        worker.process.kill()
+        worker.process.join()
+        # 取出时还活着、发送前退出
+        monkeypatch.setattr(pool, "_acquire", lambda: worker)
+        res = pool.run("x = 1", {}, timeout=10)
+        assert isinstance(res, ExecutionCrashed)
+        monkeypatch.undo()
+        # 退出的 worker 已被替换，池仍然可用
+        assert isinstance(pool.run("y = 1", {}, timeout=10), ExecutionSuccess)
+    finally:
+        pool.shutdown()
+
+
+def test_parallel_runs_on_separate_workers(pool):
+    import threading
+    results = []
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=lambda: results.append(pool.run("import time\ntime.sleep(1)", {}, timeout=10)))
+        for _ in range(2)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(isinstance(r, ExecutionSuccess) for r in results)
+    assert time.perf_counter() - start < 1.9
+
+
+def test_warm_modules_are_injected_and_reported():
+    warm_pool = ProcessWorkerPool(size=1, warm_modules="json as js,math,not_a_real_module as nope").start()
+    try:
+        metrics = list(warm_pool.import_metrics().values())
+        assert len(metrics) == 1
+        assert set(metrics[0]["import_seconds"]) == {"json", "math"}
+        assert "not_a_real_module" in metrics[0]["import_errors"]
+
+        res = warm_pool.run("s = js.dumps({'a': 1})\njs = 'shadowed'", {}, timeout=10)
+        assert isinstance(res, ExecutionSuccess)
+        assert res.arg_chg_globals["s"] == '{"a": 1}'
+        # 用户覆盖的同名变量照常保存，模块本身不进入快照
+        assert res.arg_chg_globals["js"] == "shadowed"
+        res = warm_pool.run("print(type(js).__name__)", {}, timeout=10)
+        assert res.ret_stdout.strip() == "module"
+    finally:
+        warm_pool.shutdown()
+
+
+def test_resource_usage_and_limits(tmp_path):
+    limited_pool = ProcessWorkerPool(
+        size=1, warm_modules="", limits=ResourceLimits(memory_mb=256, cpu_seconds=1, file_size_mb=1),
+    ).start()
+    try:
+        res = limited_pool.run(
+            "data = bytearray(32 * 1024 * 1024)\nopen('out.bin', 'wb').write(b'x' * 1000)\nsum(range(10**6))",
+            {}, timeout=10, work_dir=str(tmp_path),
+        )
+        assert isinstance(res, ExecutionSuccess)
+        usage = res.resource_usage
+        assert usage.bytes_written == 1000
+        # 发回主进程的 print 输出不计入写入量
+        res = limited_pool.run("print('x' * 5000)", {}, timeout=10, work_dir=str(tmp_path))
+        assert res.resource_usage.bytes_written == 0
+        assert usage.peak_rss_bytes >= 32 * 1024 * 1024
+        assert usage.cpu_user_seconds > 0
+
+        res = limited_pool.run("data = bytearray(1024 * 1024 * 1024)", {}, timeout=10, work_dir=str(tmp_path))
+        assert isinstance(res, ExecutionLimitExceeded) and res.limit_kind == "memory"
+        assert "超出资源限制" in res.ret_tool2llm
+
+        res = limited_pool.run("open('big.bin', 'wb').write(b'x' * 2 * 1024 * 1024)", {}, timeout=10, work_dir=str(tmp_path))
+        assert isinstance(res, ExecutionLimitExceeded) and res.limit_kind == "file_size"
+
+        res = limited_pool.run("while True: pass", {}, timeout=10, work_dir=str(tmp_path))
+        assert isinstance(res, ExecutionLimitExceeded) and res.limit_kind == "cpu"
+
+        # 限制只作用于单次执行，worker 仍然可用
+        res = limited_pool.run("x = 1", {}, timeout=10, work_dir=str(tmp_path))
+        assert isinstance(res, ExecutionSuccess)
+    finally:
+        limited_pool.shutdown()
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from src.runtime.status_mgr import var_history
+from src.runtime.status_mgr import var_snapshot
+from src.runtime.status_mgr import var_store
+from src.utils.path_util import dynamic_path
+from src.utils.path_util import static_path
+
+
+@pytest.fixture(autouse=True)
+def var_dir(monkeypatch, tmp_path):
+    """变量存储写到临时目录，不写入本次运行的 wst 目录"""
+    monkeypatch.setattr(static_path.Dir, "PY_RUNTIME_VAR_DIR", tmp_path)
+    return tmp_path
+
+
+def _persisted(value, success_cnt):
+    snapshot = var_snapshot.take_snapshot({"value": value})
+    var_store.dump_globals(snapshot, success_cnt)
+    return snapshot, dynamic_path.RunVarPath(success_cnt=success_cnt).path()
+
+
+def test_evicts_least_recently_used_over_budget_and_reloads():
+    entries = [_persisted(list(range(i * 10, i * 10 + 20000)), 1 + i) for i in range(5)]
+    budget = entries[0][0].resident_bytes * 2
+    history = var_history.SnapshotHistory(memory_budget_bytes=budget, max_idle_seconds=None)
+    for snapshot, manifest_path in entries:
+        history.append(snapshot, manifest_path)
+
+    metrics = history.metrics()
+    assert metrics["resident_bytes"] <= budget
+    assert metrics["evictions"] > 0
+    # 最新一条始终常驻
+    assert history.latest().restore()["value"][0] == 40
+
+    assert history.get(0).restore()["value"][0] == 0
+    assert history.metrics()["reloads"] == 1
+
+
+def test_unpersisted_entries_are_kept():
+    history = var_history.SnapshotHistory(memory_budget_bytes=0, max_idle_seconds=None)
+    history.append(var_snapshot.take_snapshot({"a": 1}))
+    history.append(var_snapshot.take_snapshot({"a": 2}))
+    assert history.metrics()["resident_entries"] == 2
+
+
+def test_idle_entries_are_evicted():
+    history = var_history.SnapshotHistory(memory_budget_bytes=10**9, max_idle_seconds=0)
+    history.append(*_persisted(np.zeros(10), 1))
+    history.append(*_persisted(np.ones(10), 2))
+    assert history.metrics()["resident_entries"] == 1
+    assert history[0].restore()["value"].sum() == 0
+
+
+def test_entry_becomes_evictable_once_stored():
+    snapshot, manifest_path = _persisted(np.zeros(10), 1)
+    history = var_history.SnapshotHistory(memory_budget_bytes=0, max_idle_seconds=None)
+    history.append(snapshot)
+    history.append(var_snapshot.take_snapshot({"a": 2}))
+    assert history.metrics()["resident_entries"] == 2
+    history.mark_stored(0, manifest_path)
+    assert history.metrics()["resident_entries"] == 1
+    assert history[0].restore()["value"].sum() == 0
@@ -0,0 +1,141 @@
+import os
+import threading
+
+import pytest
+
+from src.runtime.status_mgr import var_snapshot
+from src.runtime.status_mgr import var_store
+from src.runtime.sub_thread.subthread_schemas import ExecutionSuccess
+from src.utils.path_util import dynamic_path
+from src.utils.path_util import static_path
+
+
+@pytest.fixture
+def var_dir(monkeypatch, tmp_path):
+    """变量存储写到临时目录，不写入本次运行的 wst 目录"""
+    monkeypatch.setattr(static_path.Dir, "PY_RUNTIME_VAR_DIR", tmp_path)
+    return tmp_path
+
+
+def test_take_snapshot_filters_and_restores_copy():
+    data = {"a": [1, 2, 3]}
+    snapshot = var_snapshot.take_snapshot({
+        "__builtins__": __builtins__,
+        "os": os,
+        "lock": threading.Lock(),
+        "data": data,
+    })
+    assert snapshot.keys() == ["data"]
+    assert snapshot.skipped["os"] == "module"
+    assert snapshot.skipped["lock"].startswith("unpicklable")
+
+    restored = snapshot.restore()
+    restored["data"]["a"].append(4)
+    assert data["a"] == [1, 2, 3]
+    assert snapshot.restore()["data"]["a"] == [1, 2, 3]
+
+
+def test_cost_report_per_variable():
+    snapshot = var_snapshot.take_snapshot({"small": 1, "big": list(range(100000))})
+    report = snapshot.cost_report()
+    assert {r["name"] for r in report} == {"small", "big"}
+    assert report[0]["cost_ms"] >= report[-1]["cost_ms"]
+    assert snapshot.total_bytes == sum(r["bytes"] for r in report)
+
+
+def test_execution_success_reuses_snapshot():
+    snapshot = var_snapshot.take_snapshot({"x": 1, "y": "text"})
+    res = ExecutionSuccess(arg_command="", exec_timeout=0, arg_chg_globals=snapshot)
+    assert res.globals_snapshot is snapshot
+    assert res.arg_chg_globals == {"x": 1, "y": "text"}
+    assert "globals_snapshot" not in res.model_dump()
+
+
+def test_execution_success_from_dict_filters_modules():
+    value = [1, 2]
+    res = ExecutionSuccess(arg_command="", exec_timeout=0, arg_chg_globals={"os": os, "v": value})
+    assert list(res.arg_chg_globals) == ["v"]
+    assert res.arg_chg_globals["v"] is value
+    assert res.globals_snapshot.keys() == ["v"]
+
+
+def test_var_store_round_trip(var_dir):
+    snapshot = var_snapshot.take_snapshot({"x": {"k": [1, 2]}})
+    var_store.dump_globals(snapshot, 1)
+    loaded = var_store.load_globals(dynamic_path.RunVarPath(success_cnt=1).path())
+    assert loaded == {"x": {"k": [1, 2]}}
+
+
+def test_var_store_only_writes_changed_vars(var_dir):
+    big = list(range(50000))
+    first = var_store.dump_globals(var_snapshot.take_snapshot({"big": big, "n": 1}), 1)
+    second = var_store.dump_globals(var_snapshot.take_snapshot({"big": big, "n": 2}), 2)
+    assert first["written"] == 2
+    assert second["reused"] == 1 and second["written"] == 1
+    assert second["bytes_written"] < first["bytes_written"]
+    assert var_store.load_globals(dynamic_path.RunVarPath(success_cnt=1).path())["n"] == 1
+    assert var_store.load_globals(dynamic_path.RunVarPath(success_cnt=2).path()) == {"big": big, "n": 2}
+
+
+def test_numpy_buffers_out_of_band_and_mmap_restore(var_dir):
+    import numpy as np
+    import pandas as pd
+    arr = np.arange(200000, dtype=np.float64)
+    df = pd.DataFrame({"a": np.arange(100000), "b": np.ones(100000)})
+    snapshot = var_snapshot.take_snapshot({"arr": arr, "df": df})
+    assert snapshot.vars["arr"].buffer_sizes == [arr.nbytes]
+    assert len(snapshot.vars["arr"].blob) < 1024
+
+    var_store.dump_globals(snapshot, 1)
+    # 落盘后快照只保留文件映射，不再常驻缓冲区
+    assert snapshot.vars["arr"].buffers == []
+    assert snapshot.resident_bytes < snapshot.total_bytes
+
+    loaded = var_store.load_snapshot(dynamic_path.RunVarPath(success_cnt=1).path())
+    first, second = loaded.restore(), loaded.restore()
+    first["arr"][0] = -1.0
+    assert second["arr"][0] == 0.0
+    assert np.array_equal(second["arr"], arr)
+    pd.testing.assert_frame_equal(second["df"], df)
+    # 写时复制不会修改磁盘上的内容
+    assert loaded.restore()["arr"][0] == 0.0
+
+
+def test_take_delta_detects_changes_by_identity_and_content_hash():
+    import numpy as np
+    base = var_snapshot.take_snapshot({
+        "n": 1, "items": [1, 2], "arr": np.zeros(100000), "same_arr": np.ones(100000), "gone": "x",
+    })
+    _globals = base.restore()
+    change_base = var_snapshot.ChangeBase.of(base, _globals)
+    _globals["items"].append(3)
+    _globals["arr"][0] = 5.0
+    _globals["new"] = {"k": 1}
+    del _globals["gone"]
+
+    delta = var_snapshot.take_delta(_globals, change_base)
+    assert set(delta.changed) == {"items", "arr", "new"}
+    assert delta.unchanged == {"n", "same_arr"}
+    assert delta.deleted == {"gone"}
+    assert delta.changed["arr"].blob_hash == var_snapshot.take_snapshot({"arr": _globals["arr"]}).vars["arr"].blob_hash
+
+    merged = change_base.compose(delta)
+    # 未变化的变量直接复用起始快照中的 VarSnapshot
+    assert merged.vars["same_arr"] is base.vars["same_arr"]
+    assert merged.restore()["arr"][0] == 5.0
+    assert set(merged.vars) == {"n", "items", "arr", "same_arr", "new"}
+
+
+def test_tracked_thread_execution_reports_var_changes():
+    from src.runtime.sub_thread.subthread_python_executor import run_structured_in_thread
+    base = var_snapshot.take_snapshot({"a": 1, "b": [1], "c": 3})
+    _globals = base.restore()
+    with var_snapshot.track_changes(base, _globals):
+        res = run_structured_in_thread("b.append(2)\nd = a + 1\ndel c\nprint(a)", _globals, timeout=10)
+    assert isinstance(res, ExecutionSuccess)
+    assert res.var_changes.added == ["d"]
+    assert res.var_changes.modified == ["b"]
+    assert res.var_changes.deleted == ["c"]
+    assert res.var_changes.unchanged_count == 1
+    assert res.globals_snapshot.vars["a"] is base.vars["a"]
+    assert "新增 d；修改 b；删除 c" in res.ret_tool2llm